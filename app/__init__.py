@@ -1,30 +1,77 @@
+import time
 from flask import Flask
 
 
-def create_app(config_class='app.config.Config'):
+def create_app(config_class='app.config.Config', background=True):
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(config_class)
+
+    # Файлы форм принимаются потоком сразу в папку загрузок
+    from .utils.uploads import UploadRequest
+    app.request_class = UploadRequest
     app.url_map.strict_slashes = False
 
+    # За nginx request.remote_addr - адрес прокси; лимит входа по IP должен видеть клиента
+    if app.config['TRUSTED_PROXIES']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
     # Initialize extensions
-    from .extensions import db
-    db.init_app(app)
+    from .extensions import db, password_hasher, init_database
+    init_database(app)
+    password_hasher.init_app(app)
+
+    from .utils.db_stats import init_query_counter
+    init_query_counter(app)
+
+    # Время, SQL и размер ответа каждого запроса для /metrics, медленные запросы - в лог
+    from .utils.metrics import init_metrics
+    init_metrics(app)
+
+    from .utils.page_cache import init_page_cache
+    init_page_cache(app)
+
+    from .utils.assets import init_assets
+    init_assets(app)
 
     from app.routes.main import main_bp
     from app.routes.auth import auth_bp
     from app.routes.parts import parts_bp
     from app.routes.sales import sales_bp
+    from app.routes.media import media_bp
+    from app.routes.analytics import analytics_bp
+    from app.routes.imports import imports_bp
+    from app.routes.exports import exports_bp
+    from app.routes.api import api_bp
 
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(parts_bp)
     app.register_blueprint(sales_bp)
+    app.register_blueprint(media_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(imports_bp)
+    app.register_blueprint(exports_bp)
+    app.register_blueprint(api_bp)
+
+    from .commands import register_commands
+    register_commands(app)
+
+    # Схема меняется только командой flask migrate, при старте - лишь проверка версии
+    from .utils.migrations import check_schema
+    check_schema(app)
+
+    # Периодическая чистка файлов без записей в базе. Под WSGI-сервером (wsgi.py) поток
+    # запускает каждый воркер после fork, а не мастер при preload
+    if background:
+        from .utils.media_gc import start_media_gc
+        start_media_gc(app)
 
-    # Create admin user
-    with app.app_context():
-        db.create_all()
-        from .utils.security import create_admin_user
-        create_admin_user()
+    # Время create_app и первого запроса - в app.extensions["startup"] и в логе (flask startup-report)
+    from .utils.startup import init_startup_report
+    init_startup_report(app, started)
 
     return app
 
@@ -0,0 +1,419 @@
+import os
+import click
+
+
+def register_commands(app):
+    """Регистрирует CLI-команды приложения (flask <команда>)"""
+
+    @app.cli.command("migrate")
+    @click.option("--status", is_flag=True, help="Только показать версию схемы и недостающие миграции")
+    @click.option("--to", "target", type=int, default=None, help="Обновить до указанной версии")
+    def migrate_command(status, target):
+        """Обновляет схему базы до текущей версии (можно выполнять на работающем приложении)"""
+        from app.utils.migrations import current_version, pending_migrations, upgrade
+
+        if status:
+            click.echo(f"Версия схемы: {current_version()}")
+            for version, description, _ in pending_migrations():
+                click.echo(f"  не применена {version}: {description}")
+            return
+
+        applied = upgrade(target, log=click.echo)
+        click.echo(f"Применено миграций: {len(applied)}, версия схемы: {current_version()}")
+
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Создает схему новой базы (один раз при установке, до запуска воркеров)"""
+        from app.utils.migrations import current_version, upgrade
+
+        version = current_version()
+        if version:
+            click.echo(f"База уже создана (версия схемы {version}), для обновления: flask migrate")
+            return
+
+        upgrade(log=click.echo)
+        click.echo(f"База создана, версия схемы: {current_version()}")
+        click.echo("Создайте администратора: flask create-admin")
+
+
+    @app.cli.command("create-admin")
+    @click.option("--password", prompt="Пароль администратора", hide_input=True, confirmation_prompt=True,
+                  envvar="ADMIN_PASSWORD", help="Пароль (или переменная ADMIN_PASSWORD); без него - запрос в терминале")
+    def create_admin_command(password):
+        """Создает пользователя admin или задает ему новый пароль"""
+        from app.utils.security import create_admin_user
+
+        if len(password) < 8:
+            raise click.BadParameter("не короче 8 символов", param_hint="--password")
+        _, created = create_admin_user(password)
+        click.echo("Администратор admin создан" if created else "Пароль администратора admin изменен")
+
+
+    @app.cli.command("reindex-search")
+    def reindex_search():
+        """Пересчитывает ключи поиска и перестраивает поисковый индекс деталей"""
+        from app.utils.search import ensure_search_keys, backfill_search_keys, rebuild_search_index
+
+        ensure_search_keys()
+        updated = backfill_search_keys(only_missing=False)
+        click.echo(f"Ключи поиска пересчитаны: {updated}")
+
+        if rebuild_search_index():
+            click.echo("Поисковый индекс перестроен")
+        else:
+            click.echo("Полнотекстовый индекс доступен только для SQLite, используется поиск по LIKE")
+
+
+    @app.cli.command("rebuild-rollups")
+    def rebuild_rollups_command():
+        """Пересчитывает дневные и месячные итоги продаж по всей истории"""
+        from app.utils.rollups import rebuild_rollups
+
+        days = rebuild_rollups()
+        click.echo(f"Итоги пересчитаны, дней с продажами: {days}")
+
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """Собирает статику: имена с хэшем содержимого, сжатые копии .gz и .br, манифест для url_for"""
+        from app.utils.assets import build_assets
+
+        built = build_assets(app.static_folder, app.config['ASSETS_EXCLUDE'])
+        for source, target, size, compressed in built:
+            sizes = ", ".join(f"{encoding} {packed}" for encoding, packed in compressed.items())
+            click.echo(f"{source} -> {target} ({size} байт{', ' + sizes if sizes else ''})")
+        click.echo(f"Собрано файлов: {len(built)}. Перезапустите приложение, чтобы подхватить манифест")
+
+
+    @app.cli.command("page-cache")
+    @click.option("--clear", is_flag=True, help="Очистить кэш страниц")
+    def page_cache_command(clear):
+        """Показывает размер кэша страниц (PAGE_CACHE_BACKEND=sqlite - общего для воркеров)"""
+        from app.utils.page_cache import get_page_cache
+
+        cache = get_page_cache()
+        if cache is None:
+            click.echo("Кэш страниц выключен (PAGE_CACHE_BACKEND=off)")
+            return
+        if clear:
+            cache.clear()
+            click.echo("Кэш страниц очищен")
+        stats = cache.stats()
+        click.echo(
+            f"{stats['backend']}: записей {stats['entries']}, "
+            f"{stats['bytes'] / 1024 / 1024:.1f} из {stats['max_bytes'] / 1024 / 1024:.0f} МБ"
+        )
+
+
+    @app.cli.command("import-parts")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--quantity", "quantity_mode", type=click.Choice(["add", "set"]), default="add",
+                  help="Добавить количество из файла к остатку или заменить остаток")
+    @click.option("--batch-size", type=int, default=None, help="Строк в одной транзакции")
+    @click.option("--errors", "report_path", type=click.Path(dir_okay=False), default=None,
+                  help="Куда записать CSV с ошибками строк (по умолчанию <файл>.errors.csv)")
+    def import_parts_command(path, quantity_mode, batch_size, report_path):
+        """Импортирует детали из CSV/XLSX поставщика (без фоновой очереди)"""
+        import time
+        from app.utils.importer import import_parts, ImportFileError
+
+        report_path = report_path or f"{path}.errors.csv"
+        started = time.perf_counter()
+
+        def progress(stats):
+            click.echo(f"  строк: {stats['rows']}, добавлено: {stats['inserted']}, обновлено: {stats['updated']}")
+
+        try:
+            stats = import_parts(path, report_path, quantity_mode=quantity_mode,
+                                 batch_size=batch_size or app.config['IMPORT_BATCH_SIZE'], progress=progress)
+        except ImportFileError as e:
+            raise click.ClickException(str(e))
+
+        click.echo(
+            f"Готово за {time.perf_counter() - started:.1f} с: строк {stats['rows']}, "
+            f"добавлено {stats['inserted']}, обновлено {stats['updated']}, ошибок {stats['failed']}"
+        )
+        if stats['failed']:
+            click.echo(f"Ошибки строк: {report_path}")
+
+
+    @app.cli.command("analytics-benchmark")
+    @click.option("--rows", type=int, default=1_000_000, help="Число синтетических позиций продаж")
+    def analytics_benchmark_command(rows):
+        """Сравнивает векторную аналитику с построчными циклами на синтетических данных"""
+        from app.utils.analytics_benchmark import run_benchmark
+
+        click.echo(f"Позиций продаж: {rows}")
+        for metric, timing in run_benchmark(rows).items():
+            click.echo(
+                f"{metric}: numpy {timing['vectorized'] * 1000:.0f} мс, "
+                f"цикл {timing['naive'] * 1000:.0f} мс "
+                f"(x{timing['naive'] / max(timing['vectorized'], 1e-9):.1f})"
+            )
+
+
+    @app.cli.command("seed")
+    @click.option("--size", type=click.Choice(["10k", "100k", "1m"]), default="10k", help="Размер каталога")
+    @click.option("--parts", type=int, default=None, help="Число деталей (вместо размера из --size)")
+    @click.option("--sales", type=int, default=None, help="Число продаж")
+    @click.option("--images", type=int, default=None, help="Фото на деталь")
+    @click.option("--seed", "seed", type=int, default=0, help="Зерно генератора: одинаковое - одинаковый каталог")
+    @click.option("--append", is_flag=True, help="Добавить к деталям, которые уже есть в базе")
+    def seed_command(size, parts, sales, images, seed, append):
+        """Заполняет базу синтетическим каталогом для замеров (детали, фото, продажи)"""
+        from app.extensions import db
+        from app.models import Part
+        from app.utils.seed import SEED_SIZES, seed_catalogue
+
+        if not append and db.session.query(Part.id).first() is not None:
+            raise click.ClickException("В базе уже есть детали. Используйте отдельную базу или --append")
+
+        default_parts, default_sales, default_images = SEED_SIZES[size]
+        last_report = {}
+
+        def progress(stage, done, total):
+            # Не чаще раза в 10%: на миллионе деталей строк было бы слишком много
+            step = max(1, total // 10)
+            if done == total or done // step != last_report.get(stage, -1):
+                last_report[stage] = done // step
+                click.echo(f"  {stage}: {done}/{total}")
+
+        result = seed_catalogue(
+            parts if parts is not None else default_parts,
+            sales if sales is not None else default_sales,
+            images if images is not None else default_images,
+            seed=seed,
+            progress=progress
+        )
+        click.echo(f"Создано деталей: {result['parts']}, фото: {result['images']}, продаж: {result['sales']}")
+
+
+    @app.cli.command("bench")
+    @click.option("--url", default=None, help="Адрес запущенного сервера; без него - тестовый клиент Flask")
+    @click.option("--pid", type=int, default=None, help="PID сервера (мастера gunicorn) для замера памяти")
+    @click.option("--scenario", "names", multiple=True, help="Сценарий (можно несколько); по умолчанию все чтения")
+    @click.option("--writes", is_flag=True, help="Добавить сценарии, меняющие данные: create_sale, upload")
+    @click.option("--requests", type=int, default=200, help="Запросов на сценарий")
+    @click.option("--concurrency", type=int, default=None, help="Параллельных клиентов (по умолчанию 1, по HTTP - 8)")
+    @click.option("--warmup", type=int, default=10, help="Запросов на прогрев, не входят в замер")
+    @click.option("--seed", "seed", type=int, default=0, help="Зерно выборки id и поисковых слов")
+    @click.option("--save", "save_path", type=click.Path(dir_okay=False), default=None, help="Сохранить отчет в JSON")
+    @click.option("--compare", "baseline_path", type=click.Path(exists=True, dir_okay=False), default=None,
+                  help="Сравнить с сохраненной базовой линией; при регрессии - код выхода 1")
+    @click.option("--tolerance", type=float, default=0.25, help="Допустимое ухудшение p95, запр/с и памяти (доля)")
+    def bench_command(url, pid, names, writes, requests, concurrency, warmup, seed, save_path, baseline_path, tolerance):
+        """Замеряет p50/p95/p99, запросы в секунду и пиковую память по сценариям. Запускать на базе из flask seed"""
+        import json
+        from app.models import User
+        from app.utils.benchmark import SCENARIOS, client_sender, http_sender, run_benchmark, compare_reports
+        from app.utils.security import create_access_token, user_role
+
+        by_name = {scenario.name: scenario for scenario in SCENARIOS}
+        unknown = [name for name in names if name not in by_name]
+        if unknown:
+            raise click.BadParameter(f"{', '.join(unknown)}; есть: {', '.join(by_name)}", param_hint="--scenario")
+        scenarios = [by_name[name] for name in names] or [s for s in SCENARIOS if writes or not s.writes]
+
+        admin = User.query.filter_by(login='admin').first()
+        if admin is None:
+            raise click.ClickException("Нет пользователя admin: flask create-admin")
+        token = create_access_token(admin.id, user_role(admin))
+
+        if url:
+            send = http_sender(url, token)
+            concurrency = concurrency or 8
+        else:
+            send = client_sender(app, token)
+            concurrency = concurrency or 1
+            # Замер памяти - этого процесса, в котором работает приложение
+            pid = None
+
+        report = run_benchmark(
+            send, scenarios, requests=requests, concurrency=concurrency, warmup=warmup, rss_pid=pid, seed=seed,
+            meta={"mode": "http" if url else "client", "target": url}
+        )
+
+        click.echo(f"{'сценарий':<12} {'запр/с':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'RSS, МиБ':>9} ошибок")
+        for name, result in report["results"].items():
+            click.echo(
+                f"{name:<12} {result['rps'] or 0:>8.1f} {result['p50_ms'] or 0:>9.1f} {result['p95_ms'] or 0:>9.1f} "
+                f"{result['p99_ms'] or 0:>9.1f} {result['peak_rss_mib'] or 0:>9.1f} {result['errors']}"
+            )
+
+        if save_path:
+            with open(save_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            click.echo(f"Отчет сохранен: {save_path}")
+
+        if baseline_path:
+            with open(baseline_path, encoding="utf-8") as f:
+                baseline = json.load(f)
+            for key in ("mode", "concurrency", "parts"):
+                if baseline["meta"].get(key) != report["meta"].get(key):
+                    click.echo(f"Внимание: {key} отличается от базовой линии "
+                               f"({baseline['meta'].get(key)} -> {report['meta'].get(key)})")
+            regressions = compare_reports(baseline, report, tolerance)
+            if regressions:
+                click.echo(f"Регрессии относительно {baseline_path}:")
+                for line in regressions:
+                    click.echo(f"  {line}")
+                raise SystemExit(1)
+            click.echo(f"Регрессий нет (допуск {tolerance:.0%})")
+
+
+    @app.cli.command("image-variants")
+    @click.option("--all", "regenerate_all", is_flag=True, help="Пересоздать варианты для всех изображений")
+    def image_variants(regenerate_all):
+        """Создает уменьшенные копии для загруженных ранее изображений"""
+        from app.extensions import db
+        from app.models import PartImage
+        from app.utils.file_handling import get_upload_path
+        from app.utils.images import generate_variants, format_variants
+        from app.utils.media_store import get_blob_path
+
+        query = PartImage.query
+        if not regenerate_all:
+            query = query.filter(PartImage.variants.is_(None))
+
+        image_ids = [image_id for (image_id,) in query.with_entities(PartImage.id)]
+
+        processed = 0
+        for image_id in image_ids:
+            image = db.session.get(PartImage, image_id)
+            if image.blob_id:
+                source_path = get_blob_path(image.filename)
+            else:
+                source_path = os.path.join(get_upload_path(image.part_id), image.filename)
+            try:
+                variants = generate_variants(source_path, os.path.dirname(source_path), image.filename)
+            except Exception as e:
+                click.echo(f"Пропущено {image.part_id}/{image.filename}: {e}")
+                continue
+            image.variants = format_variants(variants)
+            image.part.touch()
+            processed += 1
+            if processed % 100 == 0:
+                db.session.commit()
+
+        db.session.commit()
+        click.echo(f"Обработано изображений: {processed}")
+
+
+    @app.cli.command("media-usage")
+    def media_usage_command():
+        """Показывает объем хранилища фото и видео и экономию от дедупликации"""
+        from app.utils.media_store import media_usage
+
+        usage = media_usage()
+        mb = 1024 * 1024
+        click.echo(f"Файлов в хранилище: {usage['blobs']}, ссылок из деталей: {usage['references']}")
+        click.echo(f"Без дедупликации: {usage['logical_bytes'] / mb:.1f} МБ")
+        click.echo(f"Занято на диске: {usage['stored_bytes'] / mb:.1f} МБ")
+        click.echo(f"Сэкономлено: {usage['saved_bytes'] / mb:.1f} МБ")
+
+
+    @app.cli.command("reconcile-media")
+    @click.option("--delete", is_flag=True, help="Удалить файлы без записей и блобы без ссылок")
+    @click.option("--delete-rows", is_flag=True,
+                  help="С --delete: удалить и записи фото и видео, файлов которых нет")
+    @click.option("--batch-size", type=int, default=None, help="Сколько файлов или записей удалять за раз")
+    @click.option("--pause", type=float, default=None, help="Пауза между пачками, секунд")
+    def reconcile_media_command(delete, delete_rows, batch_size, pause):
+        """Сверяет папку загрузок с базой: файлы без записей и записи без файлов"""
+        from app.utils.media_gc import reconcile_media, MediaRootError
+
+        if delete_rows and not delete:
+            raise click.BadParameter("используется вместе с --delete", param_hint="--delete-rows")
+        try:
+            report = reconcile_media(delete=delete, delete_rows=delete_rows, batch_size=batch_size, pause=pause)
+        except MediaRootError as e:
+            raise click.ClickException(str(e))
+        for path in report["orphan_paths"]:
+            click.echo(f"Файл без записи: {path}")
+        for image_id in report["dangling_images"]:
+            click.echo(f"Изображение без файла: id={image_id}")
+        for video_id in report["dangling_videos"]:
+            click.echo(f"Видео без файла: id={video_id}")
+
+        action = "Удалено" if delete else "Найдено"
+        dangling = len(report['dangling_images']) + len(report['dangling_videos'])
+        click.echo(
+            f"{action}: файлов {len(report['orphan_paths'])}, "
+            f"записей {report['deleted_rows'] if delete_rows else dangling}, "
+            f"блобов без ссылок {len(report['unreferenced_blobs'])}"
+        )
+        if delete and not delete_rows and dangling:
+            click.echo(f"Записи без файлов ({dangling}) не удалялись: --delete-rows")
+        if delete:
+            click.echo(f"Удалено незавершенных загрузок: {report['stale_uploads']}")
+
+
+    @app.cli.command("startup-report")
+    @click.option("--path", default="/login", help="Адрес первого запроса")
+    @click.option("--top", type=int, default=15, help="Сколько пакетов с самым долгим импортом показать")
+    def startup_report_command(path, top):
+        """Замеряет холодный старт воркера в новом процессе: импорт, create_app, первый запрос"""
+        from app.utils.startup import measure_cold_start
+
+        # Та же конфигурация, что у wsgi.py, иначе - по умолчанию
+        config_class = os.environ.get('APP_CONFIG', 'app.config.Config')
+        try:
+            report = measure_cold_start(config_class, path)
+        except RuntimeError as e:
+            raise click.ClickException(f"Приложение не запустилось: {e}")
+
+        click.echo(f"Конфигурация: {config_class}")
+        click.echo(f"Импорт пакета app: {report['import_ms']:.0f} мс")
+        click.echo(f"create_app: {report['create_app_ms']:.0f} мс")
+        click.echo(f"Первый запрос {path} ({report['status']}): {report['first_request_ms']:.0f} мс")
+        click.echo(f"Процесс целиком: {report['process_ms']:.0f} мс, модулей загружено: {report['modules']}")
+        click.echo("Собственное время импорта по пакетам:")
+        for name, ms in list(report['packages'].items())[:top]:
+            click.echo(f"  {name:<24} {ms:8.1f} мс")
+
+
+    @app.cli.command("calibrate-argon2")
+    @click.option("--target-ms", type=int, default=250, help="Желаемое время проверки пароля, мс")
+    @click.option("--memory-kib", type=int, default=None, help="Память на одну проверку, КиБ")
+    @click.option("--parallelism", type=int, default=None, help="Число потоков Argon2")
+    def calibrate_argon2_command(target_ms, memory_kib, parallelism):
+        """Подбирает ARGON2_TIME_COST, при котором хэширование на этом сервере занимает около target-ms"""
+        import time
+        import argon2
+
+        memory_kib = memory_kib or app.config['ARGON2_MEMORY_COST']
+        parallelism = parallelism or app.config['ARGON2_PARALLELISM']
+
+        def measure(time_cost):
+            hasher = argon2.PasswordHasher(
+                time_cost=time_cost, memory_cost=memory_kib, parallelism=parallelism,
+                hash_len=32, salt_len=16
+            )
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                hasher.hash("calibration password")
+                timings.append((time.perf_counter() - started) * 1000)
+            return sorted(timings)[1]
+
+        time_cost, elapsed = 1, measure(1)
+        click.echo(f"time_cost=1: {elapsed:.0f} мс")
+        while elapsed < target_ms and time_cost < 50:
+            time_cost += 1
+            elapsed = measure(time_cost)
+            click.echo(f"time_cost={time_cost}: {elapsed:.0f} мс")
+
+        if time_cost == 1 and elapsed > target_ms:
+            click.echo("Даже time_cost=1 медленнее цели - уменьшите --memory-kib")
+
+        workers = app.config['PASSWORD_WORKERS']
+        click.echo(
+            f"Рекомендуется: ARGON2_TIME_COST={time_cost} ARGON2_MEMORY_COST={memory_kib} "
+            f"ARGON2_PARALLELISM={parallelism}"
+        )
+        click.echo(
+            f"При PASSWORD_WORKERS={workers}: до {workers * 1000 / max(elapsed, 1):.1f} входов/с, "
+            f"{workers * memory_kib // 1024} МБ памяти на проверки"
+        )
+        click.echo("Старые хэши будут пересохранены с новыми параметрами при следующем входе")
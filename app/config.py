@@ -2,27 +2,171 @@ import os
 import datetime
 
 
+def _database_url(name, default=None):
+    url = os.environ.get(name) or default
+    # Heroku и некоторые хостинги отдают устаревшую схему postgres://
+    if url and url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'TEST_KEY_SECRET_EXAMPLE'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///updb.db'
+    SQLALCHEMY_DATABASE_URI = _database_url('DATABASE_URL', 'sqlite:///updb.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Профиль движка: sqlite или pooled (PostgreSQL и др.); по умолчанию выбирается по URI
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE')
+    # Реплика только для чтения для списков и поиска (@replica_reads)
+    DATABASE_REPLICA_URL = _database_url('DATABASE_REPLICA_URL')
+
+    # Профиль sqlite: выполняется на каждом новом соединении
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,  # мс ожидания блокировки вместо "database is locked"
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # отрицательное значение - в КиБ (64 МБ)
+        "temp_store": "MEMORY",
+    }
+
+    # Профиль pooled
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = 10  # секунд ожидания свободного соединения
+    DB_POOL_RECYCLE = 1800  # секунд
+    DB_QUERY_HEADER = False
+
+    # Метрики запросов (/metrics) и профилирование
+    METRICS_ENABLED = True
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer-токен для /metrics; без него эндпоинт закрыт (404)
+    METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC') == '1'  # открыть /metrics без токена (закрытая сеть)
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # общая папка снимков, чтобы /metrics суммировал воркеры gunicorn
+    METRICS_FLUSH_INTERVAL = 5  # секунд между записями снимка воркера
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS') or 1000)
+    SLOW_REQUEST_TOP_QUERIES = 5  # самых долгих SQL-запросов в записи лога
+    PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN')  # заголовок X-Profile: <токен> включает cProfile
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')  # по умолчанию instance/profiles
+
     # JWT settings
     JWT_ACCESS_TOKEN_EXPIRES = datetime.timedelta(minutes=60)
     JWT_REFRESH_TOKEN_EXPIRES = datetime.timedelta(weeks=2)
 
+    # Argon2: подобрать под сервер можно командой flask calibrate-argon2
+    ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST') or 3)
+    ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST') or 65536)  # КиБ
+    ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM') or 1)
+
+    # Проверка паролей: одновременно PASSWORD_WORKERS, еще PASSWORD_QUEUE_LIMIT ждут, остальные - 429
+    PASSWORD_WORKERS = 2
+    PASSWORD_QUEUE_LIMIT = 4
+
+    # Ограничение попыток входа: все попытки с одного IP и неудачные для одного логина
+    LOGIN_IP_LIMIT = 20
+    LOGIN_IP_WINDOW = datetime.timedelta(minutes=1)
+    LOGIN_USER_LIMIT = 5
+    LOGIN_USER_WINDOW = datetime.timedelta(minutes=5)
+
+    # Кэш пользователей для admin_required. Commit изменения пользователя сбрасывает его
+    # только в своем процессе: другие воркеры видят старую роль или удаленного пользователя
+    # не дольше PRINCIPAL_CACHE_TTL, поэтому срок короткий
+    PRINCIPAL_CACHE_TTL = datetime.timedelta(seconds=10)
+    PRINCIPAL_CACHE_SIZE = 256
+
     # File upload settings
     MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
     MAX_FILES = 20
     MAX_VIDEO_SIZE = 100 * 1024 * 1024  # 100MB
     MAX_VIDEOS = 5
-    UPLOAD_FOLDER = "static/uploads/parts"
+    # Запросы больше этого отклоняются по заголовку Content-Length до чтения тела;
+    # большие видео загружаются кусками через /parts/<id>/videos/uploads
+    MAX_CONTENT_LENGTH = 512 * 1024 * 1024  # 512MB
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+    UPLOAD_SESSION_TTL = datetime.timedelta(hours=24)
+    # Относительно instance/: файлы вне static доступны только через /media/parts (после входа)
+    UPLOAD_FOLDER = "uploads/parts"
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp", "heic"}
     ALLOWED_VIDEO_EXTENSIONS = {"mp4", "avi", "mov", "wmv", "flv", "webm", "mkv"}
 
+    # Media serving (/media/parts/...)
+    MEDIA_MAX_AGE = 365 * 24 * 60 * 60  # файлы неизменяемы, кэшируем на год
+    # None - отдает приложение; 'x-accel' - nginx по X-Accel-Redirect; 'x-sendfile' - заголовок X-Sendfile
+    MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD') or None
+    MEDIA_ACCEL_PREFIX = '/protected-media/parts/'
+    USE_X_SENDFILE = MEDIA_OFFLOAD == 'x-sendfile'
+
+    # Uploaded photo normalization (HEIC decode, EXIF strip, re-encode)
+    INGEST_IMAGE_FORMAT = "JPEG"
+    INGEST_IMAGE_QUALITY = 85
+    INGEST_MAX_SIDE = 2560
+
+    # Image variants (thumb/medium/full) settings
+    IMAGE_VARIANT_FORMAT = "WEBP"
+    IMAGE_VARIANT_QUALITY = 80
+    IMAGE_WORKERS = 2
+
+    # Сверка папки загрузок с базой (flask reconcile-media); интервал None - без фонового запуска
+    MEDIA_GC_INTERVAL = datetime.timedelta(hours=6)
+    MEDIA_GC_GRACE_PERIOD = datetime.timedelta(hours=1)
+    MEDIA_GC_BATCH_SIZE = 200
+    MEDIA_GC_BATCH_PAUSE = 0.5  # секунд между пачками
+
+    # Импорт деталей из файлов поставщиков (CSV/XLSX): коммит после каждой пачки строк
+    IMPORT_ALLOWED_EXTENSIONS = {"csv", "xlsx"}
+    IMPORT_MAX_SIZE = 100 * 1024 * 1024  # 100MB
+    IMPORT_BATCH_SIZE = 1000
+    IMPORT_WORKERS = 1  # импорты выполняются по очереди
+
+    # Выгрузка /export/*: строк из курсора базы за одну выборку
+    EXPORT_BATCH_SIZE = 1000
+
+    # Продакшен-сервер (gunicorn.conf.py, wsgi.py): процессы и потоки в каждом
+    WSGI_BIND = os.environ.get('WSGI_BIND') or '0.0.0.0:5000'
+    WSGI_WORKERS = int(os.environ.get('WSGI_WORKERS') or 4)
+    WSGI_THREADS = int(os.environ.get('WSGI_THREADS') or 4)
+    WSGI_PRELOAD = os.environ.get('WSGI_PRELOAD', '1') == '1'  # приложение создается в мастере до fork
+    WSGI_TIMEOUT = 120  # секунд на запрос: загрузка видео и выгрузки бывают долгими
+    WSGI_GRACEFUL_TIMEOUT = 30  # секунд на завершение текущих запросов при остановке и перезагрузке
+    WSGI_MAX_REQUESTS = int(os.environ.get('WSGI_MAX_REQUESTS') or 0)  # перезапуск воркера, 0 - нет
+    # Число прокси (nginx) перед приложением: адрес клиента и схема берутся из X-Forwarded-For/-Proto.
+    # 0 - заголовкам не доверять (приложение доступно напрямую, их может подделать клиент)
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES') or 0)
+
+    # Search settings
+    SEARCH_RESULTS_LIMIT = 100
+    API_SEARCH_LIMIT = 10
+
+    # Analytics: результаты кэшируются до изменения данных (но не дольше TTL)
+    ANALYTICS_CACHE_TTL = datetime.timedelta(minutes=10)
+    ANALYTICS_CACHE_SIZE = 64
+    ANALYTICS_MAX_ROWS = 1000
+    ANALYTICS_MAX_DAYS = 3650  # глубина периода (days, min_days) - 10 лет
+
+    # Кэш страниц деталей и продаж и фрагментов списков (ключ - id и версия строки):
+    # "memory" - в памяти процесса, "sqlite" - общий для воркеров файл PAGE_CACHE_PATH, "off" - выключен
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND') or 'memory'
+    PAGE_CACHE_PATH = os.environ.get('PAGE_CACHE_PATH')  # по умолчанию instance/page_cache.db
+    PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    PAGE_CACHE_TTL = datetime.timedelta(hours=1)
+
+    # Статика: flask build-assets кладет в static/dist копии с хэшем в имени и сжатые .gz/.br,
+    # url_for('static') подставляет их по манифесту, они отдаются с Cache-Control: immutable
+    ASSETS_MANIFEST = True
+    ASSETS_EXCLUDE = ("uploads",)  # папки static, которые не собираются
+    ASSETS_MAX_AGE = 365 * 24 * 3600
+
+    # Parts list settings
+    PARTS_PER_PAGE = 50
+    MAX_PARTS_PER_PAGE = 200
+    STREAM_CHUNK_SIZE = 16 * 1024
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    # Правки CSS/JS видны сразу, без пересборки статики
+    ASSETS_MANIFEST = False
+    # Число SQL-запросов в заголовке ответа X-DB-Queries
+    DB_QUERY_HEADER = True
 
 
 class ProductionConfig(Config):
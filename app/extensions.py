@@ -1,5 +1,87 @@
+from functools import wraps
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
 from .utils.security import PasswordHasher
 
-db = SQLAlchemy()
-password_hasher = PasswordHasher()
\ No newline at end of file
+REPLICA_BIND = "replica"
+
+
+class RoutingSession(Session):
+    """Сессия, которая в представлениях с @replica_reads читает с реплики, а пишет в основную базу"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("use_replica") and not self._flushing:
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+password_hasher = PasswordHasher()
+
+
+def _pooled_options(config):
+    return {
+        "pool_size": config['DB_POOL_SIZE'],
+        "max_overflow": config['DB_MAX_OVERFLOW'],
+        "pool_timeout": config['DB_POOL_TIMEOUT'],
+        "pool_recycle": config['DB_POOL_RECYCLE'],
+        # Соединение, закрытое сервером или балансировщиком, заменяется до выдачи в запрос
+        "pool_pre_ping": True,
+    }
+
+
+def _set_sqlite_pragmas(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+    return set_pragmas
+
+
+def init_database(app):
+    """Подключает db с профилем движка из конфигурации.
+
+    sqlite - WAL и PRAGMA (SQLITE_PRAGMAS) на каждое соединение;
+    pooled - пул соединений для PostgreSQL и других серверных баз.
+    При DATABASE_REPLICA_URL чтения в @replica_reads уходят на реплику.
+    """
+    config = app.config
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    profile = config.get('DATABASE_PROFILE') or ('sqlite' if uri.startswith('sqlite') else 'pooled')
+
+    # Копии: словари из класса конфигурации общие для всех приложений
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if profile == 'pooled':
+        for key, value in _pooled_options(config).items():
+            options.setdefault(key, value)
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_url = config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        replica_options = {} if replica_url.startswith('sqlite') else _pooled_options(config)
+        binds.setdefault(REPLICA_BIND, {"url": replica_url, **replica_options})
+        config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, "connect", _set_sqlite_pragmas(config['SQLITE_PRAGMAS']))
+
+
+def replica_reads(f):
+    """Запросы представления (только чтение) идут на реплику, если она настроена"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Флаг живет до конца запроса: сессия удаляется при закрытии контекста,
+        # а потоковые ответы выполняют запросы уже после возврата из представления
+        db.session.info["use_replica"] = True
+        return f(*args, **kwargs)
+
+    return decorated_function
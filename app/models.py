@@ -1,5 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from .extensions import db
+from .utils.search import normalize_text, normalize_part_number
+from .utils.images import parse_variants, variant_filename
+from .utils.media_store import register_ref_counting
+from .utils.security import invalidate_principal
+from flask import url_for
 from datetime import datetime
 
 
@@ -7,33 +14,99 @@ class User(db.Model):
     __tablename__ = "users"
 
     id = db.Column(db.Integer, primary_key=True)
-    login = db.Column(db.String(255))
+    login = db.Column(db.String(255), index=True)
     password = db.Column(db.String(255))
 
 
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_user_principal(mapper, connection, target):
+    # Сбрасываем кэш только после commit: откаченное изменение не должно его трогать
+    object_session(target).info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_principals(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_principals(session):
+    session.info.pop("changed_user_ids", None)
+
+
+class MediaBlob(db.Model):
+    """Файл в общем хранилище: имя - sha256 содержимого, ref_count - число ссылок из фото и видео"""
+    __tablename__ = "media_blobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    ext = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+
+    @property
+    def filename(self):
+        return f"{self.sha256}.{self.ext}"
+
+
 class PartImage(db.Model):
     __tablename__ = "part_images"
 
     id = db.Column(db.Integer, primary_key=True)
-    part_id = db.Column(db.Integer, db.ForeignKey('parts.id', ondelete='CASCADE'), nullable=False)
+    part_id = db.Column(db.Integer, db.ForeignKey('parts.id', ondelete='CASCADE'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
+    blob_id = db.Column(db.Integer, db.ForeignKey('media_blobs.id'), index=True)  # None - старый файл в папке детали
     is_main = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
+    variants = db.Column(db.String(255))  # готовые уменьшенные копии: 'thumb:160,medium:800,full:1920'
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")  # для ETag в API
 
     part = db.relationship('Part', backref=db.backref('images', cascade='all, delete-orphan'))
 
+    @property
+    def variant_widths(self):
+        return parse_variants(self.variants)
+
+    def url(self, variant=None):
+        """URL изображения нужного размера; пока варианта нет - оригинал"""
+        filename = self.filename
+        if variant and variant in self.variant_widths:
+            filename = variant_filename(self.filename, variant)
+        return url_for('media.part_file', pid=self.part_id, filename=filename)
+
+    @property
+    def srcset(self):
+        # Для маленьких оригиналов варианты совпадают по ширине - берем по одному на ширину
+        by_width = {}
+        for variant, width in self.variant_widths.items():
+            by_width.setdefault(width, variant)
+        return ", ".join(f"{self.url(variant)} {width}w" for width, variant in by_width.items())
+
 
 class PartVideo(db.Model):
     __tablename__ = "part_videos"
 
     id = db.Column(db.Integer, primary_key=True)
-    part_id = db.Column(db.Integer, db.ForeignKey('parts.id', ondelete='CASCADE'), nullable=False)
+    part_id = db.Column(db.Integer, db.ForeignKey('parts.id', ondelete='CASCADE'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
+    blob_id = db.Column(db.Integer, db.ForeignKey('media_blobs.id'), index=True)  # None - старый файл в папке детали
     original_filename = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
 
     part = db.relationship('Part', backref=db.backref('videos', cascade='all, delete-orphan'))
 
+    @property
+    def url(self):
+        filename = self.filename if self.blob_id else f'video/{self.filename}'
+        return url_for('media.part_file', pid=self.part_id, filename=filename)
+
+
+register_ref_counting(PartImage, PartVideo)
+
 
 class Part(db.Model):
     __tablename__ = "parts"
@@ -45,37 +118,143 @@ class Part(db.Model):
     description = db.Column(db.String(255))
     price_in = db.Column(db.Integer)
     price_out = db.Column(db.Integer)
-    quantity = db.Column(db.Integer, default=1)
+    quantity = db.Column(db.Integer, default=1, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # для возраста складских остатков
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")  # для ETag в API
+
+    # Нормализованные ключи для поиска (заполняются автоматически при записи)
+    name_key = db.Column(db.String(255), index=True)
+    car_key = db.Column(db.String(255), index=True)
+    description_key = db.Column(db.String(255), index=True)
+    part_number_key = db.Column(db.String(255), index=True)
+
+    def update_search_keys(self):
+        self.name_key = normalize_text(self.name)
+        self.car_key = normalize_text(self.car)
+        self.description_key = normalize_text(self.description)
+        self.part_number_key = normalize_part_number(self.part_number)
+
+    def touch(self):
+        """Поднимает версию при изменении фото и видео детали: это отдельные строки,
+        а от версии детали зависят ключи кэша ее страницы"""
+        self.version = Part.version + 1
+
+
+@event.listens_for(Part, 'before_insert')
+@event.listens_for(Part, 'before_update')
+def update_part_search_keys(mapper, connection, target):
+    target.update_search_keys()
+
+
+@event.listens_for(Part, 'before_update')
+@event.listens_for(PartImage, 'before_update')
+def bump_version(mapper, connection, target):
+    # Версия растет только при реальном изменении колонок; увеличивается в самом UPDATE,
+    # поэтому параллельные изменения не теряются. Массовые UPDATE увеличивают ее сами
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = type(target).version + 1
 
 
 class Sale(db.Model):
     __tablename__ = "sales"
 
     id = db.Column(db.Integer, primary_key=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     discount_type = db.Column(db.String(10))  # 'percent' или 'fixed'
     discount_value = db.Column(db.Integer)  # значение скидки
     total_amount = db.Column(db.Integer)  # общая сумма
     final_amount = db.Column(db.Integer)  # итоговая сумма после скидки
     transport_company = db.Column(db.String(255))  # название ТК
     tracking_number = db.Column(db.String(255))  # трек номер
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")  # для ETag в API
 
     items = db.relationship('SaleItem', backref='sale', cascade='all, delete-orphan')
 
 
+event.listen(Sale, 'before_update', bump_version)
+
+
 class SaleItem(db.Model):
     __tablename__ = "sale_items"
 
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id', ondelete='CASCADE'), nullable=False)
-    part_id = db.Column(db.Integer, db.ForeignKey('parts.id'), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id', ondelete='CASCADE'), nullable=False, index=True)
+    part_id = db.Column(db.Integer, db.ForeignKey('parts.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, default=1)
     unit_price = db.Column(db.Integer)  # цена на момент продажи
     total_price = db.Column(db.Integer)  # quantity * unit_price
+    unit_cost = db.Column(db.Integer)  # закупочная цена (price_in) на момент продажи
 
     # Сохраняем основные данные о детали на момент продажи
     part_name = db.Column(db.String(255))
     part_car = db.Column(db.String(255))
     part_number = db.Column(db.String(255))
 
-    part = db.relationship('Part')
\ No newline at end of file
+    part = db.relationship('Part')
+
+
+class CheckoutRequest(db.Model):
+    """Ключ идемпотентности оформления продажи: повтор запроса с тем же ключом возвращает ту же продажу"""
+    __tablename__ = "checkout_requests"
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), unique=True, nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 тела запроса
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    sale = db.relationship('Sale')
+
+
+class SalesRollupMixin:
+    """Итоги продаж за период; обновляются в транзакции продажи (app/utils/rollups.py)"""
+    sales_count = db.Column(db.Integer, nullable=False, default=0)
+    gross_amount = db.Column(db.BigInteger, nullable=False, default=0)  # сумма total_amount
+    net_amount = db.Column(db.BigInteger, nullable=False, default=0)  # сумма final_amount
+    discount_amount = db.Column(db.BigInteger, nullable=False, default=0)
+    cost_amount = db.Column(db.BigInteger, nullable=False, default=0)  # закупочная стоимость проданного
+    margin_amount = db.Column(db.BigInteger, nullable=False, default=0)  # net_amount - cost_amount
+
+
+class SalesDaily(SalesRollupMixin, db.Model):
+    __tablename__ = "sales_daily"
+
+    day = db.Column(db.Date, primary_key=True)  # по UTC, как Sale.created_at
+
+
+class SalesMonthly(SalesRollupMixin, db.Model):
+    __tablename__ = "sales_monthly"
+
+    month = db.Column(db.Date, primary_key=True)  # первое число месяца
+
+
+class ImportJob(db.Model):
+    """Фоновый импорт деталей из файла поставщика (app/utils/importer.py)"""
+    __tablename__ = "import_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)  # имя файла у пользователя
+    quantity_mode = db.Column(db.String(10), nullable=False, default='add')  # 'add' или 'set'
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    rows = db.Column(db.Integer, nullable=False, default=0)  # обработано строк
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)  # причина, если импорт остановился целиком
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "quantity_mode": self.quantity_mode,
+            "status": self.status,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
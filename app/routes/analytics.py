@@ -0,0 +1,57 @@
+from flask import Blueprint, request, jsonify, current_app
+from app.extensions import replica_reads
+from app.utils.security import admin_required
+
+# app.utils.analytics (и numpy) импортируется в представлениях - при первом запросе аналитики,
+# а не при старте каждого воркера
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
+
+
+def _int_arg(name, default, maximum=None):
+    value = request.args.get(name, type=int) or default
+    value = max(1, value)
+    return min(value, maximum) if maximum else value
+
+
+@analytics_bp.route("/margin-by-car", methods=["GET"])
+@admin_required
+@replica_reads
+def margin_by_car():
+    from app.utils import analytics
+
+    days = _int_arg('days', 365, current_app.config['ANALYTICS_MAX_DAYS'])
+    return jsonify({'days': days, 'cars': analytics.margin_by_car(days)})
+
+
+@analytics_bp.route("/abc", methods=["GET"])
+@admin_required
+@replica_reads
+def abc():
+    from app.utils import analytics
+
+    days = _int_arg('days', 365, current_app.config['ANALYTICS_MAX_DAYS'])
+    limit = _int_arg('limit', 100, current_app.config['ANALYTICS_MAX_ROWS'])
+    return jsonify({'days': days, **analytics.abc_classes(days, limit)})
+
+
+@analytics_bp.route("/turnover", methods=["GET"])
+@admin_required
+@replica_reads
+def turnover():
+    from app.utils import analytics
+
+    days = _int_arg('days', 365, current_app.config['ANALYTICS_MAX_DAYS'])
+    limit = _int_arg('limit', 100, current_app.config['ANALYTICS_MAX_ROWS'])
+    return jsonify(analytics.turnover(days, limit))
+
+
+@analytics_bp.route("/dead-stock", methods=["GET"])
+@admin_required
+@replica_reads
+def dead_stock():
+    from app.utils import analytics
+
+    min_days = _int_arg('min_days', 180, current_app.config['ANALYTICS_MAX_DAYS'])
+    limit = _int_arg('limit', 100, current_app.config['ANALYTICS_MAX_ROWS'])
+    return jsonify(analytics.dead_stock(min_days, limit))
@@ -0,0 +1,143 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy import select
+from sqlalchemy.orm import load_only, selectinload
+from app.extensions import db, replica_reads
+from app.models import Part, PartImage, Sale
+from app.utils.security import admin_required
+from app.utils.pagination import get_page_args, KeysetPage
+from app.utils.api import (
+    ApiError, PART_FIELDS, IMAGE_FIELDS, SALE_FIELDS, parse_fields, parse_include, make_etag,
+    not_modified, json_with_etag, part_to_dict, image_to_dict, sale_to_api_dict
+)
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+@api_bp.errorhandler(ApiError)
+def api_error(e):
+    return jsonify({'error': e.message}), e.status
+
+
+def _columns(model, fields, *extra):
+    """Колонки для load_only: только запрошенные поля плюс нужные для курсора и ETag"""
+    names = {name for name in fields if name in model.__table__.columns} | {"id", "version", *extra}
+    return load_only(*(getattr(model, name) for name in names))
+
+
+def _image_versions(images):
+    return tuple((image.id, image.version) for image in images)
+
+
+def _page_payload(page, data):
+    return {"data": data, "next": page.next_url}
+
+
+# --- Детали ---
+
+@api_bp.route("/parts", methods=["GET"])
+@admin_required
+@replica_reads
+def list_parts():
+    """Детали с курсорной пагинацией: sort, order, per_page, after, in_stock=1, fields=, include=images"""
+    fields = parse_fields(PART_FIELDS)
+    include = parse_include(("images",))
+    page_args = get_page_args()
+
+    query = Part.query.options(_columns(Part, fields, "price_out", "quantity"))
+    if "images" in include:
+        # Фото всей страницы одним запросом IN (...), а не по запросу на деталь
+        query = query.options(selectinload(Part.images))
+    if request.args.get('in_stock') in ('1', 'true'):
+        query = query.filter(Part.quantity > 0)
+
+    page = KeysetPage(query, Part, **page_args)
+    parts = list(page)
+
+    etag = make_etag(
+        "parts", fields, include, page.next_cursor,
+        [(part.id, part.version, _image_versions(part.images) if "images" in include else ()) for part in parts]
+    )
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    return json_with_etag(_page_payload(page, [part_to_dict(part, fields, include) for part in parts]), etag)
+
+
+@api_bp.route("/parts/<int:pid>", methods=["GET"])
+@admin_required
+@replica_reads
+def get_part(pid):
+    fields = parse_fields(PART_FIELDS)
+    include = parse_include(("images",))
+
+    # ETag проверяется по версиям до загрузки и сериализации детали
+    version = db.session.execute(select(Part.version).where(Part.id == pid)).scalar()
+    if version is None:
+        raise ApiError("Деталь не найдена", 404)
+    images = ()
+    if "images" in include:
+        images = tuple(db.session.execute(
+            select(PartImage.id, PartImage.version).where(PartImage.part_id == pid).order_by(PartImage.id)
+        ).tuples())
+
+    etag = make_etag("part", fields, include, pid, version, images)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    part = db.session.get(Part, pid, options=[_columns(Part, fields)])
+    return json_with_etag(part_to_dict(part, fields, include), etag)
+
+
+@api_bp.route("/parts/<int:pid>/images", methods=["GET"])
+@admin_required
+@replica_reads
+def list_part_images(pid):
+    fields = parse_fields(IMAGE_FIELDS)
+    if db.session.execute(select(Part.id).where(Part.id == pid)).first() is None:
+        raise ApiError("Деталь не найдена", 404)
+
+    images = PartImage.query.filter_by(part_id=pid).order_by(PartImage.id).all()
+    etag = make_etag("images", fields, pid, _image_versions(images))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    return json_with_etag({"data": [image_to_dict(image, fields) for image in images]}, etag)
+
+
+# --- Продажи ---
+
+@api_bp.route("/sales", methods=["GET"])
+@admin_required
+@replica_reads
+def list_sales():
+    """Продажи с курсорной пагинацией по id: order, per_page, after, fields= (items - позиции)"""
+    fields = parse_fields(SALE_FIELDS)
+    page_args = {**get_page_args(), "sort": "id"}
+
+    query = Sale.query.options(_columns(Sale, fields))
+    if "items" in fields:
+        query = query.options(selectinload(Sale.items))
+
+    page = KeysetPage(query, Sale, **page_args)
+    sales = list(page)
+
+    etag = make_etag("sales", fields, page.next_cursor, [(sale.id, sale.version) for sale in sales])
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    return json_with_etag(_page_payload(page, [sale_to_api_dict(sale, fields) for sale in sales]), etag)
+
+
+@api_bp.route("/sales/<int:sale_id>", methods=["GET"])
+@admin_required
+@replica_reads
+def get_sale(sale_id):
+    fields = parse_fields(SALE_FIELDS)
+
+    version = db.session.execute(select(Sale.version).where(Sale.id == sale_id)).scalar()
+    if version is None:
+        raise ApiError("Продажа не найдена", 404)
+
+    etag = make_etag("sale", fields, sale_id, version)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    sale = db.session.get(Sale, sale_id, options=[_columns(Sale, fields)])
+    return json_with_etag(sale_to_api_dict(sale, fields), etag)
@@ -1,11 +1,30 @@
 from flask import Blueprint, request, render_template, redirect, session, jsonify, current_app
 from app.extensions import db, password_hasher
 from app.models import User
-from app.utils.security import create_access_token, create_refresh_token
-import jwt
+from app.utils.security import create_access_token, create_refresh_token, user_role, PasswordBusyError
+from app.utils.throttle import get_limiter
 
 auth_bp = Blueprint("auth", __name__)
 
+def _login_limiters():
+    config = current_app.config
+    return (
+        get_limiter("login_ip", config['LOGIN_IP_LIMIT'], config['LOGIN_IP_WINDOW']),
+        get_limiter("login_user", config['LOGIN_USER_LIMIT'], config['LOGIN_USER_WINDOW']),
+    )
+
+
+def _too_many_attempts(retry_after):
+    error = "Слишком много попыток входа, попробуйте позже"
+    if request.headers.get('Content-Type') == 'application/json':
+        response = jsonify({'error': error})
+    else:
+        response = current_app.make_response(render_template("login.html", error=error))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
 # Используем url_prefix при регистрации blueprint
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
@@ -14,15 +33,34 @@ def login():
             username = request.form.get("username")
             password = request.form.get("password")
 
+            # Лимиты проверяются до Argon2: перебор отклоняется, не занимая CPU и память
+            ip_limiter, user_limiter = _login_limiters()
+            user_key = (username or "").casefold()
+            retry_after = user_limiter.retry_after(user_key)
+            if retry_after or not ip_limiter.hit(request.remote_addr):
+                return _too_many_attempts(retry_after or ip_limiter.retry_after(request.remote_addr))
+
             user = User.query.filter_by(login=username).first()
 
-            if user and password_hasher.verify_password(user.password, password):
+            try:
+                valid, new_hash = password_hasher.verify_and_update(user.password if user else None, password or "")
+            except PasswordBusyError:
+                return _too_many_attempts(1)
+
+            if user and valid:
+                user_limiter.reset(user_key)
+                if new_hash:
+                    # Параметры Argon2 поменялись - пересохраняем хэш
+                    user.password = new_hash
+                    db.session.commit()
+
                 # Session for browser
                 session['user_id'] = user.id
                 session['username'] = user.login
+                session['role'] = user_role(user)
 
                 # JWT for API
-                access_token = create_access_token(user.id)
+                access_token = create_access_token(user.id, user_role(user))
                 refresh_token = create_refresh_token(user.id)
 
                 if request.headers.get('Content-Type') == 'application/json':
@@ -34,6 +72,7 @@ def login():
 
                 return redirect('/')
             else:
+                user_limiter.hit(user_key)
                 error = "Неверный логин или пароль"
                 if request.headers.get('Content-Type') == 'application/json':
                     return jsonify({'error': error}), 401
@@ -54,6 +93,8 @@ def logout():
 
 @auth_bp.route("/refresh", methods=["POST"], endpoint='refresh')
 def refresh():
+    import jwt  # Импортируется при первом обновлении токена, а не при старте воркера
+
     try:
         refresh_token = request.json.get('refresh_token')
         if not refresh_token:
@@ -68,7 +109,7 @@ def refresh():
         if not user:
             return jsonify({'error': 'User not found'}), 401
 
-        new_access_token = create_access_token(user.id)
+        new_access_token = create_access_token(user.id, user_role(user))
         return jsonify({'access_token': new_access_token})
 
     except jwt.ExpiredSignatureError:
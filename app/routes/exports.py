@@ -0,0 +1,52 @@
+from datetime import date, datetime
+from flask import Blueprint, request, current_app, stream_with_context
+from app.extensions import replica_reads
+from app.utils.security import admin_required
+from app.utils.export import EXPORT_FORMATS, parts_query, sales_query, export_chunks
+
+exports_bp = Blueprint('exports', __name__, url_prefix='/export')
+
+
+def _date_arg(name):
+    """Дата из параметра запроса (YYYY-MM-DD) или None"""
+    try:
+        return date.fromisoformat(request.args[name]) if request.args.get(name) else None
+    except ValueError:
+        return None
+
+
+def _export_response(name, query):
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return f"Неизвестный формат: {export_format}. Доступны: {', '.join(EXPORT_FORMATS)}", 400
+
+    mimetype, ext = EXPORT_FORMATS[export_format]
+    filename = f"{name}-{datetime.utcnow():%Y%m%d-%H%M}.{ext}"
+    # Запрос к базе выполняется по мере отправки ответа, контекст запроса держим до конца
+    response = current_app.response_class(
+        stream_with_context(export_chunks(export_format, query, name)),
+        mimetype=mimetype
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@exports_bp.route("/parts", methods=["GET"])
+@admin_required
+@replica_reads
+def export_parts():
+    """Детали: format=csv|ndjson|xlsx, in_stock=1 - только в наличии, start/end - дата поступления"""
+    query = parts_query(
+        in_stock=request.args.get('in_stock') in ('1', 'true'),
+        start=_date_arg('start'),
+        end=_date_arg('end')
+    )
+    return _export_response("parts", query)
+
+
+@exports_bp.route("/sales", methods=["GET"])
+@admin_required
+@replica_reads
+def export_sales():
+    """Позиции продаж (строка на позицию): format=csv|ndjson|xlsx, start/end - дата продажи"""
+    return _export_response("sales", sales_query(start=_date_arg('start'), end=_date_arg('end')))
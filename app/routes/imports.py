@@ -0,0 +1,71 @@
+import os
+from flask import Blueprint, render_template, request, redirect, jsonify, send_file, abort
+from app.extensions import db
+from app.models import ImportJob
+from app.utils.security import admin_required
+from app.utils.importer import start_import, allowed_import, error_report_path
+
+imports_bp = Blueprint('imports', __name__)
+
+
+def _start_from_request():
+    """Запускает импорт из файла формы (поле file), возвращает (job, ошибка)"""
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return None, "Файл не выбран"
+    if not allowed_import(file.filename):
+        return None, "Поддерживаются файлы CSV и XLSX"
+    quantity_mode = request.form.get('quantity_mode', 'add')
+    if quantity_mode not in ('add', 'set'):
+        return None, "Неизвестный режим количества"
+    return start_import(file, quantity_mode), None
+
+
+@imports_bp.route("/parts/import", methods=["GET"])
+@admin_required
+def import_page():
+    jobs = ImportJob.query.order_by(ImportJob.id.desc()).limit(20).all()
+    return render_template("import_parts.html", jobs=jobs)
+
+
+@imports_bp.route("/parts/import", methods=["POST"])
+@admin_required
+def import_upload():
+    job, error = _start_from_request()
+    if error:
+        return error, 400
+    return redirect('/parts/import')
+
+
+@imports_bp.route("/api/imports", methods=["POST"])
+@admin_required
+def api_import_upload():
+    """Импорт multipart-запросом: file и quantity_mode (add|set). Ответ 202 с адресом статуса"""
+    job, error = _start_from_request()
+    if error:
+        return jsonify({'error': error}), 400
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = f'/api/imports/{job.id}'
+    return response
+
+
+@imports_bp.route("/api/imports/<int:job_id>", methods=["GET"])
+@admin_required
+def api_import_status(job_id):
+    job = db.session.get(ImportJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Импорт не найден'}), 404
+    return jsonify({**job.to_dict(), 'errors_url': f'/parts/import/{job.id}/errors'})
+
+
+@imports_bp.route("/parts/import/<int:job_id>/errors", methods=["GET"])
+@admin_required
+def import_errors(job_id):
+    """CSV с ошибками строк: номер строки, номер детали, причина"""
+    job = db.session.get(ImportJob, job_id)
+    path = error_report_path(job_id)
+    if job is None or not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype='text/csv', as_attachment=True,
+                     download_name=f'import-{job_id}-errors.csv', max_age=0)
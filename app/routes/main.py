@@ -1,7 +1,41 @@
-from flask import Blueprint, render_template
+import hmac
+from flask import Blueprint, render_template, jsonify, request, current_app, Response, abort
+from app.utils.security import admin_required
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route("/")
 def index():
-    return render_template("index.html")
\ No newline at end of file
+    return render_template("index.html")
+
+@main_bp.route("/api/cache/stats")
+@admin_required
+def cache_stats():
+    """Размер и попадания кэшей этого воркера (кэш страниц sqlite - общий для всех)"""
+    from app.utils.page_cache import get_page_cache
+    from app.utils.analytics import get_cache as get_analytics_cache
+    from app.utils.security import get_principal_cache
+
+    pages = get_page_cache()
+    return jsonify({
+        "pages": pages.stats() if pages else None,
+        "analytics": get_analytics_cache().stats(),
+        "principals": get_principal_cache().stats(),
+    })
+
+@main_bp.route("/metrics")
+def metrics():
+    """Метрики в формате Prometheus: с Authorization: Bearer <METRICS_TOKEN> или при METRICS_PUBLIC"""
+    from app.utils.metrics import render_metrics
+
+    token = current_app.config['METRICS_TOKEN']
+    if not token and not current_app.config['METRICS_PUBLIC']:
+        # Имена эндпоинтов и объем трафика не для всех - без настройки эндпоинта как будто нет
+        abort(404)
+    if token:
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return Response("metrics token required\n", 401, {"WWW-Authenticate": "Bearer"})
+        if not hmac.compare_digest(header[len('Bearer '):].encode(), token.encode()):
+            return Response("invalid metrics token\n", 403)
+    return Response(render_metrics(current_app), content_type="text/plain; version=0.0.4; charset=utf-8")
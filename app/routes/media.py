@@ -0,0 +1,74 @@
+import os
+import mimetypes
+from flask import Blueprint, current_app, request, send_from_directory, abort, jsonify
+from werkzeug.security import safe_join
+from app.utils.security import admin_required
+from app.utils.media_store import BLOBS_DIR, is_blob_name, get_blob_path, media_usage
+
+media_bp = Blueprint('media', __name__)
+
+
+def _apply_cache_headers(response):
+    # Имена файлов уникальны (uuid) и содержимое под ними не меняется
+    # Доступ только после авторизации - общим кэшам (CDN, прокси) хранить нельзя
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['MEDIA_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+
+@media_bp.route("/media/parts/<int:pid>/<path:filename>", methods=["GET"])
+@admin_required
+def part_file(pid, filename):
+    """Отдает фото и видео детали с поддержкой Range, ETag и долгого кэширования"""
+    if is_blob_name(filename):
+        # Файл из общего хранилища (blobs/<xx>/<sha256>...)
+        file_path = get_blob_path(filename)
+        directory, filename = os.path.split(file_path)
+        accel_path = f"{BLOBS_DIR}/{os.path.basename(directory)}/{filename}"
+        # Имя - sha256 содержимого (и вариант превью): тот же ETag на любом сервере и после копирования
+        etag = filename
+    else:
+        # Старые файлы, лежащие в папке детали
+        directory = os.path.join(
+            current_app.instance_path,
+            current_app.config['UPLOAD_FOLDER'],
+            str(pid)
+        )
+        accel_path = f"{pid}/{filename}"
+        etag = None
+
+    if current_app.config['MEDIA_OFFLOAD'] == 'x-accel':
+        # Приложение только проверяет доступ, байты отдает nginx (internal location)
+        file_path = safe_join(directory, filename)
+        if file_path is None or not os.path.isfile(file_path):
+            abort(404)
+
+        stat = os.stat(file_path)
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        )
+        response.headers['X-Accel-Redirect'] = f"{current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/')}/{accel_path}"
+        response.set_etag(etag or f"{stat.st_mtime}-{stat.st_size}")
+        response.last_modified = stat.st_mtime
+        _apply_cache_headers(response)
+        return response.make_conditional(request)
+
+    # Range, ETag, Last-Modified и 304 обрабатывает send_file;
+    # при MEDIA_OFFLOAD = 'x-sendfile' он же отдает заголовок X-Sendfile
+    response = send_from_directory(
+        directory,
+        filename,
+        conditional=True,
+        etag=etag or True,
+        max_age=current_app.config['MEDIA_MAX_AGE']
+    )
+    return _apply_cache_headers(response)
+
+
+@media_bp.route("/api/media/usage", methods=["GET"])
+@admin_required
+def usage():
+    """Объем хранилища и экономия места от дедупликации"""
+    return jsonify(media_usage())
@@ -1,18 +1,30 @@
 from flask import Blueprint, render_template, request, redirect, current_app, jsonify, session
-from app.extensions import db
+from app.extensions import db, replica_reads
 from app.models import Part, PartImage, PartVideo
 from app.utils.security import admin_required
-from app.utils.file_handling import allowed_file, allowed_video, get_upload_path, get_video_upload_path, generate_unique_filename, delete_image_file, delete_video_file
-from sqlalchemy import or_
+from app.utils.file_handling import allowed_file, allowed_video, delete_image_file, delete_video_file
+from app.utils.images import schedule_variants
+from app.utils.media_store import store_upload, store_file
+from app.utils.uploads import get_file_size, create_upload_session, load_upload_session, append_chunk, finish_upload_session
+from app.utils.search import find_part_ids, load_parts
+from app.utils.pagination import get_page_args, KeysetPage, RankedPage, stream_page
+from app.utils.page_cache import cached_page, invalidate_parts
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 
 parts_bp = Blueprint('parts', __name__)
 
 @parts_bp.route("/parts", methods=["GET"], strict_slashes=False)
 @admin_required
+@replica_reads
 def all_parts():
-    parts = Part.query.options(db.joinedload(Part.images)).all()
-    return render_template("all_parts.html", parts=parts)
+    page_args = get_page_args()
+    parts = KeysetPage(
+        Part.query.options(db.selectinload(Part.images)),
+        Part,
+        **page_args
+    )
+    return stream_page("all_parts.html", parts=parts)
 
 @parts_bp.route("/parts/new_part", methods=["GET"], strict_slashes=False)
 @admin_required
@@ -23,8 +35,11 @@ def new_part_form():
 @admin_required
 def get_one_part(pid):
     try:
-        part = db.session.get(Part, pid)
-        return render_template("part.html", part=part)
+        # Деталь, фото и видео загружаются только при промахе кэша
+        html = cached_page(Part, pid, lambda: render_template("part.html", part=db.session.get(Part, pid)))
+        if html is None:
+            return render_template("part.html", part=None)
+        return html
     except Exception as e:
         return f"Деталь не найдена - {e}"
 
@@ -52,11 +67,13 @@ def delete_one_part(pid):
         # Удаляем деталь (изображения и видео удалятся автоматически благодаря каскаду)
         db.session.delete(to_delete)
         db.session.commit()
+        invalidate_parts([pid], deleted=[pid])
 
         return "deleted", 200
 
     except Exception as e:
         db.session.rollback()
+        current_app.logger.exception("Ошибка при удалении детали %s", pid)
         return f"error - {e}", 500
 
 @parts_bp.route("/parts/new_part/added", methods=["POST"], strict_slashes=False)
@@ -98,38 +115,31 @@ def add_part():
         db.session.add(part)
         db.session.flush()  # Получаем ID до коммита
 
-        # Создаем папки для изображений и видео этой детали
-        part_upload_path = get_upload_path(part.id)
-        video_upload_path = get_video_upload_path(part.id)
-
         # Обрабатываем изображения
+        new_images = []
         if 'images' in request.files:
             files = request.files.getlist('images')
 
             for i, image_file in enumerate(files):
                 if image_file and image_file.filename != '' and allowed_file(image_file.filename):
                     # Проверяем размер файла
-                    image_file.seek(0, 2)
-                    file_size = image_file.tell()
-                    image_file.seek(0)
+                    file_size = get_file_size(image_file)
 
                     if file_size > current_app.config['MAX_FILE_SIZE']:
                         continue
 
-                    # Генерируем уникальное имя
-                    unique_filename = generate_unique_filename(image_file.filename)
-                    file_path = os.path.join(part_upload_path, unique_filename)
-
-                    # Сохраняем файл
-                    image_file.save(file_path)
+                    # Кладем файл в хранилище: одинаковое содержимое хранится один раз
+                    blob = store_upload(image_file)
 
                     # Создаем запись в базе
                     part_image = PartImage(
                         part_id=part.id,
-                        filename=unique_filename,
+                        filename=blob.filename,
+                        blob_id=blob.id,
                         is_main=(i == 0)  # Первое фото - главное
                     )
                     db.session.add(part_image)
+                    new_images.append(part_image)
 
         # Обрабатываем видео
         if 'videos' in request.files:
@@ -138,39 +148,127 @@ def add_part():
             for video_file in video_files:
                 if video_file and video_file.filename != '' and allowed_video(video_file.filename):
                     # Проверяем размер файла
-                    video_file.seek(0, 2)
-                    file_size = video_file.tell()
-                    video_file.seek(0)
+                    file_size = get_file_size(video_file)
 
                     if file_size > current_app.config['MAX_VIDEO_SIZE']:
                         continue
 
-                    # Генерируем уникальное имя
-                    unique_filename = generate_unique_filename(video_file.filename)
-                    file_path = os.path.join(video_upload_path, unique_filename)
-
-                    # Сохраняем файл
-                    video_file.save(file_path)
+                    # Кладем файл в хранилище: одинаковое содержимое хранится один раз
+                    blob = store_upload(video_file)
 
                     # Создаем запись в базе
                     part_video = PartVideo(
                         part_id=part.id,
-                        filename=unique_filename,
+                        filename=blob.filename,
+                        blob_id=blob.id,
                         original_filename=video_file.filename
                     )
                     db.session.add(part_video)
 
         db.session.commit()
+        invalidate_parts([part.id])
+
+        # Уменьшенные копии создаются в фоне, страница пока показывает оригиналы
+        schedule_variants(new_images)
+
         return redirect(f'/parts/{part.id}')
 
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        raise
+
     except Exception as e:
         db.session.rollback()
-        # Если произошла ошибка, удаляем созданную папку
-        if 'part' in locals():
-            from app.utils.file_handling import delete_part_folder
-            delete_part_folder(part.id)
+        # Файлы, успевшие попасть в хранилище, подберет сверка медиа (flask reconcile-media)
         return f"Ошибка при добавлении детали: {str(e)}", 400
 
+@parts_bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    message = f"Слишком большой файл или запрос: {e.description}"
+    if request.is_json or request.method == "PATCH":
+        return jsonify({'error': message}), 413
+    return message, 413
+
+@parts_bp.route("/parts/<int:pid>/videos/uploads", methods=["POST"], strict_slashes=False)
+@admin_required
+def start_video_upload(pid):
+    part = Part.query.get_or_404(pid)
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    size = data.get('size')
+
+    if not allowed_video(filename):
+        return jsonify({'error': 'Недопустимый формат видео'}), 400
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({'error': 'Не указан размер файла'}), 400
+    if size > current_app.config['MAX_VIDEO_SIZE']:
+        return jsonify({'error': f"Видео больше {current_app.config['MAX_VIDEO_SIZE'] // (1024 * 1024)} МБ"}), 413
+    if len(part.videos) >= current_app.config['MAX_VIDEOS']:
+        return jsonify({'error': f"Слишком много видео файлов. Максимум: {current_app.config['MAX_VIDEOS']}"}), 400
+
+    upload = create_upload_session(part.id, filename, size)
+    upload['chunk_size'] = current_app.config['UPLOAD_CHUNK_SIZE']
+    upload['url'] = f"/parts/{part.id}/videos/uploads/{upload['upload_id']}"
+    return jsonify(upload), 201
+
+@parts_bp.route("/parts/<int:pid>/videos/uploads/<upload_id>", methods=["GET"], strict_slashes=False)
+@admin_required
+def video_upload_status(pid, upload_id):
+    upload = load_upload_session(upload_id, pid)
+    if not upload:
+        return jsonify({'error': 'Загрузка не найдена'}), 404
+
+    response = jsonify(upload)
+    response.headers['Upload-Offset'] = str(upload['offset'])
+    return response
+
+@parts_bp.route("/parts/<int:pid>/videos/uploads/<upload_id>", methods=["PATCH"], strict_slashes=False)
+@admin_required
+def upload_video_chunk(pid, upload_id):
+    upload = load_upload_session(upload_id, pid)
+    if not upload:
+        return jsonify({'error': 'Загрузка не найдена'}), 404
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        new_offset = append_chunk(upload, offset, request.stream, request.content_length)
+    except ValueError as e:
+        # Клиент должен запросить текущее смещение и продолжить с него
+        response = jsonify({'error': str(e), 'offset': upload['offset']})
+        response.headers['Upload-Offset'] = str(upload['offset'])
+        return response, 409
+
+    if not upload['complete']:
+        response = jsonify({'upload_id': upload_id, 'offset': new_offset, 'size': upload['size']})
+        response.headers['Upload-Offset'] = str(new_offset)
+        return response
+
+    # Файл принят полностью - переносим его к видео детали
+    try:
+        part = Part.query.get_or_404(pid)
+        ext = upload['filename'].rsplit('.', 1)[1].lower()
+        blob = store_file(finish_upload_session(upload), ext)
+
+        part_video = PartVideo(
+            part_id=part.id,
+            filename=blob.filename,
+            blob_id=blob.id,
+            original_filename=upload['filename']
+        )
+        db.session.add(part_video)
+        part.touch()
+        db.session.commit()
+        invalidate_parts([part.id])
+
+        response = jsonify({'upload_id': upload_id, 'offset': new_offset, 'size': upload['size'], 'video_id': part_video.id})
+        response.headers['Upload-Offset'] = str(new_offset)
+        return response, 201
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Ошибка при сохранении видео детали %s", pid)
+        return jsonify({'error': f"Ошибка при сохранении видео: {str(e)}"}), 500
+
 @parts_bp.route("/parts/<int:pid>/edit", methods=["GET", "POST"], strict_slashes=False)
 @admin_required
 def edit_part(pid):
@@ -186,10 +284,8 @@ def edit_part(pid):
             part.price_in = int(request.form['price_in'])
             part.price_out = int(request.form['price_out'])
             part.quantity = int(request.form['quantity'])  # ← Обновляем количество
-
-            # Получаем пути к папкам детали
-            part_upload_path = get_upload_path(part.id)
-            video_upload_path = get_video_upload_path(part.id)
+            # Фото и видео - отдельные строки, при их изменении версию детали поднимаем сами
+            media_changed = False
 
             # Обработка УДАЛЕНИЯ изображений
             if 'delete_images' in request.form:
@@ -201,6 +297,7 @@ def edit_part(pid):
                         delete_image_file(part.id, image.filename)
                         # Удаляем запись из БД
                         db.session.delete(image)
+                        media_changed = True
 
             # Обработка УДАЛЕНИЯ видео
             if 'delete_videos' in request.form:
@@ -212,6 +309,7 @@ def edit_part(pid):
                         delete_video_file(part.id, video.filename)
                         # Удаляем запись из БД
                         db.session.delete(video)
+                        media_changed = True
 
             # Обработка установки главного изображения
             if 'main_image' in request.form:
@@ -223,35 +321,34 @@ def edit_part(pid):
                 main_image = PartImage.query.get(main_image_id)
                 if main_image and main_image.part_id == part.id:
                     main_image.is_main = True
+                media_changed |= any(db.session.is_modified(image) for image in part.images)
 
             # Обработка НОВЫХ изображений
+            new_images = []
             if 'images' in request.files:
                 files = request.files.getlist('images')
 
                 for i, image_file in enumerate(files):
                     if image_file and image_file.filename != '' and allowed_file(image_file.filename):
                         # Проверяем размер файла
-                        image_file.seek(0, 2)
-                        file_size = image_file.tell()
-                        image_file.seek(0)
+                        file_size = get_file_size(image_file)
 
                         if file_size > current_app.config['MAX_FILE_SIZE']:
                             continue
 
-                        # Генерируем уникальное имя
-                        unique_filename = generate_unique_filename(image_file.filename)
-                        file_path = os.path.join(part_upload_path, unique_filename)
-
-                        # Сохраняем файл
-                        image_file.save(file_path)
+                        # Кладем файл в хранилище: одинаковое содержимое хранится один раз
+                        blob = store_upload(image_file)
 
                         # Создаем запись в базе
                         part_image = PartImage(
                             part_id=part.id,
-                            filename=unique_filename,
+                            filename=blob.filename,
+                            blob_id=blob.id,
                             is_main=(i == 0 and not part.images)  # Главное, если первое и нет других изображений
                         )
                         db.session.add(part_image)
+                        new_images.append(part_image)
+                        media_changed = True
 
             # Обработка НОВЫХ видео
             if 'videos' in request.files:
@@ -260,31 +357,37 @@ def edit_part(pid):
                 for video_file in video_files:
                     if video_file and video_file.filename != '' and allowed_video(video_file.filename):
                         # Проверяем размер файла
-                        video_file.seek(0, 2)
-                        file_size = video_file.tell()
-                        video_file.seek(0)
+                        file_size = get_file_size(video_file)
 
                         if file_size > current_app.config['MAX_VIDEO_SIZE']:
                             continue
 
-                        # Генерируем уникальное имя
-                        unique_filename = generate_unique_filename(video_file.filename)
-                        file_path = os.path.join(video_upload_path, unique_filename)
-
-                        # Сохраняем файл
-                        video_file.save(file_path)
+                        # Кладем файл в хранилище: одинаковое содержимое хранится один раз
+                        blob = store_upload(video_file)
 
                         # Создаем запись в базе
                         part_video = PartVideo(
                             part_id=part.id,
-                            filename=unique_filename,
+                            filename=blob.filename,
+                            blob_id=blob.id,
                             original_filename=video_file.filename
                         )
                         db.session.add(part_video)
+                        media_changed = True
 
+            if media_changed:
+                part.touch()
             db.session.commit()
+            invalidate_parts([pid])
+
+            schedule_variants(new_images)
+
             return redirect(f"/parts/{pid}")
 
+        except RequestEntityTooLarge:
+            db.session.rollback()
+            raise
+
         except Exception as e:
             db.session.rollback()
             return f"Ошибка при обновлении: {str(e)}", 400
@@ -293,6 +396,7 @@ def edit_part(pid):
 
 @parts_bp.route("/search", methods=["GET"], strict_slashes=False)
 @admin_required
+@replica_reads
 def search():
     search_request = request.args.get("q")
 
@@ -300,25 +404,20 @@ def search():
         return render_template("index.html")
 
     try:
-        conditions = []
-
-        if search_request.isdigit():
-            conditions.append(Part.id == int(search_request))
+        page_args = get_page_args(default_sort="relevance")
+        part_ids = find_part_ids(search_request)
 
-        search_pattern = f"%{search_request}%"
-        conditions.extend([
-            Part.name.ilike(search_pattern),
-            Part.car.ilike(search_pattern),
-            Part.part_number.ilike(search_pattern),
-            Part.description.ilike(search_pattern)
-        ])
+        if page_args["sort"] == "relevance":
+            parts = RankedPage(part_ids, load_parts, page_args["per_page"], page_args["after"])
+        else:
+            parts = KeysetPage(
+                Part.query.options(db.selectinload(Part.images)).filter(Part.id.in_(part_ids)),
+                Part,
+                **page_args
+            )
 
-        parts = Part.query.filter(or_(*conditions)).all()
-
-        return render_template(
-            "all_parts.html",
-            parts=parts
-        )
+        return stream_page("all_parts.html", parts=parts, search_request=search_request)
 
     except Exception as e:
+        current_app.logger.exception("Ошибка при поиске %r", search_request)
         return f"Ошибка при поиске: {str(e)}", 500
\ No newline at end of file
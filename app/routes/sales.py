@@ -1,16 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, jsonify, session
-from app.extensions import db
+from flask import Blueprint, render_template, request, redirect, jsonify, session, current_app, abort
+from app.extensions import db, replica_reads
 from app.models import Sale, SaleItem, Part
 from app.utils.security import admin_required
-from app.utils.file_handling import delete_part_folder, delete_image_file, delete_video_file
-from datetime import datetime
-import math
+from app.utils.checkout import checkout, sale_to_dict, CheckoutError
+from app.utils.rollups import sales_report
+from app.utils.search import find_parts
+from app.utils.page_cache import cached_page
+from datetime import date
+import uuid
 
 sales_bp = Blueprint('sales', __name__)
 
 
 @sales_bp.route("/sales", methods=["GET"])
 @admin_required
+@replica_reads
 def sales_list():
     sales = Sale.query.order_by(Sale.created_at.desc()).all()
     return render_template("sales_list.html", sales=sales)
@@ -20,147 +24,126 @@ def sales_list():
 @admin_required
 def new_sale():
     parts = Part.query.filter(Part.quantity > 0).all()
-    return render_template("new_sale.html", parts=parts)
+    # Ключ в форме защищает от двойной отправки: повтор вернет ту же продажу
+    return render_template("new_sale.html", parts=parts, idempotency_key=uuid.uuid4().hex)
 
 
 @sales_bp.route("/sales/new", methods=["POST"])
 @admin_required
 def create_sale():
     try:
-        # Получаем данные из формы
-        discount_type = request.form.get('discount_type')
-        discount_value = int(request.form.get('discount_value', 0))
-        transport_company = request.form.get('transport_company', '')
-        tracking_number = request.form.get('tracking_number', '')
-
         # Получаем товары из формы
         part_ids = request.form.getlist('part_id[]')
         quantities = request.form.getlist('quantity[]')
 
-        if not part_ids:
-            return "Не выбраны товары для продажи", 400
-
-        # Создаем продажу
-        sale = Sale(
-            discount_type=discount_type,
-            discount_value=discount_value,
-            transport_company=transport_company,
-            tracking_number=tracking_number
+        checkout(
+            zip(part_ids, quantities),
+            discount_type=request.form.get('discount_type'),
+            discount_value=int(request.form.get('discount_value', 0)),
+            transport_company=request.form.get('transport_company', ''),
+            tracking_number=request.form.get('tracking_number', ''),
+            idempotency_key=request.form.get('idempotency_key') or None
         )
-
-        db.session.add(sale)
-        db.session.flush()
-
-        # Добавляем товары в продажу и обновляем остатки
-        total_amount = 0
-        parts_to_delete = []
-
-        for i, part_id in enumerate(part_ids):
-            part = Part.query.get(int(part_id))
-            quantity = int(quantities[i])
-
-            if part and quantity > 0:
-                if quantity > part.quantity:
-                    return f"Недостаточно товара: {part.name}. В наличии: {part.quantity}", 400
-
-                item_total = part.price_out * quantity
-                total_amount += item_total
-
-                # Создаем запись о продаже с сохранением данных о детали
-                sale_item = SaleItem(
-                    sale_id=sale.id,
-                    part_id=part.id,
-                    quantity=quantity,
-                    unit_price=part.price_out,
-                    total_price=item_total,
-                    part_name=part.name,  # Сохраняем название
-                    part_car=part.car,  # Сохраняем авто
-                    part_number=part.part_number  # Сохраняем артикул
-                )
-                db.session.add(sale_item)
-
-                # Обновляем количество на складе
-                part.quantity -= quantity
-
-                # Если товар закончился, помечаем для удаления
-                if part.quantity == 0:
-                    parts_to_delete.append(part)
-
-        # Рассчитываем скидку
-        if discount_type == 'percent' and discount_value > 0:
-            discount_amount = math.ceil(total_amount * (discount_value / 100))
-        elif discount_type == 'fixed' and discount_value > 0:
-            discount_amount = discount_value
-        else:
-            discount_amount = 0
-
-        final_amount = total_amount - discount_amount
-
-        sale.total_amount = total_amount
-        sale.final_amount = final_amount
-
-        db.session.commit()
-
-        # Удаляем детали, которые закончились (файлы и записи из parts)
-        for part in parts_to_delete:
-            delete_part_completely(part.id)
-
         return redirect('/sales')
 
+    except CheckoutError as e:
+        return e.message, e.status
+
     except Exception as e:
-        db.session.rollback()
         return f"Ошибка при создании продажи: {str(e)}", 400
 
 
-def delete_part_completely(part_id):
-    """Полностью удаляет деталь со всеми файлами, но данные остаются в продажах"""
-    try:
-        part = Part.query.get(part_id)
-        if not part:
-            return
+@sales_bp.route("/api/sales", methods=["POST"])
+@admin_required
+def api_create_sale():
+    """Оформление продажи JSON-запросом.
 
-        # Удаляем файлы изображений с диска
-        for image in part.images:
-            delete_image_file(part.id, image.filename)
+    Тело: {"items": [{"part_id": 1, "quantity": 2}], "discount_type": ..., "discount_value": ...,
+    "transport_company": ..., "tracking_number": ...}. Заголовок Idempotency-Key делает
+    повторную отправку безопасной: вернется та же продажа (200 вместо 201).
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+        return jsonify({'error': 'Ожидается JSON с полем items'}), 400
 
-        # Удаляем файлы видео с диска
-        for video in part.videos:
-            delete_video_file(part.id, video.filename)
+    try:
+        discount_value = int(data.get('discount_value') or 0)
+        lines = [(item.get('part_id'), item.get('quantity', 1)) for item in data['items']]
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'Некорректные товары или скидка'}), 400
 
-        # Удаляем папку детали полностью
-        delete_part_folder(part.id)
+    try:
+        sale, created = checkout(
+            lines,
+            discount_type=data.get('discount_type'),
+            discount_value=discount_value,
+            transport_company=data.get('transport_company') or '',
+            tracking_number=data.get('tracking_number') or '',
+            idempotency_key=request.headers.get('Idempotency-Key') or None
+        )
+    except CheckoutError as e:
+        return jsonify({'error': e.message}), e.status
+
+    response = jsonify(sale_to_dict(sale))
+    response.status_code = 201 if created else 200
+    if not created:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _report_args():
+    """Параметры отчета из запроса: period (day|month), start и end (YYYY-MM-DD)"""
+    period = request.args.get('period', 'day')
+    if period not in ('day', 'month'):
+        period = 'day'
+    dates = []
+    for name in ('start', 'end'):
+        try:
+            dates.append(date.fromisoformat(request.args[name]) if request.args.get(name) else None)
+        except ValueError:
+            dates.append(None)
+    return period, dates[0], dates[1]
+
+
+@sales_bp.route("/sales/report", methods=["GET"])
+@admin_required
+@replica_reads
+def sales_report_page():
+    report = sales_report(*_report_args())
+    return render_template("sales_report.html", report=report)
 
-        # Удаляем деталь из БД (данные остаются в sale_items через part_name, part_car, part_number)
-        db.session.delete(part)
-        db.session.commit()
 
-    except Exception as e:
-        db.session.rollback()
-        print(f"Ошибка при удалении детали: {e}")
+@sales_bp.route("/api/sales/report", methods=["GET"])
+@admin_required
+@replica_reads
+def sales_report_api():
+    return jsonify(sales_report(*_report_args()))
 
 
 @sales_bp.route("/sales/<int:sale_id>", methods=["GET"])
 @admin_required
 def sale_detail(sale_id):
-    sale = Sale.query.get_or_404(sale_id)
-    return render_template("sale_detail.html", sale=sale)
+    html = cached_page(Sale, sale_id, lambda: render_template("sale_detail.html", sale=db.session.get(
+        Sale, sale_id, options=[db.selectinload(Sale.items).selectinload(SaleItem.part)]
+    )))
+    if html is None:
+        abort(404)
+    return html
 
 
 @sales_bp.route("/api/parts/search", methods=["GET"])
 @admin_required
+@replica_reads
 def search_parts():
     query = request.args.get('q', '')
     if not query:
         return jsonify([])
 
-    parts = Part.query.filter(
-        db.or_(
-            Part.name.ilike(f'%{query}%'),
-            Part.part_number.ilike(f'%{query}%'),
-            Part.car.ilike(f'%{query}%')
-        ),
-        Part.quantity > 0
-    ).limit(10).all()
+    parts = find_parts(
+        query,
+        limit=current_app.config['API_SEARCH_LIMIT'],
+        in_stock_only=True
+    )
 
     result = []
     for part in parts:
@@ -0,0 +1,25 @@
+// Обработка ошибок загрузки изображений
+document.addEventListener('DOMContentLoaded', function() {
+    const images = document.querySelectorAll('.thumbnail');
+    images.forEach(img => {
+        img.addEventListener('error', function() {
+            this.style.display = 'none';
+            const noImageDiv = this.nextElementSibling;
+            if (noImageDiv && noImageDiv.classList.contains('no-image')) {
+                noImageDiv.style.display = 'flex';
+            }
+        });
+    });
+
+    // Обработка клика по строке
+    const rows = document.querySelectorAll('.clickable-row');
+    rows.forEach(row => {
+        row.addEventListener('click', function(e) {
+            // Проверяем, не был ли клик по ссылке или кнопке внутри строки
+            if (e.target.tagName === 'A' || e.target.tagName === 'BUTTON') {
+                return;
+            }
+            window.location.href = `/parts/${this.cells[1].textContent.trim()}`;
+        });
+    });
+});
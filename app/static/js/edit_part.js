@@ -0,0 +1,117 @@
+let formSubmitted = false;
+
+// Отображение списка выбранных файлов для изображений
+document.getElementById('images').addEventListener('change', function(e) {
+    const fileList = document.getElementById('image-file-list');
+    fileList.innerHTML = '';
+
+    if (this.files.length > 0) {
+        const list = document.createElement('ul');
+        list.style.paddingLeft = '20px';
+        list.style.marginTop = '10px';
+        list.style.fontFamily = 'Arial, sans-serif';
+
+        for (let i = 0; i < this.files.length; i++) {
+            const listItem = document.createElement('li');
+            listItem.textContent = this.files[i].name + ' (' + (this.files[i].size / 1024 / 1024).toFixed(2) + ' MB)';
+            list.appendChild(listItem);
+        }
+
+        fileList.appendChild(list);
+    }
+});
+
+// Отображение списка выбранных файлов для видео
+document.getElementById('videos').addEventListener('change', function(e) {
+    const fileList = document.getElementById('video-file-list');
+    fileList.innerHTML = '';
+
+    if (this.files.length > 0) {
+        const list = document.createElement('ul');
+        list.style.paddingLeft = '20px';
+        list.style.marginTop = '10px';
+        list.style.fontFamily = 'Arial, sans-serif';
+
+        for (let i = 0; i < this.files.length; i++) {
+            const listItem = document.createElement('li');
+            listItem.textContent = this.files[i].name + ' (' + (this.files[i].size / 1024 / 1024).toFixed(2) + ' MB)';
+            list.appendChild(listItem);
+        }
+
+        fileList.appendChild(list);
+    }
+});
+
+// Помечаем изображение для удаления
+function markForDelete(imageId) {
+    const imageItem = document.querySelector(`[data-image-id="${imageId}"]`);
+    const checkbox = imageItem.querySelector('.delete-checkbox');
+
+    if (imageItem.classList.contains('marked-for-delete')) {
+        // Отменяем удаление
+        imageItem.classList.remove('marked-for-delete');
+        checkbox.checked = false;
+    } else {
+        // Помечаем для удаления
+        imageItem.classList.add('marked-for-delete');
+        checkbox.checked = true;
+    }
+}
+
+// Помечаем видео для удаления
+function markVideoForDelete(videoId) {
+    const videoItem = document.querySelector(`[data-video-id="${videoId}"]`);
+    const checkbox = videoItem.querySelector('.delete-video-checkbox');
+
+    if (videoItem.classList.contains('marked-for-delete')) {
+        // Отменяем удаление
+        videoItem.classList.remove('marked-for-delete');
+        checkbox.checked = false;
+    } else {
+        // Помечаем для удаления
+        videoItem.classList.add('marked-for-delete');
+        checkbox.checked = true;
+    }
+}
+
+// Установка главного изображения
+function setAsMain(imageId) {
+    document.getElementById('main_image').value = imageId;
+
+    // Обновляем визуальное отображение
+    document.querySelectorAll('.main-badge').forEach(badge => {
+        badge.remove();
+    });
+
+    document.querySelectorAll('.set-main-btn').forEach(btn => {
+        btn.style.display = 'inline-block';
+    });
+
+    const currentImage = document.querySelector(`[data-image-id="${imageId}"]`);
+    const badge = document.createElement('div');
+    badge.className = 'main-badge';
+    badge.textContent = 'Главное';
+    currentImage.prepend(badge);
+
+    currentImage.querySelector('.set-main-btn').style.display = 'none';
+}
+
+// Убираем предупреждение при отправке формы
+document.getElementById('editForm').addEventListener('submit', function() {
+    formSubmitted = true;
+});
+
+// Убираем предупреждение при уходе со страницы
+window.addEventListener('beforeunload', function(e) {
+    if (!formSubmitted) {
+        // Только если форма не отправлена
+        const hasChanges = document.getElementById('images').files.length > 0 ||
+                         document.getElementById('videos').files.length > 0 ||
+                         document.querySelectorAll('.delete-checkbox:checked').length > 0 ||
+                         document.querySelectorAll('.delete-video-checkbox:checked').length > 0;
+        if (hasChanges) {
+            e.preventDefault();
+            e.returnValue = '';
+        }
+    }
+});
@@ -0,0 +1,21 @@
+// Обновляем строки незавершенных импортов, пока они не закончатся
+function pollJobs() {
+    const active = document.querySelectorAll('tr[data-status="queued"], tr[data-status="running"]');
+    if (!active.length) return;
+    Promise.all(Array.from(active).map(row =>
+        fetch(`/api/imports/${row.dataset.job}`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'done' || job.status === 'failed') {
+                    window.location.reload();
+                    return;
+                }
+                row.dataset.status = job.status;
+                row.querySelector('.status').textContent = job.status;
+                for (const field of ['rows', 'inserted', 'updated', 'failed']) {
+                    row.querySelector(`.${field}`).textContent = job[field];
+                }
+            })
+    )).finally(() => setTimeout(pollJobs, 1000));
+}
+pollJobs();
@@ -0,0 +1,26 @@
+function handleSearch(event) {
+    event.preventDefault();
+    const searchInput = event.target.querySelector('input[name="query"]');
+    const query = searchInput.value.trim();
+
+    if (query) {
+        // Пока просто показываем результат поиска
+        alert(`Поиск: "${query}"\n\nФункция поиска находится в разработке.`);
+
+        // Можно очистить поле после "поиска"
+        searchInput.value = '';
+
+        // В будущем здесь будет редирект на страницу результатов
+        // window.location.href = `/search?q=${encodeURIComponent(query)}`;
+    } else {
+        alert('Пожалуйста, введите поисковый запрос');
+    }
+}
+
+// Фокус на поле поиска при загрузке страницы
+document.addEventListener('DOMContentLoaded', function() {
+    const searchInput = document.querySelector('.search-input');
+    if (searchInput) {
+        searchInput.focus();
+    }
+});
@@ -0,0 +1,39 @@
+// Обработчик для изображений
+document.getElementById('images').addEventListener('change', function(e) {
+    const fileList = document.getElementById('image-file-list');
+    fileList.innerHTML = '';
+
+    if (this.files.length > 0) {
+        const list = document.createElement('ul');
+        list.style.paddingLeft = '20px';
+        list.style.marginTop = '10px';
+
+        for (let i = 0; i < this.files.length; i++) {
+            const listItem = document.createElement('li');
+            listItem.textContent = this.files[i].name + ' (' + (this.files[i].size / 1024 / 1024).toFixed(2) + ' MB)';
+            list.appendChild(listItem);
+        }
+
+        fileList.appendChild(list);
+    }
+});
+
+// Обработчик для видео
+document.getElementById('videos').addEventListener('change', function(e) {
+    const fileList = document.getElementById('video-file-list');
+    fileList.innerHTML = '';
+
+    if (this.files.length > 0) {
+        const list = document.createElement('ul');
+        list.style.paddingLeft = '20px';
+        list.style.marginTop = '10px';
+
+        for (let i = 0; i < this.files.length; i++) {
+            const listItem = document.createElement('li');
+            listItem.textContent = this.files[i].name + ' (' + (this.files[i].size / 1024 / 1024).toFixed(2) + ' MB)';
+            list.appendChild(listItem);
+        }
+
+        fileList.appendChild(list);
+    }
+});
@@ -0,0 +1,209 @@
+let selectedItems = [];
+let totalAmount = 0;
+let searchTimeout;
+
+// Поиск товаров с задержкой
+document.getElementById('partSearch').addEventListener('input', function(e) {
+    const query = e.target.value.trim();
+
+    clearTimeout(searchTimeout);
+
+    if (query.length < 2) {
+        document.getElementById('searchResults').style.display = 'none';
+        return;
+    }
+
+    searchTimeout = setTimeout(() => {
+        performSearch(query);
+    }, 300);
+});
+
+// Функция поиска
+function performSearch(query) {
+    fetch(`/api/parts/search?q=${encodeURIComponent(query)}`)
+        .then(response => response.json())
+        .then(parts => {
+            const resultsContainer = document.getElementById('searchResults');
+            resultsContainer.innerHTML = '';
+
+            if (parts.length > 0) {
+                parts.forEach(part => {
+                    const item = document.createElement('div');
+                    item.className = 'search-result-item';
+                    item.innerHTML = `
+                        <div><strong>${part.name}</strong></div>
+                        <div>Авто: ${part.car} | Артикул: ${part.part_number}</div>
+                        <div>Цена: ${part.price_out} руб. | В наличии: ${part.quantity} шт.</div>
+                    `;
+                    item.onclick = () => {
+                        addItemToSale(part);
+                        document.getElementById('searchResults').style.display = 'none';
+                    };
+                    resultsContainer.appendChild(item);
+                });
+                resultsContainer.style.display = 'block';
+            } else {
+                const noResults = document.createElement('div');
+                noResults.className = 'search-result-item';
+                noResults.textContent = 'Товары не найдены';
+                noResults.style.color = '#666';
+                noResults.style.fontStyle = 'italic';
+                resultsContainer.appendChild(noResults);
+                resultsContainer.style.display = 'block';
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка поиска:', error);
+        });
+}
+
+// Добавление товара в продажу
+function addItemToSale(part) {
+    // Проверяем, не добавлен ли уже товар
+    if (selectedItems.find(item => item.id === part.id)) {
+        alert('Этот товар уже добавлен в продажу');
+        return;
+    }
+
+    selectedItems.push({
+        id: part.id,
+        name: part.name,
+        part_number: part.part_number,
+        car: part.car,
+        price_out: part.price_out,
+        quantity: 1,
+        max_quantity: part.quantity
+    });
+
+    updateItemsTable();
+    updateSummary();
+    document.getElementById('partSearch').value = '';
+}
+
+// Обновление таблицы товаров
+function updateItemsTable() {
+    const tbody = document.getElementById('itemsTableBody');
+    tbody.innerHTML = '';
+
+    selectedItems.forEach((item, index) => {
+        const row = document.createElement('tr');
+        const itemTotal = item.price_out * item.quantity;
+
+        row.innerHTML = `
+            <td>${item.name}</td>
+            <td>${item.part_number}</td>
+            <td>${item.car}</td>
+            <td>${item.price_out} руб.</td>
+            <td>
+                <input type="number"
+                       class="quantity-input"
+                       value="${item.quantity}"
+                       min="1"
+                       max="${item.max_quantity}"
+                       onchange="updateQuantity(${index}, this.value)"
+                       oninput="updateQuantity(${index}, this.value)">
+                <div class="max-quantity">макс: ${item.max_quantity} шт.</div>
+            </td>
+            <td>${itemTotal} руб.</td>
+            <td>
+                <button type="button" class="remove-btn" onclick="removeItem(${index})">
+                    Удалить
+                </button>
+            </td>
+        `;
+        tbody.appendChild(row);
+    });
+}
+
+// Обновление количества с проверкой
+function updateQuantity(index, quantity) {
+    quantity = parseInt(quantity) || 1;
+    const item = selectedItems[index];
+
+    if (quantity > 0 && quantity <= item.max_quantity) {
+        item.quantity = quantity;
+        updateItemsTable();
+        updateSummary();
+    } else if (quantity > item.max_quantity) {
+        alert(`Нельзя добавить больше ${item.max_quantity} шт. товара "${item.name}"`);
+        item.quantity = item.max_quantity;
+        updateItemsTable();
+        updateSummary();
+    } else if (quantity < 1) {
+        item.quantity = 1;
+        updateItemsTable();
+        updateSummary();
+    }
+}
+
+// Удаление товара
+function removeItem(index) {
+    if (confirm('Удалить этот товар из продажи?')) {
+        selectedItems.splice(index, 1);
+        updateItemsTable();
+        updateSummary();
+    }
+}
+
+// Обновление итогов
+function updateSummary() {
+    totalAmount = selectedItems.reduce((sum, item) => sum + (item.price_out * item.quantity), 0);
+
+    const discountType = document.getElementById('discount_type').value;
+    const discountValue = parseInt(document.getElementById('discount_value').value) || 0;
+
+    let discountAmount = 0;
+    if (discountType === 'percent' && discountValue > 0) {
+        discountAmount = Math.ceil(totalAmount * (discountValue / 100));
+    } else if (discountType === 'fixed' && discountValue > 0) {
+        discountAmount = discountValue;
+    }
+
+    const finalAmount = Math.max(0, totalAmount - discountAmount);
+
+    document.getElementById('totalAmount').textContent = totalAmount + ' руб.';
+    document.getElementById('discountAmount').textContent = discountAmount + ' руб.';
+    document.getElementById('finalAmount').textContent = finalAmount + ' руб.';
+}
+
+// Обновление итогов при изменении скидки
+document.getElementById('discount_type').addEventListener('change', updateSummary);
+document.getElementById('discount_value').addEventListener('input', updateSummary);
+
+// Отправка формы
+document.getElementById('saleForm').addEventListener('submit', function(e) {
+    if (selectedItems.length === 0) {
+        e.preventDefault();
+        alert('Добавьте хотя бы один товар в продажу');
+        return;
+    }
+
+    // Добавляем скрытые поля с товарами
+    selectedItems.forEach((item, index) => {
+        const partIdInput = document.createElement('input');
+        partIdInput.type = 'hidden';
+        partIdInput.name = 'part_id[]';
+        partIdInput.value = item.id;
+        this.appendChild(partIdInput);
+
+        const quantityInput = document.createElement('input');
+        quantityInput.type = 'hidden';
+        quantityInput.name = 'quantity[]';
+        quantityInput.value = item.quantity;
+        this.appendChild(quantityInput);
+    });
+});
+
+// Закрытие результатов поиска при клике вне области
+document.addEventListener('click', function(e) {
+    if (!e.target.closest('.search-container')) {
+        document.getElementById('searchResults').style.display = 'none';
+    }
+});
+
+// Закрытие результатов поиска при нажатии Escape
+document.addEventListener('keydown', function(e) {
+    if (e.key === 'Escape') {
+        document.getElementById('searchResults').style.display = 'none';
+    }
+});
@@ -0,0 +1,148 @@
+// Галерея фото, скачивание и удаление детали; данные (partId, partName, images) задает шаблон part.html
+
+// Инициализация массива изображений при загрузке страницы
+document.addEventListener('DOMContentLoaded', function() {
+    if (images.length === 0) return;
+
+    // Находим индекс главного изображения
+    currentImageIndex = images.findIndex(img => img.filename === currentImageFilename);
+    if (currentImageIndex === -1) currentImageIndex = 0;
+});
+
+// Смена изображения в предпросмотре
+function changePreviewImage(index) {
+    const mainPreview = document.getElementById('mainPreview');
+    if (mainPreview) {
+        mainPreview.srcset = images[index].srcset;
+        mainPreview.src = images[index].preview;
+        currentImageFilename = images[index].filename;
+        currentImageIndex = index;
+
+        // Обновляем границы у превьюшек
+        document.querySelectorAll('.thumbnail').forEach(thumb => {
+            thumb.style.border = '1px solid #ddd';
+        });
+
+        // Подсвечиваем выбранное превью
+        event.target.style.border = '2px solid #007bff';
+    }
+}
+
+// Функции для модального окна
+function openModal(imageIndex = null) {
+    const modal = document.getElementById('imageModal');
+    const modalImg = document.getElementById('modalImage');
+
+    // Используем переданный индекс или текущий
+    const indexToUse = imageIndex !== null ? imageIndex : currentImageIndex;
+
+    modal.style.display = 'block';
+    modalImg.src = images[indexToUse].src;
+
+    // Обновляем текущий индекс
+    currentImageIndex = indexToUse;
+    currentImageFilename = images[indexToUse].filename;
+    currentImageName = partName;
+}
+
+function closeModal() {
+    document.getElementById('imageModal').style.display = 'none';
+}
+
+// Навигация по изображениям в модальном окне
+function navigateImages(direction) {
+    if (images.length <= 1) return;
+
+    currentImageIndex += direction;
+    if (currentImageIndex < 0) currentImageIndex = images.length - 1;
+    if (currentImageIndex >= images.length) currentImageIndex = 0;
+
+    const modalImg = document.getElementById('modalImage');
+    modalImg.src = images[currentImageIndex].src;
+    currentImageFilename = images[currentImageIndex].filename;
+}
+
+// Обработчики клавиш для навигации
+document.addEventListener('keydown', function(e) {
+    const modal = document.getElementById('imageModal');
+    if (modal.style.display === 'block') {
+        if (e.key === 'Escape') {
+            closeModal();
+        } else if (e.key === 'ArrowLeft') {
+            navigateImages(-1);
+        } else if (e.key === 'ArrowRight') {
+            navigateImages(1);
+        }
+    }
+});
+
+// Обработчик клика по изображению в модальном окне для навигации
+document.getElementById('modalImage').addEventListener('click', function(e) {
+    const rect = this.getBoundingClientRect();
+    const clickX = e.clientX - rect.left;
+
+    // Если клик в левой трети - предыдущее изображение
+    if (clickX < rect.width / 3) {
+        navigateImages(-1);
+    }
+    // Если клик в правой трети - следующее изображение
+    else if (clickX > rect.width * 2 / 3) {
+        navigateImages(1);
+    }
+    // Иначе закрываем модальное окно (клик по центру)
+    else {
+        closeModal();
+    }
+});
+
+// Скачивание изображения
+function downloadImage(imageUrl, filename, customName = '') {
+    const link = document.createElement('a');
+    link.href = imageUrl;
+    link.download = customName + '.' + filename.split('.').pop();
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
+
+function downloadCurrentImage() {
+    if (currentImageFilename) {
+        downloadImage(images[currentImageIndex].original, currentImageFilename, currentImageName);
+    }
+}
+
+// Скачивание видео
+function downloadVideo(videoUrl, filename, customName = '') {
+    const link = document.createElement('a');
+    link.href = videoUrl;
+    link.download = customName + '.' + filename.split('.').pop();
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
+
+// Подтверждение удаления
+function confirmDelete() {
+    if (confirm('Вы уверены, что хотите удалить эту деталь? Это действие нельзя отменить.')) {
+        fetch(`/parts/${partId}`, {
+            method: 'DELETE',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (response.ok) {
+                alert('Деталь успешно удалена');
+                window.location.href = '/parts';
+            } else {
+                response.text().then(text => {
+                    alert('Ошибка при удалении детали: ' + text);
+                });
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Ошибка при удалении детали: ' + error);
+        });
+    }
+}
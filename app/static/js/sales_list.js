@@ -0,0 +1,8 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const rows = document.querySelectorAll('.sale-row');
+    rows.forEach(row => {
+        row.addEventListener('click', function() {
+            window.location.href = `/sales/${this.cells[0].textContent.trim()}`;
+        });
+    });
+});
@@ -0,0 +1,294 @@
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+from app.extensions import db
+from app.utils.cache import TTLCache
+
+# Границы ABC-анализа по накопленной доле выручки
+ABC_THRESHOLDS = (("A", 0.8), ("B", 0.95), ("C", 1.0))
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = TTLCache(
+            maxsize=current_app.config['ANALYTICS_CACHE_SIZE'],
+            ttl=current_app.config['ANALYTICS_CACHE_TTL'].total_seconds()
+        )
+    return _cache
+
+
+def data_version():
+    """Отпечаток данных для кэша: меняется при любой продаже и любом изменении деталей.
+
+    Суммы по колонкам не замечают правку названия или авто детали, поэтому в отпечатке
+    есть сумма версий: версия строки растет при каждом изменении (max не заметил бы правку
+    строки с версией ниже максимальной).
+    """
+    from app.models import Part, Sale
+
+    sales = db.session.execute(select(func.count(Sale.id), func.max(Sale.id), func.sum(Sale.version))).one()
+    parts = db.session.execute(select(
+        func.count(Part.id), func.max(Part.id), func.sum(Part.quantity), func.sum(Part.price_in),
+        func.sum(Part.version)
+    )).one()
+    return tuple(sales) + tuple(parts)
+
+
+def cached(metric, params, compute):
+    """Результат метрики из кэша, пока не изменились данные"""
+    cache = get_cache()
+    key = (metric, tuple(sorted(params.items())), data_version())
+    result = cache.get(key)
+    if result is None:
+        result = compute(**params)
+        cache.set(key, result)
+    return result
+
+
+# --- Загрузка колонок ---
+
+def _to_columns(rows, dtypes):
+    """Список строк запроса -> словарь numpy-массивов по колонкам"""
+    if not rows:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in dtypes.items()}
+    columns = zip(*rows)
+    return {name: np.asarray(column, dtype=dtype) for (name, dtype), column in zip(dtypes.items(), columns)}
+
+
+def _factorize(values):
+    """Строковая колонка -> целые коды и список значений (группировка по кодам - через bincount)"""
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.int64, count=len(values))
+    return codes, np.array(list(index), dtype=str)
+
+
+def load_sale_items(since):
+    """Позиции продаж начиная с since: колонки без создания ORM-объектов.
+
+    net_revenue - выручка позиции с учетом скидки продажи (распределена
+    пропорционально сумме позиции), unit_cost - закупочная цена на момент продажи.
+    """
+    from app.models import Part, Sale, SaleItem
+
+    rows = db.session.execute(
+        select(
+            SaleItem.part_id,
+            SaleItem.quantity,
+            func.coalesce(SaleItem.total_price, 0),
+            func.coalesce(SaleItem.unit_cost, Part.price_in, 0),
+            func.coalesce(SaleItem.part_car, ''),
+            func.coalesce(Sale.total_amount, 0),
+            func.coalesce(Sale.final_amount, 0),
+        )
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .outerjoin(Part, Part.id == SaleItem.part_id)
+        .where(Sale.created_at >= since)
+    ).all()
+
+    columns = _to_columns(rows, {
+        "part_id": np.int64,
+        "quantity": np.int64,
+        "revenue": np.float64,
+        "unit_cost": np.float64,
+        "car": object,
+        "sale_total": np.float64,
+        "sale_final": np.float64,
+    })
+    sale_total = columns.pop("sale_total")
+    sale_final = columns.pop("sale_final")
+    factor = np.divide(sale_final, sale_total, out=np.ones(len(sale_total)), where=sale_total > 0)
+    columns["net_revenue"] = columns["revenue"] * factor
+    columns["cost"] = columns["quantity"] * columns["unit_cost"]
+    columns["car"], columns["car_labels"] = _factorize(columns["car"].tolist())
+    return columns
+
+
+def load_parts():
+    """Детали в наличии и дата их последней продажи (агрегат в SQL)"""
+    from app.models import Part, Sale, SaleItem
+
+    last_sales = (
+        select(SaleItem.part_id, func.max(Sale.created_at).label("last_sale"))
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .group_by(SaleItem.part_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(
+            Part.id,
+            func.coalesce(Part.quantity, 0),
+            func.coalesce(Part.price_in, 0),
+            func.coalesce(Part.car, ''),
+            Part.created_at,
+            last_sales.c.last_sale,
+        )
+        .outerjoin(last_sales, last_sales.c.part_id == Part.id)
+        .where(Part.quantity > 0)
+    ).all()
+
+    return _to_columns(rows, {
+        "id": np.int64,
+        "quantity": np.int64,
+        "price_in": np.float64,
+        "car": str,
+        "created_at": "datetime64[s]",
+        "last_sale": "datetime64[s]",
+    })
+
+
+# --- Метрики (чистые функции над колонками) ---
+
+def _group_sum(keys, *values):
+    """GROUP BY keys: уникальные ключи и суммы каждой из колонок values"""
+    if keys.dtype.kind in "iu" and len(keys) and keys.min() >= 0 and keys.max() <= 4 * len(keys) + 1024:
+        # Плотные целые ключи (id, коды) - без сортировки, сразу bincount по значению
+        present = np.bincount(keys) > 0
+        unique = np.flatnonzero(present)
+        return unique, [np.bincount(keys, weights=value)[present] for value in values]
+
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = [np.bincount(inverse, weights=value, minlength=len(unique)) for value in values]
+    return unique, sums
+
+
+def compute_margin_by_car(items):
+    codes, (units, revenue, cost) = _group_sum(items["car"], items["quantity"], items["net_revenue"], items["cost"])
+    cars = items["car_labels"][codes]
+    margin = revenue - cost
+    # Без продаж суммы - пустые целые массивы, поэтому выход деления явно дробный
+    margin_pct = np.divide(margin, revenue, out=np.zeros(len(margin)), where=revenue > 0) * 100
+    order = np.argsort(-margin, kind="stable")
+    return [
+        {
+            "car": str(cars[i]),
+            "units": int(units[i]),
+            "revenue": round(float(revenue[i]), 2),
+            "cost": round(float(cost[i]), 2),
+            "margin": round(float(margin[i]), 2),
+            "margin_pct": round(float(margin_pct[i]), 1),
+        }
+        for i in order
+    ]
+
+
+def compute_abc(items, limit=None):
+    part_ids, (revenue,) = _group_sum(items["part_id"], items["net_revenue"])
+    total = revenue.sum()
+    order = np.argsort(-revenue, kind="stable")
+    revenue = revenue[order]
+    part_ids = part_ids[order]
+
+    # Класс - по доле выручки, накопленной до детали: первая деталь всегда A
+    share_before = (np.cumsum(revenue) - revenue) / total if total > 0 else np.zeros_like(revenue)
+    classes = np.full(len(revenue), ABC_THRESHOLDS[-1][0], dtype=object)
+    for name, threshold in reversed(ABC_THRESHOLDS):
+        classes[share_before < threshold] = name
+
+    summary = {}
+    for name, _ in ABC_THRESHOLDS:
+        mask = classes == name
+        class_revenue = float(revenue[mask].sum())
+        summary[name] = {
+            "parts": int(mask.sum()),
+            "revenue": round(class_revenue, 2),
+            "share": round(class_revenue / total, 4) if total > 0 else 0,
+        }
+
+    shown = slice(None, limit)
+    return {
+        "classes": summary,
+        "parts": [
+            {"part_id": int(part_id), "revenue": round(float(value), 2), "class": name}
+            for part_id, value, name in zip(part_ids[shown], revenue[shown], classes[shown])
+        ],
+    }
+
+
+def compute_turnover(items, parts, days, limit=None):
+    cogs = float(items["cost"].sum())
+    inventory_value = float((parts["quantity"] * parts["price_in"]).sum())
+
+    # Продано за период по каждой детали в наличии
+    sold_ids, (sold_units,) = _group_sum(items["part_id"], items["quantity"])
+    units = np.zeros(len(parts["id"]))
+    if len(sold_ids):
+        position = np.clip(np.searchsorted(sold_ids, parts["id"]), 0, len(sold_ids) - 1)
+        found = sold_ids[position] == parts["id"]
+        units[found] = sold_units[position[found]]
+    turnover = units / parts["quantity"]
+
+    order = np.argsort(-turnover, kind="stable")[:limit]
+    return {
+        "days": days,
+        "cogs": round(cogs, 2),
+        "inventory_value": round(inventory_value, 2),
+        "turnover": round(cogs / inventory_value, 3) if inventory_value else None,
+        "days_of_inventory": round(inventory_value / (cogs / days), 1) if cogs else None,
+        "parts": [
+            {
+                "part_id": int(parts["id"][i]),
+                "sold": int(units[i]),
+                "stock": int(parts["quantity"][i]),
+                "turnover": round(float(turnover[i]), 3),
+            }
+            for i in order
+        ],
+    }
+
+
+def compute_dead_stock(parts, now, min_days, limit=None):
+    # Возраст - с последней продажи, а если продаж не было - с поступления детали
+    last_move = np.fmax(parts["last_sale"], parts["created_at"])
+    age_days = (np.datetime64(now, "s") - last_move) / np.timedelta64(1, "D")
+    age_days = np.where(np.isnat(last_move), np.inf, age_days)
+
+    dead = age_days >= min_days
+    value = parts["quantity"] * parts["price_in"]
+    indexes = np.flatnonzero(dead)
+    indexes = indexes[np.argsort(-age_days[indexes], kind="stable")][:limit]
+    return {
+        "min_days": min_days,
+        "parts_count": int(dead.sum()),
+        "units": int(parts["quantity"][dead].sum()),
+        "value": round(float(value[dead].sum()), 2),
+        "parts": [
+            {
+                "part_id": int(parts["id"][i]),
+                "car": str(parts["car"][i]),
+                "stock": int(parts["quantity"][i]),
+                "value": round(float(value[i]), 2),
+                "age_days": None if np.isinf(age_days[i]) else int(age_days[i]),
+            }
+            for i in indexes
+        ],
+    }
+
+
+# --- Точки входа для API (с кэшем) ---
+
+def _since(days):
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def margin_by_car(days):
+    return cached("margin_by_car", {"days": days},
+                  lambda days: compute_margin_by_car(load_sale_items(_since(days))))
+
+
+def abc_classes(days, limit):
+    return cached("abc", {"days": days, "limit": limit},
+                  lambda days, limit: compute_abc(load_sale_items(_since(days)), limit))
+
+
+def turnover(days, limit):
+    return cached("turnover", {"days": days, "limit": limit},
+                  lambda days, limit: compute_turnover(load_sale_items(_since(days)), load_parts(), days, limit))
+
+
+def dead_stock(min_days, limit):
+    return cached("dead_stock", {"min_days": min_days, "limit": limit},
+                  lambda min_days, limit: compute_dead_stock(load_parts(), datetime.utcnow(), min_days, limit))
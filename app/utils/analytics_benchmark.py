@@ -0,0 +1,85 @@
+import time
+import numpy as np
+from app.utils.analytics import compute_abc, compute_margin_by_car
+
+
+def synthetic_sale_items(rows, parts=50000, cars=300, seed=0):
+    """Синтетические позиции продаж в том же виде, что возвращает load_sale_items"""
+    rng = np.random.default_rng(seed)
+    part_id = rng.integers(1, parts + 1, rows)
+    quantity = rng.integers(1, 5, rows)
+    unit_price = rng.integers(100, 20000, rows).astype(np.float64)
+    unit_cost = unit_price * rng.uniform(0.4, 0.9, rows)
+    car_names = np.array([f"Авто {i}" for i in range(cars)], dtype=str)
+    revenue = quantity * unit_price
+    net_revenue = revenue * rng.choice([1.0, 0.95, 0.9], rows)
+    return {
+        "part_id": part_id,
+        "quantity": quantity,
+        "revenue": revenue,
+        "unit_cost": unit_cost,
+        "car": part_id % cars,
+        "car_labels": car_names,
+        "net_revenue": net_revenue,
+        "cost": quantity * unit_cost,
+    }
+
+
+def _as_rows(items):
+    """Те же данные построчно - так их видит код, который обходит ORM-объекты"""
+    columns = {name: values for name, values in items.items() if name != "car_labels"}
+    columns["car"] = items["car_labels"][items["car"]]
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*(columns[name].tolist() for name in names))]
+
+
+def naive_margin_by_car(rows):
+    groups = {}
+    for row in rows:
+        group = groups.setdefault(row["car"], {"units": 0, "revenue": 0.0, "cost": 0.0})
+        group["units"] += row["quantity"]
+        group["revenue"] += row["net_revenue"]
+        group["cost"] += row["quantity"] * row["unit_cost"]
+    result = []
+    for car, group in groups.items():
+        margin = group["revenue"] - group["cost"]
+        result.append({"car": car, "margin": margin,
+                       "margin_pct": margin / group["revenue"] * 100 if group["revenue"] else 0})
+    result.sort(key=lambda item: -item["margin"])
+    return result
+
+
+def naive_abc(rows):
+    revenue = {}
+    for row in rows:
+        revenue[row["part_id"]] = revenue.get(row["part_id"], 0.0) + row["net_revenue"]
+    total = sum(revenue.values())
+    classes = {}
+    accumulated = 0.0
+    for part_id, value in sorted(revenue.items(), key=lambda item: -item[1]):
+        share = accumulated / total
+        classes[part_id] = "A" if share < 0.8 else "B" if share < 0.95 else "C"
+        accumulated += value
+    return classes
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def run_benchmark(rows):
+    """Сравнивает векторные метрики с построчными циклами, возвращает время в секундах"""
+    items = synthetic_sale_items(rows)
+    row_dicts = _as_rows(items)
+
+    results = {}
+    for name, vectorized, naive in (
+        ("margin_by_car", compute_margin_by_car, naive_margin_by_car),
+        ("abc", compute_abc, naive_abc),
+    ):
+        _, vector_time = _timed(vectorized, items)
+        _, naive_time = _timed(naive, row_dicts)
+        results[name] = {"vectorized": vector_time, "naive": naive_time}
+    return results
@@ -0,0 +1,98 @@
+import hashlib
+from flask import request, current_app, jsonify
+
+# Поля ресурсов API; fields= выбирает подмножество, id отдается всегда
+PART_FIELDS = ("id", "name", "car", "part_number", "description", "price_in", "price_out",
+               "quantity", "created_at", "version")
+IMAGE_FIELDS = ("id", "part_id", "is_main", "url", "variants", "created_at", "version")
+SALE_FIELDS = ("id", "created_at", "discount_type", "discount_value", "total_amount", "final_amount",
+               "transport_company", "tracking_number", "version", "items")
+SALE_ITEM_FIELDS = ("part_id", "quantity", "unit_price", "total_price", "part_name", "part_car", "part_number")
+
+
+class ApiError(Exception):
+    """Ошибка запроса к API; status - HTTP-код ответа"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_fields(allowed):
+    """Поля из параметра fields=a,b,c (по умолчанию - все)"""
+    value = request.args.get('fields')
+    if not value:
+        return allowed
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(allowed)}")
+    return ("id",) + tuple(name for name in allowed if name in fields and name != "id")
+
+
+def parse_include(allowed):
+    """Связанные ресурсы из параметра include=a,b"""
+    value = request.args.get('include')
+    if not value:
+        return ()
+    include = tuple(name.strip() for name in value.split(',') if name.strip())
+    unknown = [name for name in include if name not in allowed]
+    if unknown:
+        raise ApiError(f"Нельзя включить: {', '.join(unknown)}. Доступно: {', '.join(allowed)}")
+    return include
+
+
+def make_etag(*parts):
+    """ETag по версиям строк и параметрам представления (fields, include, курсор)"""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def json_with_etag(payload, etag):
+    """JSON-ответ с ETag; клиент повторяет запрос с If-None-Match и получает 304"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def image_to_dict(image, fields=IMAGE_FIELDS):
+    values = {
+        "id": lambda: image.id,
+        "part_id": lambda: image.part_id,
+        "is_main": lambda: bool(image.is_main),
+        "url": lambda: image.url(),
+        "variants": lambda: {variant: image.url(variant) for variant in image.variant_widths},
+        "created_at": lambda: _iso(image.created_at),
+        "version": lambda: image.version,
+    }
+    return {name: values[name]() for name in fields}
+
+
+def part_to_dict(part, fields=PART_FIELDS, include=()):
+    data = {name: getattr(part, name) for name in fields}
+    if "created_at" in data:
+        data["created_at"] = _iso(data["created_at"])
+    if "images" in include:
+        data["images"] = [image_to_dict(image) for image in part.images]
+    return data
+
+
+def sale_to_api_dict(sale, fields=SALE_FIELDS):
+    data = {name: getattr(sale, name) for name in fields if name != "items"}
+    if "created_at" in data:
+        data["created_at"] = _iso(data["created_at"])
+    if "items" in fields:
+        data["items"] = [{name: getattr(item, name) for name in SALE_ITEM_FIELDS} for item in sale.items]
+    return data
@@ -0,0 +1,145 @@
+import os
+import gzip
+import json
+import hashlib
+import mimetypes
+import posixpath
+from flask import current_app, request, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+# Собранные файлы лежат в static/dist, имя содержит хэш содержимого
+ASSETS_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+# Сжимаются заранее только текстовые файлы: картинки уже сжаты
+COMPRESSIBLE_EXTENSIONS = {"css", "js", "svg", "json", "txt"}
+# Варианты сжатия в порядке предпочтения: (кодировка, расширение файла)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_manifest = {}
+
+
+def hashed_name(path, digest):
+    """css/part.css -> css/part.<хэш>.css"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{digest}{ext}"
+
+
+def _source_files(static_folder, exclude):
+    skip = {ASSETS_DIR, *exclude}
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder)
+        dirs[:] = sorted(
+            name for name in dirs
+            if not name.startswith('.') and os.path.normpath(os.path.join(rel_root, name)) not in skip
+        )
+        for name in sorted(files):
+            if not name.startswith('.'):
+                yield os.path.normpath(os.path.join(rel_root, name)).replace(os.sep, "/")
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _compressors():
+    compressors = [("gzip", ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        # Без пакета Brotli браузеры получат gzip
+        return compressors
+    return [("br", ".br", lambda data: brotli.compress(data, quality=11))] + compressors
+
+
+def build_assets(static_folder, exclude=()):
+    """Копирует статику в static/dist под именами с хэшем, рядом кладет .gz и .br.
+
+    Возвращает записи манифеста: (исходное имя, собранное имя, размер, {кодировка: размер}).
+    Файлы прошлых сборок не удаляются - их могут запросить еще открытые страницы.
+    """
+    output = os.path.join(static_folder, ASSETS_DIR)
+    compressors = _compressors()
+    manifest = {}
+    built = []
+    for source in _source_files(static_folder, exclude):
+        with open(os.path.join(static_folder, source), "rb") as f:
+            data = f.read()
+        target = hashed_name(source, hashlib.sha256(data).hexdigest()[:12])
+        target_path = os.path.join(output, target)
+        _write(target_path, data)
+
+        compressed = {}
+        if source.rsplit(".", 1)[-1].lower() in COMPRESSIBLE_EXTENSIONS:
+            for encoding, suffix, compress in compressors:
+                packed = compress(data)
+                # Сжатая копия, которая не меньше исходника, не нужна
+                if len(packed) < len(data):
+                    _write(target_path + suffix, packed)
+                    compressed[encoding] = len(packed)
+
+        manifest[source] = f"{ASSETS_DIR}/{target}"
+        built.append((source, manifest[source], len(data), compressed))
+
+    _write(os.path.join(output, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return built
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, ASSETS_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _hashed_static_url(endpoint, values):
+    # url_for('static', filename='css/part.css') -> /static/dist/css/part.<хэш>.css
+    if endpoint == "static" and _manifest:
+        filename = values.get("filename")
+        if filename in _manifest:
+            values["filename"] = _manifest[filename]
+
+
+def serve_static(filename):
+    """Статика; собранные файлы - с immutable-кэшем и заранее сжатыми вариантами по Accept-Encoding"""
+    if posixpath.normpath(filename).split("/", 1)[0] == "uploads":
+        # Загрузки старых установок, еще не перенесенные в instance/ - только через /media/parts
+        raise NotFound()
+    if not filename.startswith(ASSETS_DIR + "/"):
+        return current_app.send_static_file(filename)
+
+    static_folder = current_app.static_folder
+    if safe_join(static_folder, filename) is None:
+        raise NotFound()
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    max_age = current_app.config['ASSETS_MAX_AGE']
+
+    response = None
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.exists(safe_join(static_folder, filename + suffix)):
+            response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype, max_age=max_age)
+            response.content_encoding = encoding
+            break
+    if response is None:
+        response = send_from_directory(static_folder, filename, mimetype=mimetype, max_age=max_age)
+
+    response.vary.add("Accept-Encoding")
+    # Под этим именем содержимое не меняется никогда - браузеру не нужно даже перепроверять
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    """Подключает манифест сборки (flask build-assets) к url_for('static') и раздачу собранных файлов"""
+    global _manifest
+    _manifest = load_manifest(app.static_folder) if app.config['ASSETS_MANIFEST'] else {}
+    if app.config['ASSETS_MANIFEST'] and not _manifest:
+        app.logger.info("Статика не собрана (flask build-assets) - отдаются исходные файлы")
+    app.url_defaults(_hashed_static_url)
+    app.view_functions["static"] = serve_static
@@ -0,0 +1,324 @@
+import io
+import os
+import json
+import math
+import time
+import uuid
+import random
+import platform
+import threading
+import http.client
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import urlsplit, quote
+from sqlalchemy import text, bindparam
+from app.extensions import db
+
+# Сценарий: GET/POST адреса, собранного из образца данных базы; writes - меняет данные
+Scenario = namedtuple("Scenario", "name method build writes")
+
+# Метрики, которые сравниваются с базовой линией: (ключ, рост - это хуже)
+COMPARED_METRICS = (("p95_ms", True), ("rps", False), ("peak_rss_mib", True))
+
+
+def _multipart(fields, files):
+    """Тело multipart/form-data для загрузки: (заголовки, байты)"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, content_type) in files.items():
+        body.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode()
+        )
+        body.write(data)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return {"Content-Type": f"multipart/form-data; boundary={boundary}"}, body.getvalue()
+
+
+def _sample_image():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 900), (120, 130, 140)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def _json(data):
+    return {"Content-Type": "application/json"}, json.dumps(data).encode()
+
+
+class Sample:
+    """Случайные существующие id и поисковые слова из базы - подставляются в адреса сценариев"""
+
+    def __init__(self, rng, size=1000):
+        self.rng = rng
+        # Выборка зависит только от seed, а не от ORDER BY RANDOM() базы
+        part_ids = db.session.scalars(text("SELECT id FROM parts WHERE quantity > 0 ORDER BY id")).all()
+        sale_ids = db.session.scalars(text("SELECT id FROM sales ORDER BY id")).all()
+        self.part_ids = rng.sample(part_ids, min(size, len(part_ids)))
+        self.sale_ids = rng.sample(sale_ids, min(size, len(sale_ids)))
+        self.total_parts = db.session.execute(text("SELECT COUNT(*) FROM parts")).scalar()
+        names = db.session.scalars(
+            text("SELECT name FROM parts WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": self.part_ids[:200] or [0]}
+        ).all()
+        self.queries = sorted({name.split()[0] for name in names if name and name.split()}) or ["деталь"]
+        # Для продаж - детали с остатком: каждая покупка списывает одну штуку
+        self.stock = list(self.part_ids)
+        self.lock = threading.Lock()
+        self._image = None
+
+    def part_id(self):
+        return self.rng.choice(self.part_ids) if self.part_ids else 0
+
+    def sale_id(self):
+        return self.rng.choice(self.sale_ids) if self.sale_ids else 0
+
+    def query(self):
+        return quote(self.rng.choice(self.queries))
+
+    def stock_part_id(self):
+        with self.lock:
+            return self.stock.pop() if self.stock else self.part_id()
+
+    def image(self):
+        if self._image is None:
+            self._image = _sample_image()
+        return self._image
+
+
+SCENARIOS = (
+    Scenario("search", "GET", lambda s: (f"/search?q={s.query()}", {}, None), False),
+    Scenario("api_search", "GET", lambda s: (f"/api/parts/search?q={s.query()}", {}, None), False),
+    Scenario("parts_list", "GET", lambda s: ("/parts", {}, None), False),
+    Scenario("part_page", "GET", lambda s: (f"/parts/{s.part_id()}", {}, None), False),
+    Scenario("api_parts", "GET", lambda s: ("/api/v1/parts?per_page=50", {}, None), False),
+    Scenario("sale_page", "GET", lambda s: (f"/sales/{s.sale_id()}", {}, None), False),
+    Scenario("create_sale", "POST", lambda s: ("/api/sales", *_json({
+        "items": [{"part_id": s.stock_part_id(), "quantity": 1}],
+        "transport_company": "Самовывоз",
+    })), True),
+    Scenario("upload", "POST", lambda s: ("/parts/new_part/added", *_multipart(
+        {"name": "Нагрузочный тест", "car": "Bench", "part_number": f"BENCH-{uuid.uuid4().hex[:8]}",
+         "description": "создано flask bench", "price_in": 100, "price_out": 200, "quantity": 1},
+        {"images": ("bench.jpg", s.image(), "image/jpeg")}
+    )), True),
+)
+
+
+def _rss_kib(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _process_tree(pid):
+    """pid и все его потомки (воркеры gunicorn) по /proc"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # Имя процесса в скобках может содержать пробелы - ppid идет после ')'
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, ()))
+    return tree
+
+
+class RssSampler:
+    """Пиковая суммарная память (RSS) процесса и его потомков за время замера; без /proc - None"""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        pids = _process_tree(self.pid)
+        self.peak = max(self.peak, sum(_rss_kib(pid) for pid in pids))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        if os.path.exists(f"/proc/{self.pid}/status"):
+            self._sample()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+
+    @property
+    def peak_mib(self):
+        return round(self.peak / 1024, 1) if self._thread is not None else None
+
+
+def client_sender(app, token):
+    """Запросы через тестовый клиент Flask в этом же процессе (без сети и WSGI-сервера)"""
+    local = threading.local()
+
+    def send(method, path, headers, body):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        response = local.client.open(
+            path, method=method, data=body, headers={"Authorization": f"Bearer {token}", **headers}
+        )
+        # Потоковые ответы выполняются при чтении тела - его нужно дочитать
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    return send
+
+
+def http_sender(url, token, timeout=30):
+    """Запросы по HTTP к запущенному серверу, одно keep-alive соединение на поток"""
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    prefix = parts.path.rstrip("/")
+    local = threading.local()
+
+    def send(method, path, headers, body):
+        for attempt in range(2):
+            if getattr(local, "connection", None) is None:
+                local.connection = connection_class(parts.netloc, timeout=timeout)
+            try:
+                local.connection.request(
+                    method, prefix + path, body=body, headers={"Authorization": f"Bearer {token}", **headers}
+                )
+                response = local.connection.getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                # Сервер закрыл keep-alive соединение - повторяем один раз на новом
+                local.connection.close()
+                local.connection = None
+                if attempt:
+                    raise
+
+    return send
+
+
+def percentile(sorted_values, pct):
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_scenario(send, scenario, sample, requests, concurrency, warmup=0, rss_pid=None):
+    """Выполняет сценарий: warmup запросов без учета, затем requests запросов в concurrency потоков"""
+    for _ in range(warmup):
+        send(scenario.method, *scenario.build(sample))
+
+    latencies = []
+    errors = [0]
+    remaining = [requests]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            path, headers, body = scenario.build(sample)
+            started = time.perf_counter()
+            try:
+                ok = send(scenario.method, path, headers, body) < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    with RssSampler(rss_pid or os.getpid()) as rss:
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "peak_rss_mib": rss.peak_mib,
+    }
+
+
+def run_benchmark(send, scenarios, requests=200, concurrency=1, warmup=10, rss_pid=None, seed=0, meta=None):
+    """Прогоняет сценарии по очереди, возвращает отчет {meta, results} для сохранения в JSON"""
+    sample = Sample(random.Random(seed))
+    db.session.remove()
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run_scenario(send, scenario, sample, requests, concurrency, warmup, rss_pid)
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": requests,
+            "concurrency": concurrency,
+            "warmup": warmup,
+            "parts": sample.total_parts,
+            **(meta or {}),
+        },
+        "results": results,
+    }
+
+
+def compare_reports(baseline, current, tolerance=0.2):
+    """Сравнивает отчет с базовой линией, возвращает список регрессий (пустой - все в пределах tolerance).
+
+    Сравниваются p95, пропускная способность и пиковая память: p50 и p99 слишком
+    шумные для автоматического вердикта. Новые ошибки - регрессия при любой tolerance.
+    """
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        result = current.get("results", {}).get(name)
+        if result is None:
+            continue
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name}: ошибок {result['errors']} (было {base['errors']})")
+        for metric, higher_is_worse in COMPARED_METRICS:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f"{name}: {metric} {new} (было {old}, {change:+.0%})")
+    return regressions
@@ -0,0 +1,235 @@
+import json
+import math
+import hashlib
+from datetime import datetime
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.extensions import db
+from app.utils.rollups import record_sale
+from app.utils.page_cache import invalidate_parts
+
+
+class CheckoutError(Exception):
+    """Продажу нельзя оформить; status - HTTP-код ответа"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def normalize_lines(lines):
+    """Складывает строки с одной деталью, отбрасывает нулевые количества: {part_id: quantity}"""
+    quantities = {}
+    for part_id, quantity in lines:
+        try:
+            part_id, quantity = int(part_id), int(quantity)
+        except (TypeError, ValueError):
+            raise CheckoutError("Некорректный товар или количество")
+        if quantity < 0:
+            raise CheckoutError("Количество не может быть отрицательным")
+        if quantity > 0:
+            quantities[part_id] = quantities.get(part_id, 0) + quantity
+    if not quantities:
+        raise CheckoutError("Не выбраны товары для продажи")
+    return quantities
+
+
+def calculate_discount(total_amount, discount_type, discount_value):
+    if discount_type == 'percent' and discount_value > 0:
+        return math.ceil(total_amount * (discount_value / 100))
+    if discount_type == 'fixed' and discount_value > 0:
+        return discount_value
+    return 0
+
+
+def _fingerprint(quantities, details):
+    payload = json.dumps({"items": sorted(quantities.items()), **details}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _find_replay(idempotency_key, fingerprint):
+    from app.models import CheckoutRequest
+
+    previous = CheckoutRequest.query.filter_by(key=idempotency_key).first()
+    if previous is None:
+        return None
+    if previous.fingerprint != fingerprint:
+        raise CheckoutError("Ключ идемпотентности уже использован для другой продажи", 422)
+    return previous.sale
+
+
+def _begin_write():
+    """На SQLite сразу берет блокировку записи (BEGIN IMMEDIATE).
+
+    Иначе транзакция, начатая чтением, при первой записи после чужого коммита получает
+    SQLITE_BUSY_SNAPSHOT, и busy_timeout не помогает; ожидание BEGIN IMMEDIATE им покрыто.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != "sqlite":
+        return
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _reserve_stock(quantities):
+    """Списывает остатки одним UPDATE; не списывает ничего, если хоть одной детали не хватает"""
+    from app.models import Part
+
+    delta = case(quantities, value=Part.id)
+    result = db.session.execute(
+        update(Part)
+        .where(Part.id.in_(quantities), Part.quantity >= delta)
+        .values(quantity=Part.quantity - delta, version=Part.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(quantities)
+
+
+def _delete_sold_out(part_ids):
+    """Удаляет закончившиеся детали вместе с файлами, возвращает их id; данные остаются в sale_items"""
+    from app.models import Part
+    from app.utils.file_handling import delete_part_folder, delete_image_file, delete_video_file
+
+    deleted = []
+    for part in Part.query.filter(Part.id.in_(part_ids), Part.quantity <= 0):
+        for image in part.images:
+            delete_image_file(part.id, image.filename)
+        for video in part.videos:
+            delete_video_file(part.id, video.filename)
+        delete_part_folder(part.id)
+        db.session.delete(part)
+        deleted.append(part.id)
+    return deleted
+
+
+def checkout(lines, discount_type=None, discount_value=0, transport_company='',
+             tracking_number='', idempotency_key=None):
+    """Оформляет продажу в одной транзакции, возвращает (sale, created).
+
+    lines - пары (part_id, quantity). Детали читаются одним запросом IN (...),
+    остатки списываются условным UPDATE, поэтому параллельные продажи не уходят
+    в минус. С idempotency_key повтор запроса возвращает уже созданную продажу
+    (created=False) вместо повторного списания.
+    """
+    from app.models import Part, Sale, SaleItem, CheckoutRequest
+
+    quantities = normalize_lines(lines)
+    details = {
+        "discount_type": discount_type,
+        "discount_value": discount_value,
+        "transport_company": transport_company,
+        "tracking_number": tracking_number,
+    }
+    fingerprint = _fingerprint(quantities, details)
+
+    if idempotency_key:
+        replay = _find_replay(idempotency_key, fingerprint)
+        if replay is not None:
+            return replay, False
+
+    try:
+        _begin_write()
+        parts = {part.id: part for part in Part.query.filter(Part.id.in_(quantities))}
+        missing = [part_id for part_id in quantities if part_id not in parts]
+        if missing:
+            raise CheckoutError(f"Товар не найден: {', '.join(map(str, missing))}", 404)
+        # У старых записей цена может быть не заполнена
+        no_price = [part.name for part in parts.values() if part.price_out is None]
+        if no_price:
+            raise CheckoutError(f"Не указана цена продажи: {', '.join(no_price)}", 409)
+
+        if not _reserve_stock(quantities):
+            # Кто-то успел купить раньше - показываем текущий остаток
+            short = Part.query.filter(
+                Part.id.in_(quantities),
+                Part.quantity < case(quantities, value=Part.id)
+            ).first()
+            raise CheckoutError(
+                f"Недостаточно товара: {short.name}. В наличии: {short.quantity}" if short
+                else "Недостаточно товара",
+                409
+            )
+
+        sale = Sale(created_at=datetime.utcnow(), **details)
+        total_amount = 0
+        cost_amount = 0
+        for part_id, quantity in quantities.items():
+            part = parts[part_id]
+            item_total = part.price_out * quantity
+            total_amount += item_total
+            cost_amount += (part.price_in or 0) * quantity
+            # Сохраняем данные о детали на момент продажи
+            sale.items.append(SaleItem(
+                part_id=part.id,
+                quantity=quantity,
+                unit_price=part.price_out,
+                total_price=item_total,
+                unit_cost=part.price_in,
+                part_name=part.name,
+                part_car=part.car,
+                part_number=part.part_number
+            ))
+
+        sale.total_amount = total_amount
+        sale.final_amount = total_amount - calculate_discount(total_amount, discount_type, discount_value)
+        db.session.add(sale)
+        # Итоги для отчетов обновляются в той же транзакции
+        record_sale(sale, cost_amount)
+
+        if idempotency_key:
+            db.session.add(CheckoutRequest(key=idempotency_key, fingerprint=fingerprint, sale=sale))
+
+        db.session.flush()
+        # Объекты деталей в сессии хранят остаток и версию до UPDATE
+        for part in parts.values():
+            db.session.expire(part, ["quantity", "version"])
+        sold_out = _delete_sold_out(list(quantities))
+
+        db.session.commit()
+        invalidate_parts(list(quantities), deleted=sold_out)
+        return sale, True
+
+    except OperationalError as e:
+        db.session.rollback()
+        # busy_timeout истек: база занята другой записью - клиент может повторить
+        if "locked" in str(e.orig) or "busy" in str(e.orig):
+            raise CheckoutError("База данных занята, повторите попытку", 409)
+        raise
+
+    except IntegrityError:
+        db.session.rollback()
+        # Параллельный запрос с тем же ключом успел оформить продажу первым
+        replay = _find_replay(idempotency_key, fingerprint) if idempotency_key else None
+        if replay is None:
+            raise
+        return replay, False
+
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def sale_to_dict(sale):
+    return {
+        "id": sale.id,
+        "created_at": sale.created_at.isoformat() if sale.created_at else None,
+        "discount_type": sale.discount_type,
+        "discount_value": sale.discount_value,
+        "total_amount": sale.total_amount,
+        "final_amount": sale.final_amount,
+        "transport_company": sale.transport_company,
+        "tracking_number": sale.tracking_number,
+        "items": [
+            {
+                "part_id": item.part_id,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "total_price": item.total_price,
+                "part_name": item.part_name,
+                "part_car": item.part_car,
+                "part_number": item.part_number,
+            }
+            for item in sale.items
+        ],
+    }
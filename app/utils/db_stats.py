@@ -0,0 +1,68 @@
+import time
+from flask import request, has_request_context
+from sqlalchemy import event
+from app.extensions import db
+
+# Статистика живет в environ запроса, а не в g: потоковый ответ выполняет запросы
+# уже в новом контексте приложения (со своим g), но с тем же объектом запроса
+ENVIRON_KEY = "updb.query_stats"
+
+
+class QueryStats:
+    """SQL-запросы одного HTTP-запроса: число, суммарное время и время по тексту запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}  # текст -> [число выполнений, секунд]
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        entry = self.statements.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def top(self, limit):
+        """Самые долгие запросы по суммарному времени: [(текст, число, секунд)]"""
+        ranked = sorted(self.statements.items(), key=lambda item: -item[1][1])[:limit]
+        return [(statement, count, seconds) for statement, (count, seconds) in ranked]
+
+
+def current_query_stats():
+    return request.environ.setdefault(ENVIRON_KEY, QueryStats())
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+        context._query_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    # Запросы фоновых потоков (превью, импорт) к HTTP-запросам не относятся
+    if started is not None and has_request_context():
+        current_query_stats().add(statement, time.perf_counter() - started)
+
+
+def init_query_stats(app):
+    """Подключает учет SQL-запросов к движкам приложения (один раз на движок)"""
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, "before_cursor_execute", _before_execute):
+                event.listen(engine, "before_cursor_execute", _before_execute)
+                event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+def init_query_counter(app):
+    """Считает SQL-запросы за запрос и отдает число в заголовке X-DB-Queries (DB_QUERY_HEADER)"""
+    if not app.config.get('DB_QUERY_HEADER'):
+        return
+
+    init_query_stats(app)
+
+    @app.after_request
+    def add_query_count_header(response):
+        # Для потокового ответа - только запросы до начала отдачи тела
+        response.headers['X-DB-Queries'] = str(current_query_stats().count)
+        return response
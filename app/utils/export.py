@@ -0,0 +1,241 @@
+import io
+import re
+import csv
+import json
+import zipfile
+from xml.sax.saxutils import escape
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from app.extensions import db
+
+# Форматы выгрузки: формат -> (mimetype, расширение файла)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),  # charset=utf-8 Werkzeug добавляет сам
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+# Символы, недопустимые в XML 1.0 (встречаются в данных, вставленных из других программ)
+_XML_ILLEGAL_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+# Служебные части книги XLSX (минимальный набор, который открывают Excel и LibreOffice)
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+_XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def parts_query(in_stock=False, start=None, end=None):
+    """Колонки деталей для выгрузки; фильтры выполняются в SQL"""
+    from app.models import Part
+
+    query = select(
+        Part.id,
+        Part.name,
+        Part.car,
+        Part.part_number,
+        Part.description,
+        Part.price_in,
+        Part.price_out,
+        Part.quantity,
+        Part.created_at,
+    ).order_by(Part.id)
+    if in_stock:
+        query = query.where(Part.quantity > 0)
+    if start:
+        query = query.where(Part.created_at >= start)
+    if end:
+        query = query.where(Part.created_at < end + timedelta(days=1))
+    return query
+
+
+def sales_query(start=None, end=None):
+    """Позиции продаж вместе с полями продажи и данными детали на момент продажи (SaleItem)"""
+    from app.models import Sale, SaleItem
+
+    query = (
+        select(
+            Sale.id.label("sale_id"),
+            Sale.created_at,
+            Sale.discount_type,
+            Sale.discount_value,
+            Sale.total_amount,
+            Sale.final_amount,
+            Sale.transport_company,
+            Sale.tracking_number,
+            SaleItem.part_id,
+            SaleItem.part_name,
+            SaleItem.part_car,
+            SaleItem.part_number,
+            SaleItem.quantity,
+            SaleItem.unit_price,
+            SaleItem.total_price,
+            SaleItem.unit_cost,
+        )
+        .join(SaleItem, SaleItem.sale_id == Sale.id)
+        .order_by(Sale.id, SaleItem.id)
+    )
+    if start:
+        query = query.where(Sale.created_at >= start)
+    if end:
+        query = query.where(Sale.created_at < end + timedelta(days=1))
+    return query
+
+
+def iter_rows(query):
+    """Строки запроса пачками по EXPORT_BATCH_SIZE: курсор на стороне сервера, память не растет с таблицей"""
+    result = db.session.execute(
+        query.execution_options(yield_per=current_app.config['EXPORT_BATCH_SIZE'])
+    )
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(columns, rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM - чтобы Excel открыл кириллицу без выбора кодировки
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns, rows, chunk_size):
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield "".join(lines)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл только на запись: zipfile пишет в него, генератор забирает накопленные байты"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = _XML_ILLEGAL_RE.sub("", str(_plain(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return "<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>"
+
+
+def _xlsx_chunks(columns, rows, chunk_size, title):
+    """Книга XLSX с одним листом, собираемая потоком.
+
+    Строки пишутся в zip по мере чтения из базы (inline-строки, без таблицы
+    общих строк), поэтому первые байты уходят клиенту сразу, а память не зависит
+    от числа строк. Даты выгружаются текстом ISO 8601, как в CSV.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content.format(title=escape(title)))
+        yield sink.drain()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(_XLSX_SHEET_HEAD.encode())
+            sheet.write(_xlsx_row(columns).encode())
+            size = 0
+            for row in rows:
+                data = _xlsx_row(row).encode()
+                sheet.write(data)
+                size += len(data)
+                if size >= chunk_size:
+                    size = 0
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            sheet.write(_XLSX_SHEET_TAIL.encode())
+    yield sink.drain()
+
+
+def export_chunks(export_format, query, title):
+    """Генератор кусков файла выгрузки в формате export_format (csv, ndjson, xlsx)"""
+    chunk_size = current_app.config['STREAM_CHUNK_SIZE']
+    columns = [column.name for column in query.selected_columns]
+    rows = iter_rows(query)
+    if export_format == "ndjson":
+        return _ndjson_chunks(columns, rows, chunk_size)
+    if export_format == "xlsx":
+        return _xlsx_chunks(columns, rows, chunk_size, title)
+    return _csv_chunks(columns, rows, chunk_size)
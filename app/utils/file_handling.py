@@ -2,7 +2,8 @@ import os
 import uuid
 from flask import current_app
 from werkzeug.utils import secure_filename
-from PIL import Image
+
+_heif_registered = False
 
 
 def allowed_file(filename):
@@ -19,14 +20,14 @@ def get_upload_path(part_id=None):
     if part_id:
         # Путь к конкретной папке детали
         upload_path = os.path.join(
-            current_app.root_path,
+            current_app.instance_path,
             current_app.config['UPLOAD_FOLDER'],
             str(part_id)
         )
     else:
         # Общий путь (для временных файлов или других целей)
         upload_path = os.path.join(
-            current_app.root_path,
+            current_app.instance_path,
             current_app.config['UPLOAD_FOLDER']
         )
 
@@ -37,7 +38,7 @@ def get_upload_path(part_id=None):
 def get_video_upload_path(part_id):
     """Получает путь к папке video для конкретной детали"""
     video_path = os.path.join(
-        current_app.root_path,
+        current_app.instance_path,
         current_app.config['UPLOAD_FOLDER'],
         str(part_id),
         'video'
@@ -52,48 +53,114 @@ def generate_unique_filename(original_filename):
     return f"{unique_id}.{ext}"
 
 
-def delete_part_folder(part_id):
-    """Удаляет папку с изображениями и видео детали"""
-    try:
-        folder_path = os.path.join(
-            current_app.root_path,
-            current_app.config['UPLOAD_FOLDER'],
-            str(part_id)
+def register_heif_support():
+    """Подключает чтение HEIC/HEIF в Pillow, если установлен pillow-heif"""
+    global _heif_registered
+    if not _heif_registered:
+        try:
+            from pillow_heif import register_heif_opener
+        except ImportError:
+            return False
+        register_heif_opener()
+        _heif_registered = True
+    return True
+
+
+def ingest_image(file_path, keep_source=False):
+    """Нормализует загруженное фото: декодирует (в т.ч. HEIC), поворачивает по EXIF,
+    удаляет метаданные (EXIF, GPS) и пересжимает в JPEG/WebP ограниченного размера.
+
+    Возвращает имя нового файла в той же папке; исходный файл удаляется,
+    если не передан keep_source.
+    """
+    # Pillow нужен только при загрузке фото - воркер стартует без него
+    from PIL import Image, ImageOps
+
+    register_heif_support()
+
+    image_format = current_app.config['INGEST_IMAGE_FORMAT']
+    max_side = current_app.config['INGEST_MAX_SIDE']
+    ext = 'jpg' if image_format.upper() == 'JPEG' else image_format.lower()
+
+    # Новое уникальное имя: URL файлов считаются неизменяемыми и кэшируются надолго
+    folder = os.path.dirname(file_path)
+    new_filename = f"{uuid.uuid4().hex}.{ext}"
+    new_path = os.path.join(folder, new_filename)
+    tmp_path = new_path + '.tmp'
+
+    with Image.open(file_path) as original:
+        icc_profile = original.info.get('icc_profile')
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        if image.mode in ('RGBA', 'LA', 'P') and image_format.upper() == 'JPEG':
+            # JPEG не поддерживает прозрачность - кладем на белый фон
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+
+        # exif не передаем - метаданные в новый файл не попадают
+        image.save(
+            tmp_path,
+            image_format,
+            quality=current_app.config['INGEST_IMAGE_QUALITY'],
+            optimize=True,
+            icc_profile=icc_profile
         )
-        if os.path.exists(folder_path):
-            import shutil
-            shutil.rmtree(folder_path)
-            return True
-    except Exception as e:
-        print(f"Ошибка при удалении папки: {e}")
+
+    os.replace(tmp_path, new_path)
+    if new_path != file_path and not keep_source:
+        os.remove(file_path)
+    return new_filename
+
+
+def _part_folder(part_id):
+    # В отличие от get_upload_path, папку не создает
+    return os.path.join(
+        current_app.instance_path,
+        current_app.config['UPLOAD_FOLDER'],
+        str(part_id)
+    )
+
+
+def delete_part_folder(part_id):
+    """Удаляет папку с изображениями и видео детали (в фоне, после коммита)"""
+    from app.utils.media_gc import delete_after_commit
+
+    folder_path = _part_folder(part_id)
+    if not os.path.exists(folder_path):
         return False
+    delete_after_commit([folder_path])
+    return True
 
 
 def delete_image_file(part_id, filename):
-    """Удаляет конкретный файл изображения"""
-    try:
-        file_path = os.path.join(
-            get_upload_path(part_id),
-            filename
-        )
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return True
-    except Exception as e:
-        print(f"Ошибка при удалении файла: {e}")
+    """Удаляет конкретный файл изображения вместе с его уменьшенными копиями (в фоне, после коммита)"""
+    from app.utils.images import IMAGE_VARIANTS, variant_filename
+    from app.utils.media_gc import delete_after_commit
+    from app.utils.media_store import is_blob_name
+
+    # Файлы общего хранилища удаляются по счетчику ссылок, а не напрямую
+    if is_blob_name(filename):
         return False
 
+    folder_path = _part_folder(part_id)
+    paths = [os.path.join(folder_path, filename)]
+    paths.extend(os.path.join(folder_path, variant_filename(filename, variant)) for variant in IMAGE_VARIANTS)
+    delete_after_commit(paths)
+    return True
+
 
 def delete_video_file(part_id, filename):
-    """Удаляет конкретный видео файл"""
-    try:
-        file_path = os.path.join(
-            get_video_upload_path(part_id),
-            filename
-        )
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return True
-    except Exception as e:
-        print(f"Ошибка при удалении видео файла: {e}")
-        return False
\ No newline at end of file
+    """Удаляет конкретный видео файл (в фоне, после коммита)"""
+    from app.utils.media_gc import delete_after_commit
+    from app.utils.media_store import is_blob_name
+
+    if is_blob_name(filename):
+        return False
+
+    delete_after_commit([os.path.join(_part_folder(part_id), 'video', filename)])
+    return True
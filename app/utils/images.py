@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Размеры производных изображений: вариант -> максимальная сторона в пикселях
+IMAGE_VARIANTS = {
+    "thumb": 160,
+    "medium": 800,
+    "full": 1920,
+}
+
+_executor = None
+
+
+def get_executor():
+    """Пул потоков для фоновой обработки изображений (создается при первом обращении)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config['IMAGE_WORKERS'],
+            thread_name_prefix="image-variants"
+        )
+    return _executor
+
+
+def variant_filename(filename, variant):
+    """Имя файла варианта: <uuid>_<variant>.<формат>"""
+    stem = filename.rsplit('.', 1)[0]
+    ext = current_app.config['IMAGE_VARIANT_FORMAT'].lower()
+    return f"{stem}_{variant}.{ext}"
+
+
+def parse_variants(value):
+    """Разбирает колонку PartImage.variants ('thumb:160,medium:800') в словарь вариант -> ширина"""
+    variants = {}
+    if not value:
+        return variants
+    for item in value.split(','):
+        name, _, width = item.partition(':')
+        if name and width.isdigit():
+            variants[name] = int(width)
+    return variants
+
+
+def format_variants(variants):
+    return ",".join(f"{name}:{width}" for name, width in variants.items())
+
+
+def generate_variants(source_path, target_dir, filename):
+    """Создает уменьшенные копии изображения, возвращает словарь вариант -> фактическая ширина"""
+    # Pillow импортируется в фоновом потоке превью, а не при старте воркера (models импортирует этот модуль)
+    from PIL import Image, ImageOps
+
+    image_format = current_app.config['IMAGE_VARIANT_FORMAT']
+    quality = current_app.config['IMAGE_VARIANT_QUALITY']
+    created = {}
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        if image_format.upper() in ("JPEG", "JPG") and image.mode == "RGBA":
+            image = image.convert("RGB")
+
+        # От большего к меньшему: каждый следующий вариант уменьшаем из предыдущего
+        for variant, max_side in sorted(IMAGE_VARIANTS.items(), key=lambda item: -item[1]):
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            resized.save(
+                os.path.join(target_dir, variant_filename(filename, variant)),
+                image_format,
+                quality=quality,
+                optimize=True
+            )
+            created[variant] = resized.width
+            image = resized
+
+    return {variant: created[variant] for variant in IMAGE_VARIANTS if variant in created}
+
+
+def _process_image(app, image_id):
+    from app.extensions import db
+    from app.models import PartImage
+    from app.utils.file_handling import ingest_image
+    from app.utils.media_store import get_blob_path, store_file
+    from app.utils.page_cache import invalidate_parts
+
+    with app.app_context():
+        image = db.session.get(PartImage, image_id)
+        if image is None:
+            return
+        source_path = get_blob_path(image.filename)
+
+        try:
+            # Сначала нормализуем оригинал и кладем результат в хранилище как новый блоб
+            normalized_path = os.path.join(os.path.dirname(source_path), ingest_image(source_path, keep_source=True))
+            blob = store_file(normalized_path, normalized_path.rsplit('.', 1)[1])
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Не удалось обработать изображение {image.filename}: {e}")
+            return
+
+        # Такое же фото уже обрабатывалось - берем готовые превью
+        same_blob = PartImage.query.filter(
+            PartImage.blob_id == blob.id,
+            PartImage.variants.isnot(None)
+        ).first()
+        if same_blob is not None:
+            variants = parse_variants(same_blob.variants)
+        else:
+            try:
+                blob_path = get_blob_path(blob.filename)
+                variants = generate_variants(blob_path, os.path.dirname(blob_path), blob.filename)
+            except Exception as e:
+                app.logger.warning(f"Не удалось создать превью для {blob.filename}: {e}")
+                variants = {}
+
+        # Исходный блоб освобождается автоматически, когда на него не остается ссылок
+        image.blob_id = blob.id
+        image.filename = blob.filename
+        image.variants = format_variants(variants) or None
+        image.part.touch()
+        db.session.commit()
+        invalidate_parts([image.part_id])
+
+
+def schedule_variants(part_images):
+    """Ставит нормализацию и создание вариантов для сохраненных изображений в фоновый пул"""
+    app = current_app._get_current_object()
+    executor = get_executor()
+    for image in part_images:
+        executor.submit(_process_image, app, image.id)
+
@@ -0,0 +1,387 @@
+import os
+import csv
+import codecs
+import uuid
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import text, bindparam, update
+from app.extensions import db
+from app.utils.search import normalize_text, normalize_part_number, bulk_insert_index
+
+IMPORTS_DIR = ".imports"
+
+# Заголовки колонок файла (после normalize_text) -> поле детали
+COLUMN_ALIASES = {
+    "name": "name", "название": "name", "наименование": "name",
+    "car": "car", "авто": "car", "автомобиль": "car", "модель": "car",
+    "part_number": "part_number", "номер": "part_number", "артикул": "part_number",
+    "каталожный номер": "part_number",
+    "description": "description", "описание": "description",
+    "price_in": "price_in", "закупка": "price_in", "закупочная цена": "price_in",
+    "price_out": "price_out", "цена": "price_out", "цена продажи": "price_out",
+    "quantity": "quantity", "количество": "quantity", "кол-во": "quantity",
+}
+REQUIRED_COLUMNS = ("name", "part_number")
+TEXT_FIELDS = ("name", "car", "part_number", "description")
+INT_FIELDS = ("price_in", "price_out", "quantity")
+
+_SNIFF_SIZE = 64 * 1024
+
+_INSERT_SQL = text(
+    "INSERT INTO parts (name, car, part_number, description, price_in, price_out, quantity, created_at, "
+    "name_key, car_key, description_key, part_number_key) "
+    "VALUES (:name, :car, :part_number, :description, :price_in, :price_out, :quantity, :created_at, "
+    ":name_key, :car_key, :description_key, :part_number_key)"
+)
+
+# Пустая ячейка не затирает значение, которое уже есть в базе
+_UPDATE_PRICES_SQL = (
+    "UPDATE parts SET "
+    "price_in = COALESCE(:price_in, price_in), price_out = COALESCE(:price_out, price_out), "
+    "quantity = {quantity}, version = version + 1 "
+    "WHERE id = :id"
+)
+# Текстовые поля обновляются отдельным запросом: триггер поискового индекса
+# срабатывает на любое присваивание name/car/part_number/description
+_UPDATE_TEXT_SQL = text(
+    "UPDATE parts SET "
+    "name = COALESCE(:name, name), car = COALESCE(:car, car), "
+    "part_number = COALESCE(:part_number, part_number), description = COALESCE(:description, description), "
+    "name_key = COALESCE(:name_key, name_key), car_key = COALESCE(:car_key, car_key), "
+    "description_key = COALESCE(:description_key, description_key), version = version + 1 "
+    "WHERE id = :id"
+)
+_UPDATE_QUANTITY = {
+    "add": "COALESCE(quantity, 0) + COALESCE(:quantity, 0)",  # поступление добавляется к остатку
+    "set": "COALESCE(:quantity, quantity)",  # остаток из файла заменяет текущий
+}
+
+_EXISTING_SQL = text(
+    "SELECT id, part_number_key, name, car, part_number, description FROM parts "
+    "WHERE part_number_key IN :keys ORDER BY id"
+).bindparams(bindparam("keys", expanding=True))
+
+_executor = None
+
+
+class ImportFileError(Exception):
+    """Файл нельзя импортировать целиком (формат, заголовки)"""
+
+
+def get_executor():
+    """Пул потоков для фонового импорта (создается при первом обращении)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config['IMPORT_WORKERS'],
+            thread_name_prefix="parts-import"
+        )
+    return _executor
+
+
+def get_imports_path():
+    """Папка принятых файлов и отчетов об ошибках - внутри папки загрузок (переносится без копирования)"""
+    path = os.path.join(
+        current_app.instance_path,
+        current_app.config['UPLOAD_FOLDER'],
+        IMPORTS_DIR
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def error_report_path(job_id):
+    return os.path.join(get_imports_path(), f"{job_id}.errors.csv")
+
+
+def allowed_import(filename):
+    return '.' in filename and \
+        filename.rsplit('.', 1)[1].lower() in current_app.config['IMPORT_ALLOWED_EXTENSIONS']
+
+
+# --- Чтение файла ---
+
+def _detect_encoding(sample):
+    """utf-8 (в т.ч. с BOM от Excel), иначе cp1251 - так сохраняют CSV русские версии Excel"""
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1251"
+
+
+def _csv_rows(path):
+    with open(path, "rb") as f:
+        sample = f.read(_SNIFF_SIZE)
+    encoding = _detect_encoding(sample)
+    try:
+        dialect = csv.Sniffer().sniff(sample.decode(encoding, errors="ignore"), delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    with open(path, newline="", encoding=encoding) as f:
+        yield from csv.reader(f, dialect)
+
+
+def _xlsx_rows(path):
+    from openpyxl import load_workbook
+
+    # read_only читает лист потоком, не загружая всю книгу в память
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    """Строки файла по одной: (номер строки в файле, {поле: значение}).
+
+    Первая строка - заголовки, колонки сопоставляются по COLUMN_ALIASES,
+    неизвестные колонки пропускаются.
+    """
+    reader = _xlsx_rows(path) if path.lower().endswith(".xlsx") else _csv_rows(path)
+    try:
+        header = next(reader, None)
+        if header is None:
+            raise ImportFileError("Файл пустой")
+        fields = [COLUMN_ALIASES.get(normalize_text(str(name))) if name is not None else None for name in header]
+        missing = [column for column in REQUIRED_COLUMNS if column not in fields]
+        if missing:
+            raise ImportFileError(f"Нет обязательных колонок: {', '.join(missing)}")
+
+        for line, values in enumerate(reader, start=2):
+            if all(value is None or str(value).strip() == "" for value in values):
+                continue
+            yield line, {field: value for field, value in zip(fields, values) if field}
+    finally:
+        reader.close()
+
+
+# --- Проверка строк ---
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # номер из ячейки Excel с числовым форматом
+    value = str(value).strip()
+    if len(value) > 255:
+        raise ValueError("Значение длиннее 255 символов")
+    return value or None
+
+
+def _int(value, field):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, str):
+        value = value.replace("\xa0", "").replace(" ", "").replace(",", ".")
+    try:
+        # int(10.5) молча отбросит дробь, поэтому числа из ячеек Excel проверяются как float
+        number = value if isinstance(value, float) else int(value)
+    except (TypeError, ValueError):
+        # Дробная запись целого числа: 1200.00 или 1 200,00
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field}: ожидается число, получено {value!r}")
+    if isinstance(number, float):
+        if not number.is_integer():
+            raise ValueError(f"{field}: ожидается целое число, получено {value}")
+        number = int(number)
+    if number < 0:
+        raise ValueError(f"{field}: значение не может быть отрицательным")
+    return number
+
+
+def validate_row(raw):
+    """Значения строки файла -> поля детали; ValueError с описанием, если строка некорректна"""
+    row = {field: _text(raw.get(field)) for field in TEXT_FIELDS}
+    if not row["name"]:
+        raise ValueError("Не указано название")
+    if not normalize_part_number(row["part_number"]):
+        raise ValueError("Не указан номер детали")
+    for field in INT_FIELDS:
+        row[field] = _int(raw.get(field), field)
+    return row
+
+
+# --- Запись пачками ---
+
+def _merge(batch, row, quantity_mode):
+    """Строки с одним номером в пределах пачки сливаются: поля - последние, количество - по режиму"""
+    key = normalize_part_number(row["part_number"])
+    previous = batch.get(key)
+    if previous is None:
+        batch[key] = row
+        return
+    merged = {**previous, **{field: value for field, value in row.items() if value is not None}}
+    if quantity_mode == "add" and previous["quantity"] is not None and row["quantity"] is not None:
+        merged["quantity"] = previous["quantity"] + row["quantity"]
+    batch[key] = merged
+
+
+def _text_changed(row, current):
+    return any(row[field] is not None and row[field] != current[field] for field in TEXT_FIELDS)
+
+
+def _write_batch(batch, quantity_mode):
+    """Вставляет новые детали и обновляет существующие (executemany).
+
+    Возвращает (вставлено, обновлено, {номер: ошибка}) - новые детали без цены продажи
+    не вставляются: ее требует и форма добавления, и оформление продажи.
+    """
+    existing = {}
+    for current in db.session.execute(_EXISTING_SQL, {"keys": list(batch)}).mappings():
+        existing.setdefault(current["part_number_key"], current)
+
+    now = datetime.utcnow()
+    inserts, updates, text_updates, rejected = [], [], [], {}
+    for key, row in batch.items():
+        current = existing.get(key)
+        if current is not None:
+            updates.append({**row, "id": current["id"]})
+            if _text_changed(row, current):
+                text_updates.append({
+                    **row,
+                    "id": current["id"],
+                    "name_key": normalize_text(row["name"]),
+                    "car_key": normalize_text(row["car"]),
+                    "description_key": normalize_text(row["description"]),
+                })
+        elif row["price_out"] is None:
+            rejected[key] = "Не указана цена продажи для новой детали"
+        else:
+            inserts.append({
+                **row,
+                # Закупочная цена необязательна, как пустое поле формы - 0
+                "price_in": row["price_in"] or 0,
+                "quantity": 1 if row["quantity"] is None else row["quantity"],
+                "created_at": now,
+                "name_key": normalize_text(row["name"]),
+                "car_key": normalize_text(row["car"]),
+                "description_key": normalize_text(row["description"]),
+                "part_number_key": key,
+            })
+
+    if updates:
+        db.session.execute(text(_UPDATE_PRICES_SQL.format(quantity=_UPDATE_QUANTITY[quantity_mode])), updates)
+    if text_updates:
+        db.session.execute(_UPDATE_TEXT_SQL, text_updates)
+    if inserts:
+        with bulk_insert_index(db.session):
+            db.session.execute(_INSERT_SQL, inserts)
+    return len(inserts), len(updates), rejected
+
+
+def import_parts(path, report_path, quantity_mode="add", batch_size=1000, progress=None):
+    """Импортирует детали из CSV/XLSX, возвращает итоги {rows, inserted, updated, failed}.
+
+    Файл читается построчно, детали сопоставляются по нормализованному номеру.
+    Каждая пачка из batch_size строк записывается двумя executemany и
+    коммитится; progress(stats) вызывается перед коммитом пачки. Ошибки строк
+    (номер строки, номер детали, причина) пишутся в CSV report_path.
+    """
+    if quantity_mode not in _UPDATE_QUANTITY:
+        raise ValueError(f"Неизвестный режим количества: {quantity_mode}")
+
+    stats = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0}
+
+    with open(report_path, "w", newline="", encoding="utf-8-sig") as report_file:
+        report = csv.writer(report_file)
+        report.writerow(["line", "part_number", "error"])
+
+        def flush(batch, lines):
+            if not batch:
+                return
+            try:
+                inserted, updated, rejected = _write_batch(batch, quantity_mode)
+                stats["inserted"] += inserted
+                stats["updated"] += updated
+                for line, part_number in lines:
+                    error = rejected.get(normalize_part_number(part_number))
+                    if error:
+                        stats["failed"] += 1
+                        report.writerow([line, part_number, error])
+                if progress is not None:
+                    progress(stats)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                stats["failed"] += len(lines)
+                for line, part_number in lines:
+                    report.writerow([line, part_number, f"Ошибка записи пачки: {e}"])
+            batch.clear()
+            lines.clear()
+
+        batch, lines = {}, []
+        for line, raw in read_rows(path):
+            stats["rows"] += 1
+            try:
+                row = validate_row(raw)
+            except ValueError as e:
+                stats["failed"] += 1
+                report.writerow([line, raw.get("part_number"), str(e)])
+                continue
+            _merge(batch, row, quantity_mode)
+            lines.append((line, row["part_number"]))
+            if len(lines) >= batch_size:
+                flush(batch, lines)
+        flush(batch, lines)
+
+    return stats
+
+
+# --- Фоновая задача ---
+
+def _run_job(app, job_id, path):
+    from app.models import ImportJob
+
+    with app.app_context():
+        def save(**values):
+            db.session.execute(update(ImportJob).where(ImportJob.id == job_id).values(**values))
+
+        save(status="running")
+        db.session.commit()
+        try:
+            stats = import_parts(
+                path,
+                error_report_path(job_id),
+                quantity_mode=db.session.get(ImportJob, job_id).quantity_mode,
+                batch_size=app.config['IMPORT_BATCH_SIZE'],
+                # Счетчики попадают в базу в той же транзакции, что и пачка деталей
+                progress=lambda stats: save(**stats)
+            )
+            save(status="done", finished_at=datetime.utcnow(), **stats)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Импорт {job_id} остановлен: {e}")
+            save(status="failed", error=str(e), finished_at=datetime.utcnow())
+        finally:
+            db.session.commit()
+            db.session.remove()
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def start_import(file_storage, quantity_mode="add"):
+    """Сохраняет загруженный файл и ставит импорт в фоновую очередь, возвращает ImportJob"""
+    from app.models import ImportJob
+    from app.utils.uploads import UploadSpool
+
+    ext = file_storage.filename.rsplit('.', 1)[1].lower()
+    path = os.path.join(get_imports_path(), f"{uuid.uuid4().hex}.{ext}")
+    if isinstance(file_storage.stream, UploadSpool):
+        # Файл уже на диске - переносим без копирования
+        file_storage.stream.commit(path)
+    else:
+        file_storage.save(path)
+
+    job = ImportJob(filename=file_storage.filename, quantity_mode=quantity_mode, status="queued")
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    get_executor().submit(_run_job, app, job.id, path)
+    return job
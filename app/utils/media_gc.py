@@ -0,0 +1,335 @@
+import os
+import time
+import shutil
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.extensions import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_delete_executor = None
+_gc_thread = None
+
+
+# --- Фоновое удаление файлов ---
+
+def get_delete_executor():
+    """Один фоновый поток для удаления файлов, чтобы запросы не ждали rmtree"""
+    global _delete_executor
+    if _delete_executor is None:
+        _delete_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media-delete")
+    return _delete_executor
+
+
+def _delete_paths(app, paths):
+    for path in paths:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            app.logger.warning(f"Ошибка при удалении {path}: {e}")
+
+
+def enqueue_delete(paths):
+    """Ставит удаление файлов и папок в фоновую очередь"""
+    if paths:
+        app = current_app._get_current_object()
+        get_delete_executor().submit(_delete_paths, app, list(paths))
+
+
+def delete_after_commit(paths):
+    """Удаляет файлы в фоне после коммита текущей транзакции; при откате - не трогает"""
+    db.session.info.setdefault("paths_to_delete", []).extend(paths)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    paths = session.info.pop("paths_to_delete", None)
+    if paths:
+        enqueue_delete(paths)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("paths_to_delete", None)
+
+
+# --- Сверка папки загрузок с базой ---
+
+class MediaRootError(Exception):
+    """Папки загрузок нет или она пуста, хотя в базе есть фото и видео (не смонтирован том)"""
+
+
+def _upload_root():
+    return os.path.join(current_app.instance_path, current_app.config['UPLOAD_FOLDER'])
+
+
+def _has_files(root):
+    # Служебные файлы (блокировка сверки) не в счет - их создает сама сверка
+    for _, _, files in os.walk(root):
+        if any(not name.startswith(".") for name in files):
+            return True
+    return False
+
+
+def _file_exists(root, model, part_id, filename):
+    from app.models import PartVideo
+    from app.utils.media_store import is_blob_name, get_blob_path
+
+    if is_blob_name(filename):
+        return os.path.exists(get_blob_path(filename))
+    folder = os.path.join(root, str(part_id))
+    if model is PartVideo:
+        folder = os.path.join(folder, 'video')
+    return os.path.exists(os.path.join(folder, filename))
+
+
+def _is_old(path, deadline):
+    # Свежие файлы не трогаем: они могут принадлежать еще не закоммиченной загрузке
+    try:
+        return os.path.getmtime(path) < deadline
+    except OSError:
+        return False
+
+
+def find_orphans():
+    """Ищет файлы без записей в базе и записи без файлов.
+
+    Возвращает словарь:
+      orphan_paths - файлы и папки на диске, на которые не ссылается база;
+      dangling_images / dangling_videos - id записей, файлов которых нет;
+      unreferenced_blobs - id блобов хранилища без ссылок.
+    """
+    from app.models import Part, PartImage, PartVideo, MediaBlob
+    from app.utils.images import IMAGE_VARIANTS, variant_filename
+    from app.utils.media_store import BLOBS_DIR, is_blob_name
+    from app.utils.uploads import INCOMING_DIR
+
+    root = _upload_root()
+    deadline = time.time() - current_app.config['MEDIA_GC_GRACE_PERIOD'].total_seconds()
+
+    part_ids = {part_id for (part_id,) in db.session.query(Part.id)}
+    blob_hashes = {sha for (sha,) in db.session.query(MediaBlob.sha256)}
+
+    # Старые файлы, которые лежат прямо в папках деталей
+    legacy_images = {}
+    for part_id, filename in db.session.query(PartImage.part_id, PartImage.filename).filter(PartImage.blob_id.is_(None)):
+        names = legacy_images.setdefault(part_id, set())
+        names.add(filename)
+        names.update(variant_filename(filename, variant) for variant in IMAGE_VARIANTS)
+
+    legacy_videos = {}
+    for part_id, filename in db.session.query(PartVideo.part_id, PartVideo.filename).filter(PartVideo.blob_id.is_(None)):
+        legacy_videos.setdefault(part_id, set()).add(filename)
+
+    orphan_paths = []
+    if os.path.isdir(root):
+        for entry in os.scandir(root):
+            if entry.name == INCOMING_DIR:
+                continue
+
+            if entry.name == BLOBS_DIR:
+                for bucket in os.scandir(entry.path):
+                    for blob_file in os.scandir(bucket.path):
+                        # Файл блоба и его превью начинаются с хэша содержимого
+                        owned = is_blob_name(blob_file.name) and blob_file.name[:64] in blob_hashes
+                        if not owned and _is_old(blob_file.path, deadline):
+                            orphan_paths.append(blob_file.path)
+                continue
+
+            if not entry.is_dir() or not entry.name.isdigit():
+                continue
+
+            part_id = int(entry.name)
+            if part_id not in part_ids:
+                if _is_old(entry.path, deadline):
+                    orphan_paths.append(entry.path)
+                continue
+
+            image_names = legacy_images.get(part_id, set())
+            video_names = legacy_videos.get(part_id, set())
+            for item in os.scandir(entry.path):
+                if item.is_dir():
+                    if item.name != 'video':
+                        continue
+                    for video in os.scandir(item.path):
+                        if video.name not in video_names and _is_old(video.path, deadline):
+                            orphan_paths.append(video.path)
+                elif item.name not in image_names and _is_old(item.path, deadline):
+                    orphan_paths.append(item.path)
+
+    dangling_images = [
+        row.id for row in db.session.query(PartImage.id, PartImage.part_id, PartImage.filename)
+        if not _file_exists(root, PartImage, row.part_id, row.filename)
+    ]
+    dangling_videos = [
+        row.id for row in db.session.query(PartVideo.id, PartVideo.part_id, PartVideo.filename)
+        if not _file_exists(root, PartVideo, row.part_id, row.filename)
+    ]
+
+    # Блоб без ссылок остается, если запрос упал между сохранением файла и записью детали
+    unreferenced_blobs = [
+        blob_id for (blob_id,) in db.session.query(MediaBlob.id).filter(
+            MediaBlob.ref_count <= 0,
+            MediaBlob.created_at < datetime.utcnow() - current_app.config['MEDIA_GC_GRACE_PERIOD']
+        )
+    ]
+
+    return {
+        "orphan_paths": orphan_paths,
+        "dangling_images": dangling_images,
+        "dangling_videos": dangling_videos,
+        "unreferenced_blobs": unreferenced_blobs,
+    }
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def _delete_dangling_rows(model, ids, root):
+    """Удаляет записи без файлов, заново проверяя каждую в удаляющей транзакции.
+
+    За время сверки фото могло получить новый блоб (превью, перекодирование) или
+    файл мог появиться - такие записи остаются. Возвращает число удаленных.
+    """
+    from app.models import MediaBlob
+
+    deleted = 0
+    rows = model.query.filter(model.id.in_(ids)).populate_existing().with_for_update()
+    for row in rows:
+        # Блоб берется из строки, прочитанной в этой транзакции: запись могла перейти на другой
+        if row.blob_id is not None:
+            blob = db.session.get(MediaBlob, row.blob_id, populate_existing=True)
+            if blob is None or blob.filename != row.filename:
+                continue
+        if _file_exists(root, model, row.part_id, row.filename):
+            continue
+        db.session.delete(row)
+        deleted += 1
+    db.session.commit()
+    return deleted
+
+
+def delete_unreferenced_blobs(blob_ids):
+    """Удаляет блобы без ссылок, возвращает их (sha256, ext) для delete_blob_files.
+
+    ref_count проверяется в самом DELETE: пока шла сверка, на блоб могли сослаться снова.
+    """
+    from app.models import MediaBlob
+
+    deleted_blobs = []
+    for blob in MediaBlob.query.filter(MediaBlob.id.in_(blob_ids)).all():
+        deleted = db.session.execute(
+            text("DELETE FROM media_blobs WHERE id = :id AND ref_count <= 0"), {"id": blob.id}
+        ).rowcount
+        if deleted:
+            deleted_blobs.append((blob.sha256, blob.ext))
+    db.session.commit()
+    return deleted_blobs
+
+
+def reconcile_media(delete=False, delete_rows=False, batch_size=None, pause=None):
+    """Сверяет файлы с базой и (при delete=True) удаляет найденное пачками с паузами.
+
+    Записи фото и видео без файлов удаляются только с delete_rows=True (flask reconcile-media
+    --delete-rows): фоновая сверка чистит лишь файлы-сироты и блобы без ссылок.
+    """
+    from app.models import PartImage, PartVideo
+    from app.utils.media_store import delete_blob_files
+    from app.utils.uploads import cleanup_stale_uploads
+
+    if batch_size is None:
+        batch_size = current_app.config['MEDIA_GC_BATCH_SIZE']
+    if pause is None:
+        pause = current_app.config['MEDIA_GC_BATCH_PAUSE']
+
+    report = find_orphans()
+    if not delete:
+        return report
+
+    # Пустая или отсутствующая папка при записях в базе - почти наверняка не смонтирован том:
+    # все записи выглядели бы брошенными
+    root = _upload_root()
+    if (report["dangling_images"] or report["dangling_videos"]) and not (os.path.isdir(root) and _has_files(root)):
+        raise MediaRootError(f"Папка загрузок {root} отсутствует или пуста, сверка прервана")
+
+    report["stale_uploads"] = cleanup_stale_uploads()
+
+    for batch in _batches(report["orphan_paths"], batch_size):
+        _delete_paths(current_app, batch)
+        time.sleep(pause)
+
+    # Записи без файлов удаляем через ORM, чтобы сработал подсчет ссылок на блобы
+    report["deleted_rows"] = 0
+    if delete_rows:
+        for model, key in ((PartImage, "dangling_images"), (PartVideo, "dangling_videos")):
+            for batch in _batches(report[key], batch_size):
+                report["deleted_rows"] += _delete_dangling_rows(model, batch, root)
+                time.sleep(pause)
+
+    for batch in _batches(report["unreferenced_blobs"], batch_size):
+        delete_blob_files(delete_unreferenced_blobs(batch))
+        time.sleep(pause)
+
+    return report
+
+
+# --- Периодический запуск ---
+
+def _run_locked(app):
+    """Запускает сверку, если ее сейчас не выполняет другой воркер"""
+    with app.app_context():
+        lock_path = os.path.join(_upload_root(), ".media-gc.lock")
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, "w") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+            try:
+                report = reconcile_media(delete=True)
+            except MediaRootError as e:
+                app.logger.warning(str(e))
+                return
+            else:
+                app.logger.info(
+                    "Сверка медиа: файлов-сирот %d, записей без файлов %d (удаляются только "
+                    "flask reconcile-media --delete-rows), блобов без ссылок %d",
+                    len(report["orphan_paths"]),
+                    len(report["dangling_images"]) + len(report["dangling_videos"]),
+                    len(report["unreferenced_blobs"])
+                )
+            finally:
+                db.session.remove()
+
+
+def start_media_gc(app):
+    """Запускает фоновый поток, который периодически чистит папку загрузок"""
+    global _gc_thread
+    interval = app.config.get('MEDIA_GC_INTERVAL')
+    if not interval or _gc_thread is not None:
+        return
+
+    def loop():
+        # Первый проход - через interval, чтобы короткие процессы (CLI) его не запускали
+        while True:
+            time.sleep(interval.total_seconds())
+            try:
+                _run_locked(app)
+            except Exception as e:
+                app.logger.warning(f"Ошибка фоновой сверки медиа: {e}")
+
+    _gc_thread = threading.Thread(target=loop, name="media-gc", daemon=True)
+    _gc_thread.start()
@@ -0,0 +1,286 @@
+import os
+import re
+import hashlib
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, object_session
+from app.extensions import db
+from app.utils.media_gc import get_delete_executor
+
+BLOBS_DIR = "blobs"
+
+# Имя файла в хранилище: sha256 содержимого, для превью - с суффиксом варианта
+_BLOB_NAME_RE = re.compile(r"^(?P<sha>[0-9a-f]{64})(?:_[a-z]+)?\.[0-9a-z]+$")
+
+_HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def is_blob_name(filename):
+    """Проверяет, что файл лежит в общем хранилище, а не в папке детали"""
+    return bool(filename) and _BLOB_NAME_RE.match(os.path.basename(filename)) is not None
+
+
+def get_blob_dir(sha256):
+    """Папка блоба: blobs/<первые два символа хэша>/"""
+    path = os.path.join(
+        current_app.instance_path,
+        current_app.config['UPLOAD_FOLDER'],
+        BLOBS_DIR,
+        sha256[:2]
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_blob_path(filename):
+    """Полный путь к файлу хранилища (в т.ч. превью) по его имени"""
+    match = _BLOB_NAME_RE.match(os.path.basename(filename))
+    return os.path.join(get_blob_dir(match.group("sha")), os.path.basename(filename))
+
+
+def hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_BUFFER_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _get_or_create_blob(sha256, ext, size, place_file):
+    """Возвращает блоб по хэшу, сразу резервируя на него ссылку; файл кладется в хранилище,
+    только если такого содержимого еще нет.
+
+    Поиск и увеличение ref_count - один запрос: между ними параллельное удаление последней
+    ссылки не может удалить блоб. Резерв забирает запись фото или видео с этим blob_id,
+    неиспользованный снимается при коммите (блоб без ссылок потом удалит сверка).
+
+    Строка пишется до проверки файла: удаление файлов блоба (delete_blob_files) проверяет
+    строку под блокировкой записи и не удалит файл, на который здесь уже сослались.
+    Расширение берется из существующей строки - то же содержимое, загруженное как .jpeg
+    после .jpg, не создает второй файл.
+    """
+    from app.models import MediaBlob
+
+    # Тот же файл может параллельно сохранять другой запрос или фоновая задача
+    blob_id, ext = db.session.execute(
+        text(
+            "INSERT INTO media_blobs (sha256, ext, size, ref_count, created_at) "
+            "VALUES (:sha256, :ext, :size, 1, CURRENT_TIMESTAMP) "
+            "ON CONFLICT (sha256) DO UPDATE SET ref_count = media_blobs.ref_count + 1 "
+            "RETURNING id, ext"
+        ),
+        {"sha256": sha256, "ext": ext, "size": size}
+    ).one()
+    path = os.path.join(get_blob_dir(sha256), f"{sha256}.{ext}")
+    place_file(None if os.path.exists(path) else path)
+
+    reserved = db.session.info.setdefault("reserved_blob_refs", {})
+    reserved[blob_id] = reserved.get(blob_id, 0) + 1
+    return db.session.get(MediaBlob, blob_id, populate_existing=True)
+
+
+def store_upload(file_storage):
+    """Сохраняет загруженный файл в хранилище, возвращает MediaBlob.
+
+    Хэш считается при приеме файла (UploadSpool), одинаковое содержимое
+    хранится на диске один раз.
+    """
+    from app.utils.uploads import UploadSpool
+
+    ext = file_storage.filename.rsplit('.', 1)[1].lower()
+    spool = file_storage.stream
+
+    if isinstance(spool, UploadSpool):
+        sha256, size = spool.sha256.hexdigest(), spool.size
+
+        def place_file(path):
+            if path:
+                spool.commit(path)
+            else:
+                spool.close()
+    else:
+        data = file_storage.read()
+        sha256, size = hashlib.sha256(data).hexdigest(), len(data)
+
+        def place_file(path):
+            if path:
+                with open(path, "wb") as f:
+                    f.write(data)
+
+    return _get_or_create_blob(sha256, ext, size, place_file)
+
+
+def store_file(path, ext):
+    """Переносит готовый файл с диска в хранилище (файл по path удаляется), возвращает MediaBlob"""
+    sha256 = hash_file(path)
+    size = os.path.getsize(path)
+
+    def place_file(destination):
+        if destination:
+            os.replace(path, destination)
+        else:
+            os.remove(path)
+
+    return _get_or_create_blob(sha256, ext, size, place_file)
+
+
+def blob_file_paths(filename):
+    """Пути к файлу блоба и всем его превью"""
+    from app.utils.images import IMAGE_VARIANTS, variant_filename
+
+    path = get_blob_path(filename)
+    folder = os.path.dirname(path)
+    return [path] + [os.path.join(folder, variant_filename(filename, variant)) for variant in IMAGE_VARIANTS]
+
+
+def delete_blob_files(blobs):
+    """Удаляет файлы блобов (пары sha256, ext), строк которых нет в media_blobs.
+
+    Строка проверяется прямо перед удалением, на SQLite - под блокировкой записи (BEGIN IMMEDIATE):
+    загрузка того же содержимого сначала пишет строку, потом смотрит на файл, поэтому
+    она либо видна здесь, либо ждет удаления и кладет файл заново.
+    """
+    with db.engine.connect() as conn:
+        for sha256, ext in blobs:
+            try:
+                if conn.dialect.name == "sqlite":
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                exists = conn.execute(
+                    text("SELECT 1 FROM media_blobs WHERE sha256 = :sha256"), {"sha256": sha256}
+                ).first()
+                if not exists:
+                    for path in blob_file_paths(f"{sha256}.{ext}"):
+                        if os.path.exists(path):
+                            os.remove(path)
+            except (OperationalError, OSError) as e:
+                # Файл без строки потом найдет и удалит сверка
+                current_app.logger.warning(f"Не удалось удалить файлы блоба {sha256}: {e}")
+            finally:
+                conn.rollback()
+
+
+def _delete_blob_files_job(app, blobs):
+    with app.app_context():
+        delete_blob_files(blobs)
+
+
+def media_usage():
+    """Статистика хранилища: сколько байт заняли бы файлы без дедупликации и сколько занято"""
+    from app.models import MediaBlob
+
+    logical, stored, blobs, references = db.session.query(
+        db.func.coalesce(db.func.sum(MediaBlob.size * MediaBlob.ref_count), 0),
+        db.func.coalesce(db.func.sum(MediaBlob.size), 0),
+        db.func.count(MediaBlob.id),
+        db.func.coalesce(db.func.sum(MediaBlob.ref_count), 0),
+    ).one()
+
+    return {
+        "blobs": blobs,
+        "references": int(references),
+        "logical_bytes": int(logical),
+        "stored_bytes": int(stored),
+        "saved_bytes": int(logical) - int(stored),
+    }
+
+
+# --- Подсчет ссылок: поддерживается событиями PartImage/PartVideo ---
+
+def _change_ref_count(connection, target, blob_id, delta):
+    connection.execute(
+        text("UPDATE media_blobs SET ref_count = ref_count + :delta WHERE id = :id"),
+        {"delta": delta, "id": blob_id}
+    )
+    if delta > 0:
+        return
+
+    row = connection.execute(
+        text("SELECT sha256, ext, ref_count FROM media_blobs WHERE id = :id"),
+        {"id": blob_id}
+    ).first()
+    if row is not None and row.ref_count <= 0:
+        # Условие повторяется в DELETE: ссылку мог успеть зарезервировать другой запрос
+        deleted = connection.execute(
+            text("DELETE FROM media_blobs WHERE id = :id AND ref_count <= 0"), {"id": blob_id}
+        ).rowcount
+        if deleted:
+            # Файл удаляем только после успешного коммита
+            object_session(target).info.setdefault("blob_files_to_delete", []).append((row.sha256, row.ext))
+
+
+def _use_reservation(target, blob_id):
+    """Забирает ссылку, зарезервированную при сохранении файла этой сессией"""
+    reserved = object_session(target).info.get("reserved_blob_refs")
+    if not reserved or not reserved.get(blob_id):
+        return False
+    reserved[blob_id] -= 1
+    return True
+
+
+def _add_reference(connection, target, blob_id):
+    if not _use_reservation(target, blob_id):
+        _change_ref_count(connection, target, blob_id, 1)
+
+
+def _after_insert(mapper, connection, target):
+    if target.blob_id:
+        _add_reference(connection, target, target.blob_id)
+
+
+def _after_delete(mapper, connection, target):
+    if target.blob_id:
+        _change_ref_count(connection, target, target.blob_id, -1)
+
+
+def _after_update(mapper, connection, target):
+    history = db.inspect(target).attrs.blob_id.history
+    if not history.has_changes():
+        return
+    for old_id in history.deleted:
+        if old_id:
+            _change_ref_count(connection, target, old_id, -1)
+    for new_id in history.added:
+        if new_id:
+            _add_reference(connection, target, new_id)
+
+
+def _before_commit(session):
+    reserved = session.info.get("reserved_blob_refs")
+    if not reserved:
+        return
+    # Сначала записываем фото и видео транзакции - они забирают свои резервы
+    session.flush()
+    released = {blob_id: count for blob_id, count in reserved.items() if count}
+    session.info.pop("reserved_blob_refs", None)
+    for blob_id, count in released.items():
+        session.execute(
+            text("UPDATE media_blobs SET ref_count = ref_count - :count WHERE id = :id"),
+            {"count": count, "id": blob_id}
+        )
+
+
+def _after_commit(session):
+    released = session.info.pop("blob_files_to_delete", [])
+    if released:
+        # То же содержимое могут загрузить заново - строку проверяет фоновое удаление
+        app = current_app._get_current_object()
+        get_delete_executor().submit(_delete_blob_files_job, app, released)
+
+
+def _after_rollback(session):
+    session.info.pop("blob_files_to_delete", None)
+    session.info.pop("reserved_blob_refs", None)
+
+
+def register_ref_counting(*models):
+    """Подключает подсчет ссылок на блобы к моделям с колонкой blob_id"""
+    for model in models:
+        event.listen(model, "after_insert", _after_insert)
+        event.listen(model, "after_delete", _after_delete)
+        event.listen(model, "after_update", _after_update)
+
+    if not event.contains(Session, "after_commit", _after_commit):
+        event.listen(Session, "before_commit", _before_commit)
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
@@ -0,0 +1,317 @@
+import os
+import sys
+import hmac
+import json
+import time
+import glob
+import threading
+from bisect import bisect_left
+from flask import current_app, request
+from app.utils.db_stats import ENVIRON_KEY as QUERY_STATS_KEY, QueryStats, init_query_stats
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # секунды
+SIZE_BUCKETS = (512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)  # байты
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)  # SQL-запросов за запрос
+
+# Имя метрики -> (тип, описание) для # HELP и # TYPE
+METRICS = {
+    "updb_http_requests_total": ("counter", "HTTP-запросы по endpoint, методу и коду ответа"),
+    "updb_http_request_duration_seconds": ("histogram", "Время ответа, включая отдачу потокового тела"),
+    "updb_http_response_size_bytes": ("histogram", "Размер тела ответа"),
+    "updb_db_queries_per_request": ("histogram", "Число SQL-запросов за HTTP-запрос"),
+    "updb_db_time_seconds": ("histogram", "Суммарное время SQL-запросов за HTTP-запрос"),
+    "updb_slow_requests_total": ("counter", "Запросы дольше SLOW_REQUEST_MS"),
+    "updb_cache_hits_total": ("counter", "Попадания в кэши приложения"),
+    "updb_cache_misses_total": ("counter", "Промахи кэшей приложения"),
+}
+
+_ENVIRON_KEY = "updb.request_metrics"
+
+
+class Registry:
+    """Счетчики и гистограммы процесса. Снимок - словарь, снимки воркеров складываются"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # (имя, метки) -> значение
+        self.histograms = {}  # (имя, метки) -> [границы, счетчики корзин + +Inf, сумма]
+        self._flushed = 0.0
+        self._flush_timer = None
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_counter(self, name, labels, value):
+        """Для счетчиков, которые ведет сам компонент (статистика кэшей)"""
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [buckets, [0] * (len(buckets) + 1), 0.0]
+            histogram[1][bisect_left(buckets, value)] += 1
+            histogram[2] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [
+                    [name, dict(labels), list(buckets), list(counts), total]
+                    for (name, labels), (buckets, counts, total) in self.histograms.items()
+                ],
+            }
+
+
+_registry = Registry()
+
+
+def reset():
+    """Новый реестр - для воркера после fork: счетчики мастера ему не принадлежат"""
+    global _registry
+    _registry = Registry()
+
+
+def _update_cache_counters(registry):
+    from app.utils import page_cache, security
+
+    caches = {"pages": page_cache._cache, "principals": security._principal_cache}
+    # Аналитику не импортируем ради метрик: вместе с ней загрузился бы numpy
+    analytics = sys.modules.get("app.utils.analytics")
+    if analytics is not None:
+        caches["analytics"] = analytics._cache
+    for name, cache in caches.items():
+        if cache is not None:
+            stats = cache.stats()
+            registry.set_counter("updb_cache_hits_total", {"cache": name}, stats["hits"])
+            registry.set_counter("updb_cache_misses_total", {"cache": name}, stats["misses"])
+
+
+def _snapshot_path(directory, pid=None):
+    return os.path.join(directory, f"{pid or os.getpid()}.json")
+
+
+def _deferred_flush(app, registry):
+    registry._flush_timer = None
+    if registry is _registry:
+        flush(app, force=True)
+
+
+def flush(app, force=False):
+    """Записывает снимок воркера в METRICS_DIR (не чаще METRICS_FLUSH_INTERVAL), чтобы /metrics
+    любого воркера gunicorn отдавал сумму по всем"""
+    directory = app.config['METRICS_DIR']
+    registry = _registry
+    if not directory:
+        return
+    with registry._lock:
+        wait = app.config['METRICS_FLUSH_INTERVAL'] - (time.monotonic() - registry._flushed)
+        if not force and wait > 0:
+            # Последние запросы затихшего воркера запишутся по таймеру, а не с его следующим запросом
+            if registry._flush_timer is None:
+                registry._flush_timer = threading.Timer(wait, _deferred_flush, (app, registry))
+                registry._flush_timer.daemon = True
+                registry._flush_timer.start()
+            return
+        registry._flushed = time.monotonic()
+    _update_cache_counters(registry)
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def clear_snapshots(directory):
+    """Удаляет снимки прошлого запуска (при старте мастера gunicorn)"""
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        os.remove(path)
+
+
+def _merged_snapshot(app):
+    _update_cache_counters(_registry)
+    snapshots = [_registry.snapshot()]
+    directory = app.config['METRICS_DIR']
+    if directory:
+        own_path = _snapshot_path(directory)
+        # Снимки завершившихся воркеров остаются: счетчики не должны уменьшаться
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            if path == own_path:
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, counts, total in snapshot["histograms"]:
+            key = (name, tuple(sorted(labels.items())))
+            merged = histograms.setdefault(key, [buckets, [0] * len(counts), 0.0])
+            merged[1] = [a + b for a, b in zip(merged[1], counts)]
+            merged[2] += total
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_metrics(app):
+    """Метрики всех воркеров в текстовом формате Prometheus"""
+    counters, histograms = _merged_snapshot(app)
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        if kind == "counter":
+            series = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+        else:
+            series = sorted((labels, value) for (metric, labels), value in histograms.items() if metric == name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            buckets, counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(round(total, 6))}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    def __init__(self, started):
+        self.started = started
+        self.size = 0
+        self.profiler = None
+        self.profile_path = None
+
+
+def _profile_requested(config):
+    token = config['PROFILER_TOKEN']
+    header = request.headers.get('X-Profile')
+    return bool(token and header) and hmac.compare_digest(header.encode(), token.encode())
+
+
+def _start_request():
+    metrics = request.environ[_ENVIRON_KEY] = RequestMetrics(time.perf_counter())
+    config = current_app.config
+    if _profile_requested(config):
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # В этом потоке уже работает другой профилировщик (отладчик, coverage)
+            return
+        directory = config['PROFILE_DIR'] or os.path.join(current_app.instance_path, "profiles")
+        os.makedirs(directory, exist_ok=True)
+        endpoint = (request.endpoint or "unmatched").replace(".", "_")
+        metrics.profiler = profiler
+        metrics.profile_path = os.path.join(
+            directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{os.getpid()}-{id(metrics):x}.prof"
+        )
+
+
+def _counted(iterable, metrics):
+    # Размер потокового ответа известен только после отдачи; шаблоны отдают строки, а не байты
+    for chunk in iterable:
+        metrics.size += len(chunk.encode()) if isinstance(chunk, str) else len(chunk)
+        yield chunk
+
+
+def _finish_request(app, metrics, queries, endpoint, method, status, path):
+    """Вызывается при закрытии ответа - после отдачи всего тела, в т.ч. потокового"""
+    duration = time.perf_counter() - metrics.started
+    config = app.config
+
+    registry = _registry
+    labels = {"endpoint": endpoint}
+    registry.inc("updb_http_requests_total", {"endpoint": endpoint, "method": method, "status": str(status)})
+    registry.observe("updb_http_request_duration_seconds", labels, duration, LATENCY_BUCKETS)
+    registry.observe("updb_http_response_size_bytes", labels, metrics.size, SIZE_BUCKETS)
+    registry.observe("updb_db_queries_per_request", labels, queries.count, QUERY_BUCKETS)
+    registry.observe("updb_db_time_seconds", labels, queries.seconds, LATENCY_BUCKETS)
+
+    if metrics.profiler is not None:
+        metrics.profiler.disable()
+        metrics.profiler.dump_stats(metrics.profile_path)
+        app.logger.info("Профиль %s %s сохранен: %s", method, path, metrics.profile_path)
+
+    if duration * 1000 >= config['SLOW_REQUEST_MS']:
+        registry.inc("updb_slow_requests_total", labels)
+        top = "".join(
+            f"\n  {seconds * 1000:.1f} мс, {count}x: {' '.join(statement.split())[:300]}"
+            for statement, count, seconds in queries.top(config['SLOW_REQUEST_TOP_QUERIES'])
+        )
+        app.logger.warning(
+            "Медленный запрос %s %s -> %s: %.0f мс, SQL: %d за %.0f мс, ответ %d байт%s",
+            method, path, status, duration * 1000,
+            queries.count, queries.seconds * 1000, metrics.size, top
+        )
+
+    flush(app)
+
+
+def init_metrics(app):
+    """Замеры каждого запроса: время, размер ответа, SQL; медленные - в лог; X-Profile - cProfile"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    init_query_stats(app)
+    app.before_request(_start_request)
+
+    @app.after_request
+    def observe_response(response):
+        metrics = request.environ.get(_ENVIRON_KEY)
+        if metrics is None:
+            return response
+        endpoint = request.url_rule.endpoint if request.url_rule else "unmatched"
+        method, status = request.method, response.status_code
+
+        if response.is_streamed and not response.direct_passthrough:
+            response.response = _counted(response.response, metrics)
+        else:
+            metrics.size = response.content_length or 0
+        if metrics.profile_path:
+            response.headers['X-Profile-File'] = os.path.basename(metrics.profile_path)
+
+        # К закрытию ответа контекст запроса уже снят - все нужное берем сейчас
+        environ, path = request.environ, request.full_path.rstrip("?")
+
+        def finish():
+            queries = environ.get(QUERY_STATS_KEY) or QueryStats()
+            _finish_request(app, metrics, queries, endpoint, method, status, path)
+
+        response.call_on_close(finish)
+        return response
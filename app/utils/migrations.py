@@ -0,0 +1,140 @@
+from datetime import datetime
+from sqlalchemy import text, inspect
+from app.extensions import db
+
+SCHEMA_VERSION_TABLE = "schema_version"
+
+# Миграции по порядку: (версия, описание, функция). Каждая функция идемпотентна,
+# поэтому ее можно повторить на базе, где часть изменений уже есть.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return decorator
+
+
+@migration(1, "Базовая схема: таблицы, поисковые ключи и FTS, хранилище медиа")
+def _baseline():
+    from app.utils.search import init_search_schema
+    from app.utils.schema import ensure_columns, ensure_indexes
+
+    # Для новой базы create_all создает все сразу, для старой - только новые таблицы
+    db.create_all()
+    init_search_schema()
+    ensure_columns("part_images", {"variants": "VARCHAR(255)"})
+    for table in ("part_images", "part_videos"):
+        ensure_columns(table, {"blob_id": "INTEGER REFERENCES media_blobs (id)"})
+        ensure_indexes(table, ["blob_id"])
+
+
+@migration(2, "Индексы по внешним ключам и частым фильтрам")
+def _lookup_indexes():
+    from app.utils.schema import ensure_indexes
+
+    ensure_indexes("part_images", ["part_id"])
+    ensure_indexes("part_videos", ["part_id"])
+    ensure_indexes("sale_items", ["sale_id", "part_id"])
+    ensure_indexes("sales", ["created_at"])
+    ensure_indexes("parts", ["quantity"])
+    ensure_indexes("users", ["login"])
+
+
+@migration(3, "Закупочная цена в позициях продаж и таблицы итогов продаж")
+def _sales_rollups():
+    from app.utils.rollups import rebuild_rollups
+    from app.utils.schema import ensure_columns
+
+    ensure_columns("sale_items", {"unit_cost": "INTEGER"})
+    db.create_all()
+    rebuild_rollups()
+
+
+@migration(4, "Дата поступления детали")
+def _part_created_at():
+    from app.utils.schema import ensure_columns
+
+    if ensure_columns("parts", {"created_at": "TIMESTAMP"}):
+        # Для старых деталей - дата первого фото, иначе дата миграции
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE parts SET created_at = COALESCE("
+                "(SELECT MIN(created_at) FROM part_images WHERE part_images.part_id = parts.id), "
+                "CURRENT_TIMESTAMP) WHERE created_at IS NULL"
+            ))
+
+
+@migration(5, "Задачи импорта деталей из файлов")
+def _import_jobs():
+    db.create_all()
+
+
+@migration(6, "Версия строк деталей, фото и продаж для ETag в API")
+def _row_versions():
+    from app.utils.schema import ensure_columns
+
+    for table in ("parts", "part_images", "sales"):
+        ensure_columns(table, {"version": "INTEGER NOT NULL DEFAULT 1"})
+
+
+def _ensure_version_table():
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} ("
+            "version INTEGER PRIMARY KEY, "
+            "description VARCHAR(255), "
+            "applied_at TIMESTAMP)"
+        ))
+
+
+def current_version():
+    """Версия схемы базы; 0 - база еще не обновлялась этим механизмом"""
+    if not inspect(db.engine).has_table(SCHEMA_VERSION_TABLE):
+        return 0
+    with db.engine.connect() as conn:
+        return conn.execute(text(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}")).scalar() or 0
+
+
+def pending_migrations():
+    version = current_version()
+    return [item for item in MIGRATIONS if item[0] > version]
+
+
+def upgrade(target=None, log=print):
+    """Применяет недостающие миграции по порядку, возвращает список примененных версий.
+
+    Каждая миграция записывается в schema_version сразу после выполнения,
+    так что прерванное обновление продолжится с того же места.
+    """
+    _ensure_version_table()
+    applied = []
+    for version, description, fn in pending_migrations():
+        if target is not None and version > target:
+            break
+        log(f"Миграция {version}: {description}")
+        fn()
+        with db.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ),
+                {"version": version, "description": description, "applied_at": datetime.utcnow()}
+            )
+        applied.append(version)
+    return applied
+
+
+def check_schema(app):
+    """Предупреждает при старте, если база отстает от кода (сама схему не меняет)"""
+    with app.app_context():
+        pending = pending_migrations()
+    if pending:
+        app.logger.warning(
+            "Схема базы устарела (не применены миграции: %s). Выполните: flask migrate",
+            ", ".join(str(version) for version, _, _ in pending)
+        )
+    return pending
@@ -0,0 +1,335 @@
+import os
+import sys
+import hashlib
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from flask import current_app, g, has_request_context
+from markupsafe import Markup
+from sqlalchemy import select
+from app.extensions import db
+
+_cache = None
+
+_SQLITE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS page_cache ("
+    "key TEXT PRIMARY KEY, entity TEXT NOT NULL, value TEXT NOT NULL, "
+    "size INTEGER NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS page_cache_entity ON page_cache (entity)",
+    "CREATE INDEX IF NOT EXISTS page_cache_used ON page_cache (used)",
+)
+# Время последнего чтения в общем кэше обновляется не чаще раза в столько секунд
+_TOUCH_INTERVAL = 60
+
+
+class MemoryBackend:
+    """LRU в памяти процесса, ограниченный суммарным размером страниц"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._data = OrderedDict()  # key -> (entity, value, size, expires)
+        self._entities = {}  # entity -> ключи страниц и фрагментов этой строки
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[3] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, entity, key, value):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (entity, value, size, time.monotonic() + self.ttl)
+            self._entities.setdefault(entity, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def invalidate(self, entity):
+        with self._lock:
+            for key in list(self._entities.get(entity, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._entities.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entity, _, size, _ = self._data.pop(key)
+        self.size -= size
+        keys = self._entities[entity]
+        keys.discard(key)
+        if not keys:
+            del self._entities[entity]
+
+    def stats(self):
+        return {"entries": len(self._data), "bytes": self.size}
+
+
+class SQLiteBackend:
+    """Кэш в файле SQLite, общий для воркеров на одной машине; вытесняются давно не читанные страницы"""
+
+    name = "sqlite"
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        conn = self._connection()
+        for statement in _SQLITE_SCHEMA:
+            conn.execute(statement)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit: транзакции открываются явно только при записи с вытеснением
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Кэш можно потерять при сбое питания - fsync не нужен
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires, used FROM page_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, used = row
+        now = time.time()
+        if expires <= now:
+            conn.execute("DELETE FROM page_cache WHERE key = ?", (key,))
+            return None
+        if now - used > _TOUCH_INTERVAL:
+            conn.execute("UPDATE page_cache SET used = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, entity, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_cache (key, entity, value, size, expires, used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entity, value, size, now + self.ttl, now)
+            )
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _total_size(self, conn):
+        return conn.execute("SELECT TOTAL(size) FROM page_cache").fetchone()[0]
+
+    def _evict(self, conn, now):
+        if self._total_size(conn) <= self.max_bytes:
+            return
+        # Сначала устаревшие, затем давно не читанные
+        conn.execute("DELETE FROM page_cache WHERE expires <= ?", (now,))
+        excess = self._total_size(conn) - self.max_bytes
+        keys = []
+        for key, size in conn.execute("SELECT key, size FROM page_cache ORDER BY used"):
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+        conn.executemany("DELETE FROM page_cache WHERE key = ?", keys)
+
+    def invalidate(self, entity):
+        self._connection().execute("DELETE FROM page_cache WHERE entity = ?", (entity,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM page_cache")
+
+    def stats(self):
+        entries, size = self._connection().execute("SELECT COUNT(*), TOTAL(size) FROM page_cache").fetchone()
+        return {"entries": entries, "bytes": int(size), "path": self.path}
+
+
+class PageCache:
+    """Отрендеренные страницы и фрагменты; ключ содержит id и версию строки,
+    поэтому после изменения строки старая запись просто перестает читаться.
+    build - версия шаблонов и статики: после выкладки перестают читаться и страницы прежней сборки"""
+
+    def __init__(self, backend, build=""):
+        self.backend = backend
+        self.build = build
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, entity, version, name, render):
+        """Возвращает (html, hit)"""
+        key = f"{entity}:{version}:{self.build}:{name}"
+        try:
+            value = self.backend.get(key)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Кэш страниц недоступен: {e}")
+            value = None
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is not None:
+            return value, True
+
+        value = render()
+        try:
+            self.backend.set(entity, key, value)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Не удалось сохранить страницу в кэш: {e}")
+        return value, False
+
+    def invalidate(self, *entities):
+        for entity in entities:
+            self.backend.invalidate(entity)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "pid": os.getpid(),  # счетчики попаданий - свои у каждого воркера
+            "build": self.build,
+            "hits": self.hits,
+            "misses": self.misses,
+            "max_bytes": self.backend.max_bytes,
+            **self.backend.stats(),
+        }
+
+
+def build_id(app):
+    """Хэш шаблонов и манифеста собранной статики.
+
+    Файл кэша sqlite переживает перезапуск и выкладку, а страницы в нем ссылаются
+    на css/js с хэшем прежней сборки - с новым build такие записи не читаются.
+    """
+    from app.utils.assets import ASSETS_DIR, MANIFEST_NAME
+
+    paths = [os.path.join(app.static_folder, ASSETS_DIR, MANIFEST_NAME)]
+    for root, dirs, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files))
+
+    sha = hashlib.sha256()
+    for path in paths:
+        if os.path.isfile(path):
+            sha.update(os.path.relpath(path, app.root_path).encode("utf-8"))
+            with open(path, "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()[:12]
+
+
+def get_page_cache():
+    """Кэш страниц по настройке PAGE_CACHE_BACKEND; None - кэш выключен"""
+    global _cache
+    if _cache is None:
+        backend = current_app.config.get('PAGE_CACHE_BACKEND')
+        if not backend or backend == "off":
+            return None
+        max_bytes = current_app.config['PAGE_CACHE_MAX_BYTES']
+        ttl = current_app.config['PAGE_CACHE_TTL'].total_seconds()
+        if backend == "memory":
+            _cache = PageCache(MemoryBackend(max_bytes, ttl))
+        elif backend == "sqlite":
+            path = current_app.config.get('PAGE_CACHE_PATH') or os.path.join(current_app.instance_path, "page_cache.db")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _cache = PageCache(SQLiteBackend(path, max_bytes, ttl), build_id(current_app))
+        else:
+            raise ValueError(f"Неизвестный PAGE_CACHE_BACKEND: {backend}")
+    return _cache
+
+
+def entity_key(model, ident):
+    return f"{model.__tablename__}:{ident}"
+
+
+def _version_key(version, created_at):
+    # created_at отличает новую строку, получившую id удаленной (SQLite переиспользует rowid)
+    return f"{version}-{created_at.isoformat() if created_at else ''}"
+
+
+def cached_page(model, ident, render):
+    """HTML страницы строки model с id=ident из кэша или render(); None - строки нет.
+
+    Из базы при попадании читается только версия строки, сама строка,
+    ее связи и шаблон - лишь при промахе.
+    """
+    row = db.session.execute(select(model.version, model.created_at).where(model.id == ident)).first()
+    if row is None:
+        return None
+    cache = get_page_cache()
+    if cache is None:
+        return render()
+    html, hit = cache.get_or_render(entity_key(model, ident), _version_key(*row), "page", render)
+    if has_request_context():
+        g.page_cache = "hit" if hit else "miss"
+    return html
+
+
+def cached_fragment(name, obj, caller):
+    """Фрагмент шаблона для строки obj: {% call cached_fragment("row", part) %}...{% endcall %}"""
+    cache = get_page_cache()
+    if cache is None:
+        return caller()
+    html, _ = cache.get_or_render(
+        entity_key(type(obj), obj.id), _version_key(obj.version, obj.created_at), name, lambda: str(caller())
+    )
+    return Markup(html)
+
+
+def invalidate(model, *idents):
+    """Сбрасывает страницы и фрагменты строк; вызывается после коммита изменений"""
+    cache = get_page_cache()
+    if cache is not None:
+        cache.invalidate(*(entity_key(model, ident) for ident in idents))
+
+
+def invalidate_parts(part_ids, deleted=()):
+    """Сбрасывает страницы деталей; для удаленных - еще и страницы продаж с ними ("товар удален")"""
+    from app.models import Part, Sale, SaleItem
+
+    if get_page_cache() is None:
+        return
+    invalidate(Part, *part_ids)
+    if deleted:
+        sale_ids = db.session.execute(
+            select(SaleItem.sale_id).where(SaleItem.part_id.in_(list(deleted))).distinct()
+        ).scalars().all()
+        invalidate(Sale, *sale_ids)
+
+
+def init_page_cache(app):
+    """Фрагменты в шаблонах и заголовок X-Page-Cache: hit|miss у кэшируемых страниц"""
+    app.jinja_env.globals["cached_fragment"] = cached_fragment
+
+    @app.after_request
+    def add_page_cache_header(response):
+        status = g.get('page_cache')
+        if status:
+            response.headers['X-Page-Cache'] = status
+        return response
@@ -0,0 +1,204 @@
+from flask import current_app, request, url_for, stream_template
+from markupsafe import Markup
+from sqlalchemy import tuple_, and_, or_
+from app.extensions import db
+
+# Маркер в шаблоне ({{ stream_flush }}): все, что накоплено до него, сразу уходит клиенту
+FLUSH_MARKER = Markup("<!-- flush -->")
+
+# Значение колонки сортировки NULL в курсоре (цена из импорта может отсутствовать)
+NULL_CURSOR = "null"
+
+# Допустимые сортировки списка деталей: параметр sort -> колонка Part
+SORT_FIELDS = {
+    "id": "id",
+    "price": "price_out",
+    "quantity": "quantity",
+}
+
+
+def get_page_args(default_sort="id"):
+    """Читает из запроса параметры страницы: sort, order, per_page, after"""
+    sort = request.args.get("sort", default_sort)
+    if sort not in SORT_FIELDS and sort != default_sort:
+        sort = default_sort
+
+    order = request.args.get("order", "asc")
+    if order not in ("asc", "desc"):
+        order = "asc"
+
+    per_page = request.args.get("per_page", type=int) or current_app.config["PARTS_PER_PAGE"]
+    per_page = max(1, min(per_page, current_app.config["MAX_PARTS_PER_PAGE"]))
+
+    return {
+        "sort": sort,
+        "order": order,
+        "per_page": per_page,
+        "after": request.args.get("after") or None,
+    }
+
+
+def _page_url(cursor=None):
+    args = request.args.to_dict()
+    args.pop("after", None)
+    if cursor:
+        args["after"] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+class KeysetPage:
+    """Страница выборки с seek-пагинацией по (колонка сортировки, id).
+
+    Строки читаются лениво при итерации (удобно для потокового рендеринга),
+    после итерации доступны has_next и next_url. Строки с NULL в колонке
+    сортировки идут в конце при любом направлении, курсор для них - null_<id>.
+    """
+
+    def __init__(self, query, model, sort="id", order="asc", per_page=50, after=None):
+        self.sort = sort
+        self.order = order
+        self.per_page = per_page
+        self.has_next = False
+        self.next_cursor = None
+
+        id_column = model.id
+        sort_column = getattr(model, SORT_FIELDS[sort])
+        descending = order == "desc"
+
+        cursor = self._parse_cursor(after, single=sort == "id")
+        if cursor is not None:
+            if sort == "id":
+                query = query.filter(id_column < cursor[0] if descending else id_column > cursor[0])
+            elif cursor[0] is None:
+                # Уже внутри хвоста с NULL - дальше только по id
+                query = query.filter(
+                    sort_column.is_(None), id_column < cursor[1] if descending else id_column > cursor[1]
+                )
+            else:
+                key = tuple_(sort_column, id_column)
+                value = tuple_(*cursor)
+                query = query.filter(or_(
+                    and_(sort_column.isnot(None), key < value if descending else key > value),
+                    sort_column.is_(None)
+                ))
+
+        if sort == "id":
+            ordering = [id_column.desc() if descending else id_column.asc()]
+        elif descending:
+            ordering = [sort_column.desc().nulls_last(), id_column.desc()]
+        else:
+            ordering = [sort_column.asc().nulls_last(), id_column.asc()]
+
+        # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+        self._query = query.order_by(*ordering).limit(per_page + 1)
+        self._sort_attr = SORT_FIELDS[sort]
+
+    @staticmethod
+    def _parse_cursor(after, single):
+        if not after:
+            return None
+        parts = after.split("_")
+        if len(parts) != (1 if single else 2):
+            return None
+        try:
+            if not single and parts[0] == NULL_CURSOR:
+                return [None, int(parts[1])]
+            return [int(value) for value in parts]
+        except ValueError:
+            return None
+
+    def _make_cursor(self, item):
+        if self.sort == "id":
+            return str(item.id)
+        value = getattr(item, self._sort_attr)
+        return f"{NULL_CURSOR if value is None else value}_{item.id}"
+
+    def __iter__(self):
+        # Запрос собран в представлении, а потоковый ответ читает его уже после закрытия контекста
+        # представления: та сессия удалена из реестра, и взятое ею соединение не вернулось бы в пул
+        # до сборки мусора. Читаем через сессию текущего контекста, сохраняя флаг @replica_reads
+        session = db.session()
+        if self._query.session is not session and self._query.session.info.get("use_replica"):
+            session.info["use_replica"] = True
+        last = None
+        for index, item in enumerate(self._query.with_session(session)):
+            if index == self.per_page:
+                self.has_next = True
+                self.next_cursor = self._make_cursor(last)
+                break
+            last = item
+            yield item
+
+    @property
+    def first_url(self):
+        return _page_url() if request.args.get("after") else None
+
+    @property
+    def next_url(self):
+        return _page_url(self.next_cursor) if self.has_next else None
+
+
+class RankedPage:
+    """Страница заранее отсортированного по релевантности списка id (результаты поиска)"""
+
+    def __init__(self, part_ids, load_parts, per_page=50, after=None):
+        self.sort = "relevance"
+        self.order = "asc"
+        self.per_page = per_page
+        self.has_next = False
+        self.next_cursor = None
+
+        start = 0
+        if after and after.isdigit() and int(after) in part_ids:
+            start = part_ids.index(int(after)) + 1
+
+        self._page_ids = part_ids[start:start + per_page]
+        self._load_parts = load_parts
+        if start + per_page < len(part_ids):
+            self.has_next = True
+            self.next_cursor = str(self._page_ids[-1])
+
+    def __iter__(self):
+        if not self._page_ids:
+            return
+        parts_by_id = {part.id: part for part in self._load_parts(self._page_ids)}
+        for part_id in self._page_ids:
+            if part_id in parts_by_id:
+                yield parts_by_id[part_id]
+
+    @property
+    def first_url(self):
+        return _page_url() if request.args.get("after") else None
+
+    @property
+    def next_url(self):
+        return _page_url(self.next_cursor) if self.has_next else None
+
+
+def stream_page(template_name, chunk_size=None, **context):
+    """Рендерит шаблон потоком, склеивая мелкие куски Jinja в блоки по chunk_size символов.
+
+    Шаблон может вывести {{ stream_flush }} перед тяжелой частью (циклом по строкам),
+    чтобы шапка страницы ушла в браузер до выполнения запроса.
+    """
+    if chunk_size is None:
+        chunk_size = current_app.config["STREAM_CHUNK_SIZE"]
+
+    context.setdefault("stream_flush", FLUSH_MARKER)
+    # stream_template сам удерживает контекст запроса на время генерации
+    pieces = stream_template(template_name, **context)
+
+    def generate():
+        buffer = []
+        size = 0
+        for piece in pieces:
+            buffer.append(piece)
+            size += len(piece)
+            if size >= chunk_size or piece == FLUSH_MARKER:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield "".join(buffer)
+
+    return current_app.response_class(generate(), mimetype="text/html")
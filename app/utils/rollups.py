@@ -0,0 +1,133 @@
+from datetime import date, timedelta
+from sqlalchemy import func
+from app.extensions import db
+
+ROLLUP_FIELDS = ("sales_count", "gross_amount", "net_amount", "discount_amount", "cost_amount", "margin_amount")
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def _rollup_values(gross, net, cost, count=1):
+    return {
+        "sales_count": count,
+        "gross_amount": gross,
+        "net_amount": net,
+        "discount_amount": gross - net,
+        "cost_amount": cost,
+        "margin_amount": net - cost,
+    }
+
+
+def _add_to_rollup(model, key_column, key, values):
+    """INSERT ... ON CONFLICT DO UPDATE: атомарно прибавляет значения к строке периода"""
+    # Импорт диалекта по имени: модуль PostgreSQL не загружается в приложении на SQLite
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model).values({key_column: key, **values})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key_column],
+        set_={name: getattr(model, name) + stmt.excluded[name] for name in values}
+    )
+    db.session.execute(stmt)
+
+
+def record_sale(sale, cost_amount):
+    """Добавляет продажу в дневные и месячные итоги (в текущей транзакции, без коммита)"""
+    from app.models import SalesDaily, SalesMonthly
+
+    values = _rollup_values(sale.total_amount, sale.final_amount, cost_amount)
+    day = sale.created_at.date()
+    _add_to_rollup(SalesDaily, "day", day, values)
+    _add_to_rollup(SalesMonthly, "month", month_start(day), values)
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def rebuild_rollups():
+    """Пересчитывает итоги по всей истории продаж, возвращает число дней с продажами.
+
+    Для старых позиций без unit_cost берется текущая закупочная цена детали,
+    а если деталь уже удалена - 0 (маржа за такие дни будет завышена).
+    """
+    from app.models import Part, Sale, SaleItem, SalesDaily, SalesMonthly
+
+    day = func.date(Sale.created_at)
+    totals = db.session.query(
+        day,
+        func.count(Sale.id),
+        func.coalesce(func.sum(Sale.total_amount), 0),
+        func.coalesce(func.sum(Sale.final_amount), 0),
+    ).group_by(day).all()
+
+    item_cost = SaleItem.quantity * func.coalesce(SaleItem.unit_cost, Part.price_in, 0)
+    costs = dict(
+        (_as_date(row_day), cost) for row_day, cost in db.session.query(day, func.sum(item_cost))
+        .select_from(SaleItem)
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .outerjoin(Part, Part.id == SaleItem.part_id)
+        .group_by(day)
+    )
+
+    daily = {}
+    monthly = {}
+    for row_day, count, gross, net in totals:
+        row_day = _as_date(row_day)
+        values = _rollup_values(int(gross), int(net), int(costs.get(row_day) or 0), count)
+        daily[row_day] = values
+        month = monthly.setdefault(month_start(row_day), dict.fromkeys(ROLLUP_FIELDS, 0))
+        for name in ROLLUP_FIELDS:
+            month[name] += values[name]
+
+    try:
+        SalesDaily.query.delete()
+        SalesMonthly.query.delete()
+        if daily:
+            db.session.execute(db.insert(SalesDaily), [{"day": key, **values} for key, values in daily.items()])
+            db.session.execute(db.insert(SalesMonthly), [{"month": key, **values} for key, values in monthly.items()])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(daily)
+
+
+def _rollup_to_dict(row, key):
+    data = {"period": getattr(row, key).isoformat()}
+    data.update({name: getattr(row, name) for name in ROLLUP_FIELDS})
+    return data
+
+
+def sales_report(period="day", start=None, end=None):
+    """Итоги за интервал [start, end] только из таблиц итогов: по периодам и общий итог"""
+    from app.models import SalesDaily, SalesMonthly
+
+    if period == "month":
+        model, key = SalesMonthly, "month"
+        end = month_start(end or date.today())
+        start = month_start(start) if start else date(end.year - 1, end.month, 1)
+    else:
+        model, key = SalesDaily, "day"
+        end = end or date.today()
+        start = start or end - timedelta(days=29)
+
+    column = getattr(model, key)
+    rows = model.query.filter(column >= start, column <= end).order_by(column.desc()).all()
+
+    totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+    for row in rows:
+        for name in ROLLUP_FIELDS:
+            totals[name] += getattr(row, name)
+
+    return {
+        "period": period,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "rows": [_rollup_to_dict(row, key) for row in rows],
+        "totals": totals,
+    }
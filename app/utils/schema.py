@@ -0,0 +1,35 @@
+from sqlalchemy import text, inspect
+from app.extensions import db
+
+
+def ensure_columns(table, columns):
+    """Добавляет в существующую таблицу недостающие колонки, возвращает список добавленных.
+
+    create_all() не меняет уже созданные таблицы, поэтому новые колонки моделей
+    для старых баз добавляются здесь через ALTER TABLE.
+    """
+    existing = {column["name"] for column in inspect(db.engine).get_columns(table)}
+    missing = [name for name in columns if name not in existing]
+
+    with db.engine.begin() as conn:
+        for name in missing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}"))
+    return missing
+
+
+def ensure_indexes(table, columns):
+    """Создает индексы ix_<table>_<column> по колонкам, если их еще нет.
+
+    В PostgreSQL индекс строится CONCURRENTLY - без блокировки записи в таблицу.
+    """
+    if db.engine.dialect.name == "postgresql":
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for column in columns:
+                conn.execute(text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"
+                ))
+        return
+
+    with db.engine.begin() as conn:
+        for column in columns:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
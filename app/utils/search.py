@@ -0,0 +1,324 @@
+import re
+import unicodedata
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import text, or_
+from app.extensions import db
+from app.utils.schema import ensure_columns, ensure_indexes
+
+FTS_TABLE = "parts_fts"
+
+# Наибольший id, который SQLite хранит в INTEGER; число больше не передать параметром запроса
+MAX_PART_ID = 2 ** 63 - 1
+
+# Веса колонок для bm25: name, car, part_number, description
+FTS_WEIGHTS = (10.0, 5.0, 8.0, 1.0)
+
+_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, car, part_number, description,
+        content='parts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS parts_fts_ai AFTER INSERT ON parts BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, car, part_number, description)
+        VALUES (new.id, new.name, new.car, new.part_number, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS parts_fts_ad AFTER DELETE ON parts BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, car, part_number, description)
+        VALUES ('delete', old.id, old.name, old.car, old.part_number, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS parts_fts_au AFTER UPDATE OF name, car, part_number, description ON parts BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, car, part_number, description)
+        VALUES ('delete', old.id, old.name, old.car, old.part_number, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, car, part_number, description)
+        VALUES (new.id, new.name, new.car, new.part_number, new.description);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_SPACES_RE = re.compile(r"\s+", re.UNICODE)
+_SEPARATORS_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+# Теневые колонки parts с нормализованными ключами: колонка -> исходное поле
+SEARCH_KEY_COLUMNS = {
+    "name_key": "name",
+    "car_key": "car",
+    "description_key": "description",
+    "part_number_key": "part_number",
+}
+
+# Верхняя граница для диапазонного (префиксного) поиска по B-tree индексу
+_PREFIX_UPPER_BOUND = "\U0010ffff"
+
+
+def normalize_text(value):
+    """Приводит текст к ключу поиска: Unicode casefold, ё -> е, одиночные пробелы"""
+    if value is None:
+        return None
+    value = unicodedata.normalize("NFKC", value).casefold().replace("ё", "е")
+    return _SPACES_RE.sub(" ", value).strip()
+
+
+def normalize_part_number(value):
+    """Приводит каталожный номер к ключу поиска: без регистра и разделителей (8E0-941-003 -> 8e0941003)"""
+    if value is None:
+        return None
+    value = unicodedata.normalize("NFKC", value).casefold()
+    return _SEPARATORS_RE.sub("", value)
+
+
+def ensure_search_keys():
+    """Добавляет в существующую таблицу parts колонки и индексы нормализованных ключей"""
+    missing = ensure_columns("parts", {column: "VARCHAR(255)" for column in SEARCH_KEY_COLUMNS})
+    ensure_indexes("parts", SEARCH_KEY_COLUMNS)
+
+    if missing:
+        backfill_search_keys()
+
+
+def backfill_search_keys(only_missing=True, batch_size=1000):
+    """Пересчитывает нормализованные ключи пачками, возвращает число обновленных строк"""
+    where = ""
+    if only_missing:
+        where = "AND (" + " OR ".join(
+            f"({key} IS NULL AND {source} IS NOT NULL)" for key, source in SEARCH_KEY_COLUMNS.items()
+        ) + ")"
+
+    select_sql = text(
+        f"SELECT id, name, car, description, part_number FROM parts "
+        f"WHERE id > :last_id {where} ORDER BY id LIMIT :batch_size"
+    )
+    update_sql = text(
+        "UPDATE parts SET name_key = :name_key, car_key = :car_key, "
+        "description_key = :description_key, part_number_key = :part_number_key "
+        "WHERE id = :id"
+    )
+
+    updated = 0
+    last_id = 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(select_sql, {"last_id": last_id, "batch_size": batch_size}).all()
+            if not rows:
+                break
+            conn.execute(update_sql, [{
+                "id": row.id,
+                "name_key": normalize_text(row.name),
+                "car_key": normalize_text(row.car),
+                "description_key": normalize_text(row.description),
+                "part_number_key": normalize_part_number(row.part_number),
+            } for row in rows])
+        updated += len(rows)
+        last_id = rows[-1].id
+    return updated
+
+
+def init_search_schema():
+    """Готовит базу к поиску: ключи нормализации и полнотекстовый индекс"""
+    ensure_search_keys()
+    create_search_index()
+
+
+def fts_available():
+    """Проверяет, что база - SQLite и индекс parts_fts можно использовать"""
+    return db.engine.dialect.name == "sqlite"
+
+
+def create_search_index():
+    """Создает FTS5-таблицу и триггеры синхронизации с parts (если их еще нет)"""
+    if not fts_available():
+        return False
+
+    with db.engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        for statement in _FTS_DDL:
+            conn.execute(text(statement))
+        # Для существующей базы сразу заполняем только что созданный индекс
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def rebuild_search_index():
+    """Полностью перестраивает поисковый индекс по текущему содержимому parts"""
+    if not create_search_index():
+        return False
+
+    with db.engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    return True
+
+
+@contextmanager
+def bulk_insert_index(session):
+    """Строки, вставленные в parts внутри блока, попадают в индекс одним INSERT ... SELECT.
+
+    Для пачек это в разы быстрее триггера на каждую строку. Триггер parts_fts_ai
+    удаляется и создается заново в той же транзакции: DDL в SQLite транзакционный,
+    а писать в базу до коммита другие соединения не могут, поэтому строк без
+    индекса не остается, а при откате триггер возвращается вместе с данными.
+    """
+    exists = fts_available() and session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'parts_fts_ai'")
+    ).first()
+    if not exists:
+        yield
+        return
+
+    connection = session.connection()
+    if not connection.connection.dbapi_connection.in_transaction:
+        # Модуль sqlite3 сам открывает транзакцию только перед INSERT/UPDATE/DELETE, а не перед DDL
+        connection.exec_driver_sql("BEGIN")
+    connection.exec_driver_sql("DROP TRIGGER parts_fts_ai")
+    last_id = connection.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM parts").scalar()
+
+    yield
+
+    connection.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, car, part_number, description) "
+            "SELECT id, name, car, part_number, description FROM parts WHERE id > :last_id"
+        ),
+        {"last_id": last_id}
+    )
+    connection.exec_driver_sql(_FTS_DDL[1])
+
+
+def build_match_query(search_request):
+    """Превращает строку пользователя в безопасный MATCH-запрос с префиксным поиском"""
+    tokens = _TOKEN_RE.findall(search_request)
+    # Каждое слово берем в кавычки, чтобы спецсимволы FTS5 не ломали запрос
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _prefix_filter(column, key):
+    # Диапазон вместо LIKE 'key%', чтобы запрос шел по B-tree индексу
+    return db.and_(column >= key, column < key + _PREFIX_UPPER_BOUND)
+
+
+def key_lookup_ids(search_request, limit, in_stock_only=False):
+    """Ищет точные и префиксные совпадения по нормализованным ключам"""
+    from app.models import Part
+
+    part_number_key = normalize_part_number(search_request)
+    text_key = normalize_text(search_request)
+
+    lookups = []
+    if part_number_key:
+        lookups.append(Part.part_number_key == part_number_key)
+        lookups.append(_prefix_filter(Part.part_number_key, part_number_key))
+    if text_key:
+        lookups.append(_prefix_filter(Part.name_key, text_key))
+        lookups.append(_prefix_filter(Part.car_key, text_key))
+        lookups.append(_prefix_filter(Part.description_key, text_key))
+
+    part_ids = []
+    for condition in lookups:
+        if len(part_ids) >= limit:
+            break
+        query = db.session.query(Part.id).filter(condition)
+        if in_stock_only:
+            query = query.filter(Part.quantity > 0)
+        for (part_id,) in query.limit(limit):
+            if part_id not in part_ids:
+                part_ids.append(part_id)
+    return part_ids[:limit]
+
+
+def search_part_ids(search_request, limit, in_stock_only=False):
+    """Возвращает id деталей, отсортированные по релевантности"""
+    from app.models import Part
+
+    if fts_available():
+        match_query = build_match_query(search_request)
+        if not match_query:
+            return []
+
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        sql = (
+            f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} "
+            f"JOIN parts ON parts.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :query "
+        )
+        if in_stock_only:
+            sql += "AND parts.quantity > 0 "
+        sql += f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT :limit"
+
+        rows = db.session.execute(text(sql), {"query": match_query, "limit": limit})
+        return [row[0] for row in rows]
+
+    # Запасной вариант для баз без FTS5: подстрока в нормализованных ключах
+    text_key = normalize_text(search_request)
+    conditions = [
+        Part.name_key.contains(text_key, autoescape=True),
+        Part.car_key.contains(text_key, autoescape=True),
+        Part.description_key.contains(text_key, autoescape=True),
+    ]
+    part_number_key = normalize_part_number(search_request)
+    if part_number_key:
+        conditions.append(Part.part_number_key.contains(part_number_key, autoescape=True))
+    query = db.session.query(Part.id).filter(or_(*conditions))
+    if in_stock_only:
+        query = query.filter(Part.quantity > 0)
+    return [row[0] for row in query.limit(limit)]
+
+
+def find_part_ids(search_request, limit=None, in_stock_only=False):
+    """Ищет детали и возвращает их id в порядке релевантности"""
+    if limit is None:
+        limit = current_app.config['SEARCH_RESULTS_LIMIT']
+
+    part_ids = []
+
+    # Точное совпадение по внутреннему артикулу идет первым
+    if search_request.isascii() and search_request.isdigit() and int(search_request) <= MAX_PART_ID:
+        part_ids.append(int(search_request))
+
+    # Затем точные/префиксные совпадения по индексам, затем полнотекстовый поиск
+    for part_id in key_lookup_ids(search_request, limit, in_stock_only):
+        if part_id not in part_ids:
+            part_ids.append(part_id)
+
+    if len(part_ids) < limit:
+        for part_id in search_part_ids(search_request, limit, in_stock_only):
+            if part_id not in part_ids:
+                part_ids.append(part_id)
+
+    return part_ids[:limit]
+
+
+def load_parts(part_ids, in_stock_only=False, with_images=True):
+    """Загружает детали по списку id, сохраняя порядок списка"""
+    from app.models import Part
+
+    if not part_ids:
+        return []
+
+    query = Part.query.filter(Part.id.in_(part_ids))
+    if with_images:
+        query = query.options(db.selectinload(Part.images))
+    if in_stock_only:
+        query = query.filter(Part.quantity > 0)
+    parts_by_id = {part.id: part for part in query}
+
+    return [parts_by_id[pid] for pid in part_ids if pid in parts_by_id]
+
+
+def find_parts(search_request, limit=None, in_stock_only=False):
+    """Ищет детали и возвращает объекты Part в порядке релевантности"""
+    part_ids = find_part_ids(search_request, limit, in_stock_only)
+    return load_parts(part_ids, in_stock_only, with_images=False)
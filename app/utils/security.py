@@ -1,44 +1,142 @@
-import argon2
-import jwt
 import datetime
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 from functools import wraps
-from flask import request, session, jsonify, redirect
+from flask import request, session, jsonify, redirect, g
+from app.utils.cache import TTLCache
+
+ADMIN_ROLE = 'admin'
+
+# Данные пользователя, нужные для проверки доступа
+Principal = namedtuple('Principal', 'id login role')
+
+_principal_cache = None
+
+
+class PasswordBusyError(Exception):
+    """Очередь проверки паролей заполнена - запрос нужно отклонить сразу"""
 
 
 class PasswordHasher:
-    def __init__(self):
-        self.hasher = argon2.PasswordHasher(
-            time_cost=3,
-            memory_cost=65536,
-            parallelism=1,
+    def __init__(self, time_cost=3, memory_cost=65536, parallelism=1):
+        # argon2 импортируется при первой проверке пароля, а не при старте воркера
+        self._params = (time_cost, memory_cost, parallelism)
+        self._hasher = None
+        self._executor = None
+        self._slots = None
+        self._dummy_hash = None
+
+    @property
+    def hasher(self):
+        if self._hasher is None:
+            self._hasher = self._make_hasher(*self._params)
+        return self._hasher
+
+    @staticmethod
+    def _make_hasher(time_cost, memory_cost, parallelism):
+        import argon2
+
+        return argon2.PasswordHasher(
+            time_cost=time_cost,
+            memory_cost=memory_cost,
+            parallelism=parallelism,
             hash_len=32,
             salt_len=16
         )
 
+    def init_app(self, app):
+        """Параметры Argon2 и размер пула проверки паролей - из конфигурации"""
+        self._params = (
+            app.config['ARGON2_TIME_COST'],
+            app.config['ARGON2_MEMORY_COST'],
+            app.config['ARGON2_PARALLELISM']
+        )
+        self._hasher = None
+        self._dummy_hash = None
+
+        workers = app.config['PASSWORD_WORKERS']
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        # Каждая проверка занимает ARGON2_MEMORY_COST КиБ, поэтому одновременно их не больше workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_QUEUE_LIMIT'])
+
     def hash_password(self, password: str) -> str:
         return self.hasher.hash(password)
 
     def verify_password(self, hashed_password: str, password: str) -> bool:
+        from argon2 import exceptions
+
         try:
             return self.hasher.verify(hashed_password, password)
-        except (argon2.exceptions.VerifyMismatchError,
-                argon2.exceptions.VerificationError,
-                argon2.exceptions.InvalidHashError):
+        except (exceptions.VerifyMismatchError,
+                exceptions.VerificationError,
+                exceptions.InvalidHashError):
             return False
 
+    def needs_rehash(self, hashed_password: str) -> bool:
+        from argon2 import exceptions
+
+        try:
+            return self.hasher.check_needs_rehash(hashed_password)
+        except exceptions.InvalidHashError:
+            return True
+
+    def _verify_and_update(self, hashed_password, password):
+        if hashed_password is None:
+            # Неизвестный логин проверяется так же долго, как известный
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash_password("dummy password")
+            self.verify_password(self._dummy_hash, password)
+            return False, None
+
+        if not self.verify_password(hashed_password, password):
+            return False, None
+        if self.needs_rehash(hashed_password):
+            return True, self.hash_password(password)
+        return True, None
+
+    def verify_and_update(self, hashed_password, password):
+        """Проверяет пароль в ограниченном пуле, возвращает (верен ли, новый хэш или None).
+
+        Новый хэш возвращается, если параметры Argon2 изменились с момента
+        создания старого. Если пул и очередь заняты - PasswordBusyError.
+        """
+        if self._executor is None:
+            return self._verify_and_update(hashed_password, password)
+
+        if not self._slots.acquire(blocking=False):
+            raise PasswordBusyError()
+        try:
+            return self._executor.submit(self._verify_and_update, hashed_password, password).result()
+        finally:
+            self._slots.release()
+
+
+def user_role(user):
+    return ADMIN_ROLE if user.login == 'admin' else 'user'
+
+
+def create_access_token(user_id, role=None):
+    import jwt
 
-def create_access_token(user_id):
     expires = datetime.datetime.utcnow() + current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-    token = jwt.encode({
+    payload = {
         'user_id': user_id,
         'exp': expires,
         'type': 'access'
-    }, current_app.config['SECRET_KEY'], algorithm='HS256')
+    }
+    if role:
+        payload['role'] = role
+    token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
     return token
 
 
 def create_refresh_token(user_id):
+    import jwt
+
     expires = datetime.datetime.utcnow() + current_app.config["JWT_REFRESH_TOKEN_EXPIRES"]
     token = jwt.encode({
         'user_id': user_id,
@@ -48,11 +146,51 @@ def create_refresh_token(user_id):
     return token
 
 
+def get_principal_cache():
+    global _principal_cache
+    if _principal_cache is None:
+        _principal_cache = TTLCache(
+            maxsize=current_app.config['PRINCIPAL_CACHE_SIZE'],
+            ttl=current_app.config['PRINCIPAL_CACHE_TTL'].total_seconds()
+        )
+    return _principal_cache
+
+
+def load_principal(user_id):
+    """Пользователь для проверки доступа: из кэша, при промахе - из базы"""
+    from app.extensions import db
+    from app.models import User  # Локальный импорт чтобы избежать циклической зависимости
+
+    cache = get_principal_cache()
+    principal = cache.get(user_id)
+    if principal is None:
+        user = db.session.get(User, user_id)
+        # Несуществующего пользователя тоже кэшируем, чтобы не ходить в базу на каждый запрос
+        principal = Principal(user.id, user.login, user_role(user)) if user else False
+        cache.set(user_id, principal)
+    return principal or None
+
+
+def invalidate_principal(user_id):
+    """Сбрасывает кэш пользователя после его изменения"""
+    if _principal_cache is not None:
+        _principal_cache.pop(user_id)
+
+
+def _authorize(user_id, role_claim):
+    # Роль из токена или сессии отсекает не-админов без обращения к базе
+    if role_claim is not None and role_claim != ADMIN_ROLE:
+        return None
+    principal = load_principal(user_id)
+    if not principal or principal.role != ADMIN_ROLE:
+        return None
+    g.principal = principal
+    return principal
+
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        from app.models import User  # Локальный импорт чтобы избежать циклической зависимости
-
         token = request.headers.get('Authorization')
 
         if not token:
@@ -60,21 +198,21 @@ def admin_required(f):
             if 'user_id' not in session:
                 return redirect('/login')
 
-            user = User.query.get(session['user_id'])
-            if not user or user.login != 'admin':
+            if not _authorize(session['user_id'], session.get('role')):
                 return redirect('/login')
 
             return f(*args, **kwargs)
 
         # Check JWT token for API requests
+        import jwt
+
         try:
             if token.startswith('Bearer '):
                 token = token[7:]
 
             payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            user = User.query.get(payload['user_id'])
 
-            if not user or user.login != 'admin':
+            if not _authorize(payload['user_id'], payload.get('role')):
                 return jsonify({'error': 'Admin access required'}), 403
 
         except jwt.ExpiredSignatureError:
@@ -87,17 +225,17 @@ def admin_required(f):
     return decorated_function
 
 
-def create_admin_user():
-    from app.extensions import db
+def create_admin_user(password):
+    """Создает пользователя admin или задает ему новый пароль; возвращает (admin, создан ли)"""
+    from app.extensions import db, password_hasher
     from app.models import User
 
+    password_hash = password_hasher.hash_password(password)
     admin = User.query.filter_by(login='admin').first()
-    if not admin:
-        password_hasher = PasswordHasher()
-        password_hash = password_hasher.hash_password("ojG!45_jVp")
-        admin = User(
-            login='admin',
-            password=password_hash
-        )
+    created = admin is None
+    if created:
+        admin = User(login='admin')
         db.session.add(admin)
-        db.session.commit()
\ No newline at end of file
+    admin.password = password_hash
+    db.session.commit()
+    return admin, created
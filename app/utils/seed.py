@@ -0,0 +1,216 @@
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import text, insert, bindparam
+from app.extensions import db
+from app.utils.search import normalize_text, normalize_part_number, bulk_insert_index
+
+# Размеры каталога для flask seed --size: детали, продажи, фото на деталь
+SEED_SIZES = {
+    "10k": (10_000, 2_000, 2),
+    "100k": (100_000, 20_000, 2),
+    "1m": (1_000_000, 200_000, 1),
+}
+
+CARS = {
+    "BMW": ("X5 E70", "X3 F25", "320i E90", "520d F10", "X1 E84"),
+    "Mercedes-Benz": ("W211 E200", "W204 C180", "ML W164", "Sprinter 906", "Vito 639"),
+    "Toyota": ("Camry V50", "Corolla E150", "RAV4 XA40", "Land Cruiser 200", "Prius 30"),
+    "Volkswagen": ("Passat B6", "Golf 6", "Polo Sedan", "Tiguan", "Touareg 7P"),
+    "Hyundai": ("Solaris", "Creta", "Santa Fe DM", "Tucson TL", "Elantra MD"),
+    "Kia": ("Rio 3", "Sportage 4", "Ceed JD", "Sorento XM", "Optima TF"),
+    "Nissan": ("Qashqai J10", "X-Trail T31", "Almera G15", "Teana J32", "Note E11"),
+    "Лада": ("Веста", "Гранта", "Приора", "Нива 4x4", "Ларгус"),
+}
+PART_NAMES = (
+    "Фара передняя левая", "Фара передняя правая", "Фонарь задний", "Бампер передний", "Бампер задний",
+    "Крыло переднее левое", "Крыло переднее правое", "Капот", "Дверь передняя левая", "Дверь задняя правая",
+    "Зеркало боковое", "Радиатор охлаждения", "Радиатор кондиционера", "Генератор", "Стартер",
+    "Компрессор кондиционера", "Блок управления двигателем", "Коробка передач", "Турбина", "Форсунка",
+    "Рулевая рейка", "Амортизатор передний", "Рычаг подвески", "Ступица", "Суппорт тормозной",
+    "Диск тормозной", "Подушка безопасности", "Панель приборов", "Стеклоподъемник", "Замок двери",
+)
+CONDITIONS = ("оригинал", "б/у, отличное состояние", "б/у, есть царапины", "контрактная", "после ремонта")
+TRANSPORT_COMPANIES = ("СДЭК", "ПЭК", "Деловые линии", "Почта России", "Самовывоз")
+
+# Сколько разных картинок на весь каталог: файлы общие, у деталей - только строки part_images
+_DISTINCT_IMAGES = 12
+
+_SALE_ITEM_SQL = text(
+    "INSERT INTO sale_items (sale_id, part_id, quantity, unit_price, total_price, unit_cost, "
+    "part_name, part_car, part_number) "
+    "VALUES (:sale_id, :part_id, :quantity, :unit_price, :total_price, :unit_cost, "
+    ":part_name, :part_car, :part_number)"
+)
+_IMAGE_SQL = text(
+    "INSERT INTO part_images (part_id, filename, blob_id, is_main, created_at, variants) "
+    "VALUES (:part_id, :filename, :blob_id, :is_main, :created_at, :variants)"
+)
+
+
+def _part_row(rng, now):
+    make = rng.choice(list(CARS))
+    car = f"{make} {rng.choice(CARS[make])}"
+    name = rng.choice(PART_NAMES)
+    part_number = f"{rng.choice('ABCDEFGHJKLMNPRSTUVWXYZ')}{rng.randint(100, 999)}-{rng.randint(10000, 99999)}"
+    price_in = rng.randint(5, 2000) * 50
+    row = {
+        "name": name,
+        "car": car,
+        "part_number": part_number,
+        "description": f"{name}, {rng.choice(CONDITIONS)}",
+        "price_in": price_in,
+        "price_out": int(price_in * rng.uniform(1.2, 2.5)) // 50 * 50,
+        "quantity": rng.choices((1, 2, 3, 5, 10), weights=(50, 20, 15, 10, 5))[0],
+        # Поступления за два года - для оборачиваемости и залежавшихся остатков
+        "created_at": now - timedelta(days=rng.uniform(0, 730)),
+    }
+    row.update(
+        name_key=normalize_text(row["name"]),
+        car_key=normalize_text(row["car"]),
+        description_key=normalize_text(row["description"]),
+        part_number_key=normalize_part_number(row["part_number"]),
+    )
+    return row
+
+
+def _seed_parts(rng, count, now, batch_size, progress):
+    """Вставляет детали пачками тем же запросом, что импорт из файла; возвращает их id"""
+    from app.utils.importer import _INSERT_SQL
+
+    last_id = db.session.execute(text("SELECT COALESCE(MAX(id), 0) FROM parts")).scalar()
+    for start in range(0, count, batch_size):
+        rows = [_part_row(rng, now) for _ in range(min(batch_size, count - start))]
+        with bulk_insert_index(db.session):
+            db.session.execute(_INSERT_SQL, rows)
+        db.session.commit()
+        progress("детали", start + len(rows), count)
+    return db.session.scalars(text("SELECT id FROM parts WHERE id > :last_id ORDER BY id"), {"last_id": last_id}).all()
+
+
+def _seed_image_blobs(rng):
+    """Несколько сгенерированных фото в хранилище вместе с превью: [(блоб, варианты)]"""
+    from PIL import Image, ImageDraw
+    from app.utils.images import generate_variants, format_variants
+    from app.utils.media_store import get_blob_path, store_file
+
+    blobs = []
+    for _ in range(_DISTINCT_IMAGES):
+        image = Image.new("RGB", (1600, 1200), tuple(rng.randint(40, 220) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(30):
+            x, y = rng.randint(0, 1500), rng.randint(0, 1100)
+            draw.rectangle((x, y, x + rng.randint(20, 300), y + rng.randint(20, 300)),
+                           fill=tuple(rng.randint(0, 255) for _ in range(3)))
+        fd, path = tempfile.mkstemp(suffix=".jpg")
+        os.close(fd)
+        image.save(path, "JPEG", quality=85)
+        blob = store_file(path, "jpg")
+        db.session.commit()
+
+        blob_path = get_blob_path(blob.filename)
+        variants = generate_variants(blob_path, os.path.dirname(blob_path), blob.filename)
+        blobs.append((blob, format_variants(variants) or None))
+    return blobs
+
+
+def _seed_images(rng, part_ids, per_part, now, batch_size, progress):
+    if per_part <= 0 or not part_ids:
+        return 0
+    blobs = _seed_image_blobs(rng)
+    inserted = 0
+    for start in range(0, len(part_ids), batch_size):
+        rows = []
+        for part_id in part_ids[start:start + batch_size]:
+            for position in range(per_part):
+                blob, variants = rng.choice(blobs)
+                rows.append({
+                    "part_id": part_id, "filename": blob.filename, "blob_id": blob.id,
+                    "is_main": position == 0, "created_at": now, "variants": variants,
+                })
+        # Вставка без ORM: счетчики ссылок блобов пересчитываются ниже одним запросом
+        db.session.execute(_IMAGE_SQL, rows)
+        db.session.commit()
+        inserted += len(rows)
+        progress("фото", min(start + batch_size, len(part_ids)), len(part_ids))
+
+    db.session.execute(
+        text(
+            "UPDATE media_blobs SET ref_count = "
+            "(SELECT COUNT(*) FROM part_images WHERE blob_id = media_blobs.id) + "
+            "(SELECT COUNT(*) FROM part_videos WHERE blob_id = media_blobs.id) "
+            "WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": [blob.id for blob, _ in blobs]}
+    )
+    db.session.commit()
+    return inserted
+
+
+def _seed_sales(rng, part_ids, count, now, batch_size, progress):
+    """Продажи за последний год. Остатки не списываются: это история, а не новые продажи"""
+    from app.models import Sale
+
+    parts = db.session.execute(
+        text("SELECT id, name, car, part_number, price_in, price_out FROM parts WHERE id >= :first_id"),
+        {"first_id": part_ids[0]}
+    ).all()
+
+    for start in range(0, count, batch_size):
+        sales, sale_items = [], []
+        for _ in range(min(batch_size, count - start)):
+            total = 0
+            items = []
+            # Часть ассортимента продается чаще: так у ABC-анализа есть классы A, B и C.
+            # dict.fromkeys убирает повторы, сохраняя порядок - результат зависит только от seed
+            lines = rng.choices((1, 2, 3, 4), weights=(60, 25, 10, 5))[0]
+            for part in dict.fromkeys(
+                rng.choice(parts[:max(1, len(parts) // 5)] if rng.random() < 0.6 else parts) for _ in range(lines)
+            ):
+                quantity = rng.choices((1, 2, 4), weights=(80, 15, 5))[0]
+                total += quantity * part.price_out
+                items.append({
+                    "part_id": part.id, "quantity": quantity,
+                    "unit_price": part.price_out, "total_price": quantity * part.price_out,
+                    "unit_cost": part.price_in, "part_name": part.name, "part_car": part.car,
+                    "part_number": part.part_number,
+                })
+            discount = rng.choices((None, "percent", "fixed"), weights=(70, 20, 10))[0]
+            discount_value = {None: 0, "percent": rng.choice((5, 10, 15)), "fixed": rng.randint(1, 10) * 100}[discount]
+            final = total * (100 - discount_value) // 100 if discount == "percent" else max(0, total - discount_value)
+            sale_items.append(items)
+            sales.append({
+                "created_at": now - timedelta(days=rng.uniform(0, 365)),
+                "discount_type": discount, "discount_value": discount_value,
+                "total_amount": total, "final_amount": final,
+                "transport_company": rng.choice(TRANSPORT_COMPANIES),
+                "tracking_number": str(rng.randint(10 ** 9, 10 ** 10 - 1)),
+            })
+        # id продаж - из RETURNING, в порядке переданных строк
+        sale_ids = db.session.scalars(insert(Sale).returning(Sale.id, sort_by_parameter_order=True), sales).all()
+        db.session.execute(_SALE_ITEM_SQL, [
+            {"sale_id": sale_id, **item} for sale_id, items in zip(sale_ids, sale_items) for item in items
+        ])
+        db.session.commit()
+        progress("продажи", start + len(sales), count)
+
+
+def seed_catalogue(parts, sales, images_per_part=2, seed=0, batch_size=5000, progress=None):
+    """Заполняет базу синтетическим каталогом: детали, фото, продажи, итоги и поисковый индекс.
+
+    При одинаковом seed содержимое одинаковое (кроме дат - они отсчитываются от текущего момента),
+    поэтому замеры на разных версиях кода сравнимы. Возвращает {parts, images, sales}.
+    """
+    from app.utils.rollups import rebuild_rollups
+
+    progress = progress or (lambda stage, done, total: None)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    part_ids = _seed_parts(rng, parts, now, batch_size, progress)
+    images = _seed_images(rng, part_ids, images_per_part, now, batch_size, progress)
+    if sales and part_ids:
+        _seed_sales(rng, part_ids, sales, now, batch_size, progress)
+        rebuild_rollups()
+    return {"parts": len(part_ids), "images": images, "sales": sales if part_ids else 0}
@@ -0,0 +1,79 @@
+import os
+import time
+from sqlalchemy import select, text
+from app.extensions import db, password_hasher
+
+
+def after_fork(app):
+    """Сбрасывает то, что воркер унаследовал от мастера при preload: соединения и пулы потоков.
+
+    Соединения с базой нельзя делить между процессами, а потоки пулов
+    после fork в дочернем процессе не существуют.
+    """
+    from app.utils import images, importer, media_gc, metrics, page_cache
+
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: соединения мастера не закрываются (их сокеты общие), а просто забываются
+            engine.dispose(close=False)
+    images._executor = None
+    importer._executor = None
+    media_gc._delete_executor = None
+    page_cache._cache = None
+    metrics.reset()
+    password_hasher.init_app(app)
+
+
+def warm_up(app):
+    """Готовит воркер до приема запросов: соединения пула, шаблоны, кэши. Возвращает время в мс"""
+    from app.models import User
+    from app.utils.page_cache import get_page_cache
+    from app.utils.security import load_principal
+
+    started = time.perf_counter()
+    with app.app_context():
+        # Соединения открываются заранее - первые запросы не ждут подключения и PRAGMA
+        for engine in db.engines.values():
+            size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+            connections = [engine.connect() for _ in range(max(1, min(app.config['WSGI_THREADS'], size)))]
+            for conn in connections:
+                conn.execute(text("SELECT 1"))
+                conn.close()
+
+        # Шаблоны компилируются один раз на процесс
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+
+        # Пользователи для admin_required (их немного), бэкенд кэша страниц
+        for user_id in db.session.scalars(select(User.id)):
+            load_principal(user_id)
+        get_page_cache()
+        db.session.remove()
+
+    elapsed = (time.perf_counter() - started) * 1000
+    app.logger.info("Воркер %d прогрет за %.0f мс", os.getpid(), elapsed)
+    return elapsed
+
+
+def start_worker(app):
+    """Запуск воркера WSGI-сервера: свои соединения и фоновые потоки, затем прогрев"""
+    from app.utils.media_gc import start_media_gc
+
+    after_fork(app)
+    start_media_gc(app)
+    warm_up(app)
+
+
+def stop_worker(app):
+    """Плавная остановка воркера: дожидается фонового импорта, превью и удаления файлов"""
+    from app.utils import images, importer, media_gc, metrics
+
+    for executor in (importer._executor, images._executor, media_gc._delete_executor):
+        if executor is not None:
+            executor.shutdown(wait=True)
+    # Последние запросы воркера должны попасть в снимок для /metrics
+    if app.config['METRICS_ENABLED']:
+        metrics.flush(app, force=True)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
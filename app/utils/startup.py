@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from collections import defaultdict
+from flask import g, request
+
+# Холодный старт в отдельном процессе: импорт пакета, create_app, первый запрос тестовым клиентом
+_COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(sys.argv[1], background=False)
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[2])
+finished = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (finished - created) * 1000,
+    "status": response.status_code,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def init_startup_report(app, started):
+    """Запоминает время create_app и один раз пишет в лог длительность первого запроса воркера"""
+    report = app.extensions["startup"] = {
+        "pid": os.getpid(),
+        "create_app_ms": round((time.perf_counter() - started) * 1000, 1),
+        "first_request_ms": None,
+    }
+    lock = threading.Lock()
+
+    @app.before_request
+    def start_first_request_timer():
+        if report["first_request_ms"] is None:
+            g.startup_request_started = time.perf_counter()
+
+    @app.after_request
+    def log_first_request(response):
+        started_at = g.pop("startup_request_started", None)
+        if started_at is None:
+            return response
+        with lock:
+            # Несколько потоков могли начать первый запрос одновременно - записывается один
+            if report["first_request_ms"] is not None:
+                return response
+            report["pid"] = os.getpid()
+            report["first_request_ms"] = round((time.perf_counter() - started_at) * 1000, 1)
+        app.logger.info(
+            "Первый запрос воркера %d (%s) - %.0f мс, create_app - %.0f мс",
+            report["pid"], request.path,
+            report["first_request_ms"], report["create_app_ms"]
+        )
+        return response
+
+
+def _parse_importtime(stderr):
+    """Собственное время импорта (мкс) по пакетам верхнего уровня из вывода python -X importtime"""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # import time:  <собственное> | <с вложенными> | <отступ по вложенности><модуль>
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        totals[name.split(".")[0]] += int(self_us)
+    return totals
+
+
+def measure_cold_start(config_class, path="/login", root=None):
+    """Запускает новый интерпретатор с -X importtime и возвращает отчет о холодном старте.
+
+    import_ms - импорт пакета app, create_app_ms - фабрика (в т.ч. импорт blueprint'ов),
+    first_request_ms - первый запрос; packages - собственное время импорта по пакетам, мс.
+    """
+    root = root or os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _COLD_START_SCRIPT, config_class, path],
+        cwd=root, capture_output=True, text=True
+    )
+    total_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "процесс завершился с ошибкой")
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["process_ms"] = total_ms
+    report["packages"] = {
+        name: us / 1000 for name, us in sorted(_parse_importtime(result.stderr).items(), key=lambda item: -item[1])
+    }
+    return report
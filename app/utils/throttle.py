@@ -0,0 +1,66 @@
+import time
+import threading
+from collections import deque, OrderedDict
+
+
+class RateLimiter:
+    """Скользящее окно в памяти процесса: не больше limit событий на ключ за window секунд"""
+
+    def __init__(self, limit, window, maxsize=10000):
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self._events = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def retry_after(self, key):
+        """Сколько секунд ждать до следующей попытки; 0 - можно сейчас"""
+        now = time.monotonic()
+        with self._lock:
+            events = self._recent(key, now)
+            if events is None or len(events) < self.limit:
+                return 0
+            return max(1, int(events[0] + self.window - now) + 1)
+
+    def hit(self, key):
+        """Учитывает событие; возвращает False, если лимит уже исчерпан"""
+        now = time.monotonic()
+        with self._lock:
+            events = self._recent(key, now)
+            if events is None:
+                events = self._events[key] = deque()
+            if len(events) >= self.limit:
+                return False
+            events.append(now)
+            self._events.move_to_end(key)
+            # Старые ключи вытесняются, чтобы перебор адресов не съел память
+            while len(self._events) > self.maxsize:
+                self._events.popitem(last=False)
+            return True
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+
+_limiters = {}
+
+
+def get_limiter(name, limit, window):
+    """Общий для процесса ограничитель с заданными параметрами"""
+    window = window.total_seconds() if hasattr(window, "total_seconds") else window
+    limiter = _limiters.get(name)
+    if limiter is None or (limiter.limit, limiter.window) != (limit, window):
+        limiter = _limiters[name] = RateLimiter(limit, window)
+    return limiter
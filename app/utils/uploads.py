@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INCOMING_DIR = ".incoming"
+
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def get_incoming_path():
+    """Папка для принимаемых файлов - на том же диске, что и итоговые папки деталей"""
+    path = os.path.join(
+        current_app.instance_path,
+        current_app.config['UPLOAD_FOLDER'],
+        INCOMING_DIR
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def upload_size_limit(filename):
+    """Лимит размера для файла по его расширению (видео или изображение)"""
+    ext = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    if ext in current_app.config['ALLOWED_VIDEO_EXTENSIONS']:
+        return current_app.config['MAX_VIDEO_SIZE']
+    if ext in current_app.config['IMPORT_ALLOWED_EXTENSIONS']:
+        return current_app.config['IMPORT_MAX_SIZE']
+    return current_app.config['MAX_FILE_SIZE']
+
+
+class UploadSpool:
+    """Файл загрузки, который пишется сразу в папку загрузок с подсчетом байт и sha256.
+
+    При превышении лимита прием прерывается с 413, а при сохранении файл
+    не копируется, а переименовывается на итоговое место.
+    """
+
+    def __init__(self, directory, limit):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".upload")
+        self.file = os.fdopen(fd, "w+b")
+        self.limit = limit
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            self.close()
+            raise RequestEntityTooLarge(f"Файл больше {self.limit // (1024 * 1024)} МБ")
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def commit(self, destination):
+        """Переносит принятый файл на итоговое место без копирования"""
+        self.file.close()
+        os.replace(self.path, destination)
+        self.committed = True
+
+    def close(self):
+        self.file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadRequest(Request):
+    """Request, который принимает файлы формы потоком прямо в папку загрузок"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(get_incoming_path(), upload_size_limit(filename))
+
+
+def get_file_size(file_storage):
+    """Размер загруженного файла без повторного чтения"""
+    if isinstance(file_storage.stream, UploadSpool):
+        return file_storage.stream.size
+
+    file_storage.seek(0, 2)
+    file_size = file_storage.tell()
+    file_storage.seek(0)
+    return file_size
+
+
+# --- Докачиваемые (чанковые) загрузки видео ---
+
+def _session_paths(upload_id):
+    incoming = get_incoming_path()
+    return (
+        os.path.join(incoming, f"{upload_id}.json"),
+        os.path.join(incoming, f"{upload_id}.part"),
+    )
+
+
+def cleanup_stale_uploads():
+    """Удаляет незавершенные загрузки старше UPLOAD_SESSION_TTL"""
+    incoming = get_incoming_path()
+    deadline = time.time() - current_app.config['UPLOAD_SESSION_TTL'].total_seconds()
+    removed = 0
+    for name in os.listdir(incoming):
+        path = os.path.join(incoming, name)
+        try:
+            if os.path.getmtime(path) < deadline:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def create_upload_session(part_id, filename, size):
+    """Начинает докачиваемую загрузку, возвращает описание сессии"""
+    cleanup_stale_uploads()
+
+    upload_id = uuid.uuid4().hex
+    meta_path, data_path = _session_paths(upload_id)
+    session_data = {
+        "upload_id": upload_id,
+        "part_id": part_id,
+        "filename": filename,
+        "size": size,
+    }
+    with open(data_path, "wb"):
+        pass
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(session_data, f)
+
+    session_data["offset"] = 0
+    return session_data
+
+
+def load_upload_session(upload_id, part_id):
+    """Загружает описание сессии; None, если ее нет или она чужая"""
+    try:
+        uuid.UUID(hex=upload_id)
+    except ValueError:
+        return None
+
+    meta_path, data_path = _session_paths(upload_id)
+    if not os.path.exists(meta_path) or not os.path.exists(data_path):
+        return None
+
+    with open(meta_path, encoding="utf-8") as f:
+        session_data = json.load(f)
+    if session_data["part_id"] != part_id:
+        return None
+
+    session_data["offset"] = os.path.getsize(data_path)
+    return session_data
+
+
+def append_chunk(session_data, offset, stream, length):
+    """Дописывает кусок файла по смещению offset, возвращает новое смещение.
+
+    Смещение должно совпадать с уже принятым объемом - так клиент после обрыва
+    узнает, с какого байта продолжать, и ничего не пишется дважды. Проверка и
+    запись идут под блокировкой файла: повтор запроса клиентом после таймаута
+    с тем же Upload-Offset ждет первый и получает ошибку смещения. Кусок,
+    завершающий файл, закрывает сессию (session_data["complete"]) - это
+    происходит ровно один раз.
+    """
+    if length is None or length > current_app.config['UPLOAD_CHUNK_SIZE']:
+        raise ValueError("Размер куска не указан или слишком большой")
+    if offset + length > session_data["size"]:
+        raise ValueError("Кусок выходит за объявленный размер файла")
+
+    meta_path, data_path = _session_paths(session_data["upload_id"])
+    with open(data_path, "ab") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+        # Пока ждали блокировку, другой запрос мог дописать файл или завершить загрузку
+        session_data["offset"] = os.fstat(f.fileno()).st_size
+        if not os.path.exists(meta_path):
+            raise ValueError("Загрузка уже завершена")
+        if offset != session_data["offset"]:
+            raise ValueError(f"Ожидалось смещение {session_data['offset']}")
+
+        written = 0
+        while written < length:
+            data = stream.read(min(_COPY_BUFFER_SIZE, length - written))
+            if not data:
+                break
+            f.write(data)
+            written += len(data)
+        f.flush()
+
+        session_data["offset"] = offset + written
+        session_data["complete"] = session_data["offset"] >= session_data["size"]
+        if session_data["complete"]:
+            os.remove(meta_path)
+        else:
+            # Продлеваем жизнь сессии, пока по ней идут данные
+            os.utime(meta_path)
+    return session_data["offset"]
+
+
+def finish_upload_session(session_data):
+    """Возвращает путь к полностью принятому файлу (сессию закрыл последний кусок)"""
+    meta_path, data_path = _session_paths(session_data["upload_id"])
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    return data_path
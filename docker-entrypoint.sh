@@ -0,0 +1,7 @@
+#!/bin/sh
+# Схема базы обновляется до запуска воркеров: образ не содержит базы, она лежит в томе /app/instance
+set -e
+
+flask --app wsgi migrate
+
+exec "$@"
@@ -0,0 +1,39 @@
+"""Настройки gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+
+Адрес, число воркеров и потоков, таймауты - из конфигурации приложения (WSGI_*),
+класс конфигурации - APP_CONFIG (по умолчанию app.config.ProductionConfig).
+"""
+import os
+from werkzeug.utils import import_string
+
+_config = import_string(os.environ.get('APP_CONFIG', 'app.config.ProductionConfig'))
+
+bind = _config.WSGI_BIND
+workers = _config.WSGI_WORKERS
+threads = _config.WSGI_THREADS
+worker_class = "gthread"
+preload_app = _config.WSGI_PRELOAD
+timeout = _config.WSGI_TIMEOUT
+graceful_timeout = _config.WSGI_GRACEFUL_TIMEOUT
+max_requests = _config.WSGI_MAX_REQUESTS
+max_requests_jitter = _config.WSGI_MAX_REQUESTS // 10
+accesslog = "-"
+
+
+def on_starting(server):
+    # Снимки метрик прошлого запуска не должны попадать в /metrics нового
+    if _config.METRICS_DIR:
+        from app.utils.metrics import clear_snapshots
+        clear_snapshots(_config.METRICS_DIR)
+
+
+def post_worker_init(worker):
+    # Вызывается в воркере до начала приема запросов
+    from app.utils.serving import start_worker
+    start_worker(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    # TERM/HUP: gunicorn дожидается текущих запросов (graceful_timeout), затем - фоновых задач
+    from app.utils.serving import stop_worker
+    stop_worker(worker.wsgi)
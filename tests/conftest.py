@@ -0,0 +1,65 @@
+import pytest
+from app import create_app
+from app.config import Config
+from app.extensions import db as _db
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Фабрика приложений на отдельной базе SQLite со схемой последней версии.
+
+    Настройки конфигурации, которые читаются при создании приложения, передаются аргументами.
+    """
+    from app.utils import throttle
+    from app.utils.migrations import upgrade
+
+    contexts = []
+
+    def make(**overrides):
+        class TestConfig(Config):
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+            UPLOAD_FOLDER = str(tmp_path / "uploads")
+            PAGE_CACHE_BACKEND = "off"
+            MEDIA_GC_INTERVAL = None
+
+        for name, value in overrides.items():
+            setattr(TestConfig, name, value)
+
+        app = create_app(TestConfig, background=False)
+        context = app.app_context()
+        context.push()
+        contexts.append(context)
+        upgrade(log=lambda message: None)
+        return app
+
+    # Ограничители попыток общие для процесса - каждый тест начинает с чистых
+    throttle._limiters.clear()
+    yield make
+    for context in reversed(contexts):
+        _db.session.remove()
+        for engine in _db.engines.values():
+            engine.dispose()
+        context.pop()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def db(app):
+    return _db
+
+
+@pytest.fixture
+def client(app):
+    """Клиент с токеном администратора"""
+    from app.utils.security import create_admin_user, create_access_token
+
+    admin, _ = create_admin_user("test-password")
+    token = create_access_token(admin.id, "admin")
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
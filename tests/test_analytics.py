@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+import pytest
+from app.models import Part
+
+
+@pytest.mark.parametrize("url", [
+    "/api/analytics/margin-by-car?days=1000000000000",
+    "/api/analytics/abc?days=1000000000000",
+    "/api/analytics/turnover?days=1000000000000",
+    "/api/analytics/dead-stock?min_days=1000000000000",
+])
+def test_huge_period_is_capped(app, client, url):
+    response = client.get(url)
+
+    assert response.status_code == 200
+
+
+def test_part_edit_invalidates_cached_result(app, db, client):
+    part = Part(name="Фара", car="BMW X5", part_number="A-1", price_in=100, price_out=200, quantity=1,
+                created_at=datetime.utcnow() - timedelta(days=400))
+    other = Part(name="Капот", car="Audi A6", part_number="B-2", price_in=100, price_out=200, quantity=1,
+                 created_at=datetime.utcnow() - timedelta(days=400))
+    db.session.add_all([part, other])
+    db.session.commit()
+    # Поднимаем версию второй детали: правка первой не меняет max(version)
+    for _ in range(3):
+        other.description = f"правка {other.version}"
+        db.session.commit()
+
+    before = client.get("/api/analytics/dead-stock").get_json()
+    part.car = "BMW X6"
+    db.session.commit()
+    after = client.get("/api/analytics/dead-stock").get_json()
+
+    assert {row["car"] for row in before["parts"]} == {"BMW X5", "Audi A6"}
+    assert {row["car"] for row in after["parts"]} == {"BMW X6", "Audi A6"}
@@ -0,0 +1,25 @@
+def _fail_login(client, address):
+    return client.post(
+        "/login", data={"username": "nobody", "password": "wrong"}, headers={"X-Forwarded-For": address}
+    )
+
+
+def test_ip_limit_uses_forwarded_address_behind_proxy(make_app):
+    app = make_app(TRUSTED_PROXIES=1, LOGIN_IP_LIMIT=2, LOGIN_USER_LIMIT=100)
+    client = app.test_client()
+
+    for _ in range(2):
+        _fail_login(client, "10.0.0.1")
+    assert _fail_login(client, "10.0.0.1").status_code == 429
+    # Другой клиент за тем же прокси не заблокирован
+    assert _fail_login(client, "10.0.0.2").status_code != 429
+
+
+def test_forwarded_header_is_ignored_without_trusted_proxies(make_app):
+    app = make_app(LOGIN_IP_LIMIT=2, LOGIN_USER_LIMIT=100)
+    client = app.test_client()
+
+    for address in ("10.0.0.1", "10.0.0.2"):
+        _fail_login(client, address)
+    # Клиент не может обойти лимит, подставляя X-Forwarded-For
+    assert _fail_login(client, "10.0.0.3").status_code == 429
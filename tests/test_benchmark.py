@@ -0,0 +1,120 @@
+import json
+import pytest
+from app.utils.benchmark import SCENARIOS, client_sender, compare_reports, percentile, run_benchmark
+from app.utils.seed import seed_catalogue
+from app.utils.security import create_admin_user, create_access_token
+from app.utils.startup import _parse_importtime
+
+
+def _report(**results):
+    return {"meta": {}, "results": results}
+
+
+def _result(p95_ms=10.0, rps=100.0, peak_rss_mib=200.0, errors=0):
+    return {"p95_ms": p95_ms, "rps": rps, "peak_rss_mib": peak_rss_mib, "errors": errors}
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile([], 95) is None
+    assert percentile([7], 50) == 7
+    assert [percentile(values, pct) for pct in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([1, 2, 3, 4], 50) == 2
+
+
+def test_compare_within_tolerance():
+    baseline = _report(search=_result())
+    current = _report(search=_result(p95_ms=11.9, rps=81.0, peak_rss_mib=239.0))
+
+    assert compare_reports(baseline, current, tolerance=0.2) == []
+
+
+@pytest.mark.parametrize("changed, metric", [
+    ({"p95_ms": 12.5}, "p95_ms"),
+    ({"rps": 79.0}, "rps"),
+    ({"peak_rss_mib": 250.0}, "peak_rss_mib"),
+])
+def test_compare_reports_regression(changed, metric):
+    regressions = compare_reports(_report(search=_result()), _report(search=_result(**changed)), tolerance=0.2)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith(f"search: {metric}")
+
+
+def test_new_errors_are_always_a_regression():
+    regressions = compare_reports(_report(search=_result()), _report(search=_result(errors=1)), tolerance=10)
+
+    assert regressions == ["search: ошибок 1 (было 0)"]
+
+
+def test_compare_skips_missing_values():
+    baseline = _report(search=_result(peak_rss_mib=None), parts_list=_result())
+    current = _report(search=_result(peak_rss_mib=900.0), api_parts=_result(p95_ms=1000.0))
+
+    assert compare_reports(baseline, current) == []
+
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   _io",
+        "import time:      1500 |       1500 |     sqlalchemy.util",
+        "import time:       300 |       1800 |   sqlalchemy",
+        "import time:        40 |         40 | app.config",
+        "some other warning",
+    ])
+
+    assert _parse_importtime(stderr) == {"_io": 120, "sqlalchemy": 1800, "app": 40}
+
+
+@pytest.fixture
+def seeded(app):
+    result = seed_catalogue(parts=30, sales=10, images_per_part=0, batch_size=8)
+    admin, _ = create_admin_user("bench-password")
+    return result, create_access_token(admin.id, "admin")
+
+
+def test_seed_and_benchmark_pass(app, seeded):
+    result, token = seeded
+    assert result == {"parts": 30, "images": 0, "sales": 10}
+
+    scenarios = [scenario for scenario in SCENARIOS if not scenario.writes]
+    report = run_benchmark(client_sender(app, token), scenarios, requests=4, concurrency=2, warmup=1)
+
+    assert report["meta"]["parts"] == 30
+    assert set(report["results"]) == {scenario.name for scenario in scenarios}
+    for name, result in report["results"].items():
+        assert result["requests"] == 4, name
+        assert result["errors"] == 0, name
+        assert result["p95_ms"] is not None
+
+
+def test_bench_command_exit_code(app, seeded, tmp_path):
+    runner = app.test_cli_runner()
+    current_path = tmp_path / "current.json"
+    result = runner.invoke(args=["bench", "--scenario", "api_search", "--requests", "3", "--warmup", "0",
+                                 "--save", str(current_path)])
+    assert result.exit_code == 0, result.output
+    report = json.loads(current_path.read_text(encoding="utf-8"))
+
+    # Базовая линия была намного быстрее - регрессия и код выхода 1
+    fast = json.loads(json.dumps(report))
+    fast["results"]["api_search"].update(p95_ms=report["results"]["api_search"]["p95_ms"] / 100,
+                                         rps=report["results"]["api_search"]["rps"] * 100)
+    fast_path = tmp_path / "fast.json"
+    fast_path.write_text(json.dumps(fast), encoding="utf-8")
+    result = runner.invoke(args=["bench", "--scenario", "api_search", "--requests", "3", "--warmup", "0",
+                                 "--compare", str(fast_path)])
+    assert result.exit_code == 1, result.output
+    assert "Регрессии" in result.output
+
+    # Очень медленная базовая линия - регрессий нет
+    slow = json.loads(json.dumps(report))
+    slow["results"]["api_search"].update(p95_ms=1e6, rps=0.001, peak_rss_mib=1e6)
+    slow_path = tmp_path / "slow.json"
+    slow_path.write_text(json.dumps(slow), encoding="utf-8")
+    result = runner.invoke(args=["bench", "--scenario", "api_search", "--requests", "3", "--warmup", "0",
+                                 "--compare", str(slow_path)])
+    assert result.exit_code == 0, result.output
+    assert "Регрессий нет" in result.output
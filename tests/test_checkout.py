@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+import pytest
+from app.extensions import db as _db
+from app.models import Part, Sale
+from app.utils.checkout import checkout, CheckoutError
+
+
+def _parts(db, count=3, quantity=1000, **fields):
+    parts = [Part(name=f"Деталь {i}", car="BMW", part_number=f"A-{i}", quantity=quantity,
+                  **{"price_in": 100, "price_out": 200, **fields})
+             for i in range(count)]
+    db.session.add_all(parts)
+    db.session.commit()
+    return [part.id for part in parts]
+
+
+def test_concurrent_checkouts_do_not_fail_or_oversell(app, db):
+    ids = _parts(db)
+    threads_count, per_thread = 8, 15
+    barrier = threading.Barrier(threads_count)
+    errors = []
+
+    def worker():
+        with app.app_context():
+            barrier.wait()
+            for _ in range(per_thread):
+                try:
+                    checkout([(part_id, 1) for part_id in ids])
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    _db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert Sale.query.count() == threads_count * per_thread
+    for part_id in ids:
+        assert db.session.get(Part, part_id).quantity == 1000 - threads_count * per_thread
+
+
+def test_locked_database_is_a_conflict(make_app, tmp_path):
+    app = make_app(SQLITE_PRAGMAS={"journal_mode": "WAL", "busy_timeout": 50})
+    ids = _parts(_db, count=1)
+    # Другой процесс держит блокировку записи дольше busy_timeout
+    other = sqlite3.connect(str(tmp_path / "test.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(CheckoutError) as error:
+            checkout([(ids[0], 1)])
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+
+    assert error.value.status == 409
+    assert _db.session.get(Part, ids[0]).quantity == 1000
+
+
+def test_part_without_price_is_rejected(app, db, client):
+    ids = _parts(db, count=1, price_out=None, price_in=None)
+
+    response = client.post("/api/sales", json={"items": [{"part_id": ids[0], "quantity": 1}]})
+
+    assert response.status_code == 409
+    assert "цена" in response.get_json()["error"]
+    assert db.session.get(Part, ids[0]).quantity == 1000
@@ -0,0 +1,36 @@
+import json
+import pytest
+from app.models import Part
+
+
+@pytest.fixture
+def part(db):
+    part = Part(name="Фара", car="BMW", part_number="A-1", price_in=100, price_out=200, quantity=1)
+    db.session.add(part)
+    db.session.commit()
+    return part
+
+
+@pytest.mark.parametrize("export_format, content_type", [
+    ("csv", "text/csv; charset=utf-8"),
+    ("ndjson", "application/x-ndjson"),
+    ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+])
+def test_export_content_type(client, part, export_format, content_type):
+    response = client.get(f"/export/parts?format={export_format}")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == content_type
+
+
+def test_csv_export_contains_part(client, part):
+    body = client.get("/export/parts?format=csv").get_data().decode("utf-8-sig")
+
+    assert "A-1" in body
+    assert "Фара" in body
+
+
+def test_ndjson_export_rows(client, part):
+    lines = client.get("/export/parts?format=ndjson").get_data().decode("utf-8").splitlines()
+
+    assert [json.loads(line)["part_number"] for line in lines] == ["A-1"]
@@ -0,0 +1,44 @@
+import csv
+from app.models import Part
+from app.utils.importer import import_parts
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+def _report(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+def test_new_part_without_price_out_is_reported(app, db, tmp_path):
+    path = _write_csv(tmp_path / "price.csv", [
+        ["название", "номер", "цена", "закупка", "количество"],
+        ["Фара", "A-1", "1000", "", "2"],
+        ["Капот", "B-2", "", "500", "1"],
+    ])
+    report_path = tmp_path / "errors.csv"
+
+    stats = import_parts(path, report_path)
+
+    assert stats == {"rows": 2, "inserted": 1, "updated": 0, "failed": 1}
+    part = Part.query.filter_by(part_number="A-1").one()
+    assert (part.price_out, part.price_in, part.quantity) == (1000, 0, 2)
+    assert Part.query.filter_by(part_number="B-2").count() == 0
+    assert [(row["line"], row["part_number"]) for row in _report(report_path)] == [("3", "B-2")]
+
+
+def test_existing_part_keeps_price_when_cell_is_empty(app, db, tmp_path):
+    db.session.add(Part(name="Капот", car="BMW", part_number="B-2", price_in=500, price_out=900, quantity=1))
+    db.session.commit()
+    path = _write_csv(tmp_path / "price.csv", [["название", "номер", "цена", "количество"], ["Капот", "B-2", "", "3"]])
+
+    stats = import_parts(path, tmp_path / "errors.csv")
+
+    assert stats["updated"] == 1 and stats["failed"] == 0
+    part = Part.query.filter_by(part_number="B-2").one()
+    db.session.refresh(part)
+    assert (part.price_out, part.quantity) == (900, 4)
@@ -0,0 +1,103 @@
+import os
+import pytest
+from PIL import Image
+from app.utils.file_handling import ingest_image
+
+# Теги EXIF
+ORIENTATION = 0x0112
+GPS_INFO = 0x8825
+MAKE = 0x010F
+
+
+def _exif(orientation=None):
+    exif = Image.Exif()
+    exif[MAKE] = "TestCamera"
+    exif[GPS_INFO] = {1: "N", 2: (55.0, 45.0, 0.0)}
+    if orientation is not None:
+        exif[ORIENTATION] = orientation
+    return exif
+
+
+def _two_halves(width, height):
+    """Левая половина красная, правая синяя - по ним видно, как повернут результат"""
+    image = Image.new("RGB", (width, height), (0, 0, 255))
+    image.paste((255, 0, 0), (0, 0, width // 2, height))
+    return image
+
+
+def _ingest(tmp_path, image, name, **save_args):
+    path = tmp_path / name
+    image.save(path, **save_args)
+    new_name = ingest_image(str(path))
+    return tmp_path / new_name
+
+
+def _is_red(pixel):
+    return pixel[0] > 200 and pixel[2] < 60
+
+
+def test_exif_orientation_is_applied(app, tmp_path):
+    # Orientation 6: камеру держали боком, при показе кадр поворачивается на 90° по часовой
+    result = _ingest(tmp_path, _two_halves(400, 200), "photo.jpg", exif=_exif(orientation=6), quality=95)
+
+    with Image.open(result) as image:
+        assert image.size == (200, 400)
+        assert _is_red(image.getpixel((100, 50)))
+        assert not _is_red(image.getpixel((100, 350)))
+
+
+def test_metadata_is_stripped(app, tmp_path):
+    result = _ingest(tmp_path, _two_halves(300, 200), "photo.jpg", exif=_exif(orientation=1))
+
+    with Image.open(result) as image:
+        exif = image.getexif()
+        assert MAKE not in exif and GPS_INFO not in exif and ORIENTATION not in exif
+        assert "exif" not in image.info
+
+
+def test_long_side_is_limited(app, tmp_path):
+    max_side = app.config['INGEST_MAX_SIDE']
+    result = _ingest(tmp_path, _two_halves(max_side * 2, max_side), "big.png")
+
+    with Image.open(result) as image:
+        assert image.size == (max_side, max_side // 2)
+        assert image.format == app.config['INGEST_IMAGE_FORMAT'].upper()
+
+
+def test_source_is_removed_unless_kept(app, tmp_path):
+    source = tmp_path / "photo.jpg"
+    _two_halves(100, 100).save(source)
+
+    kept = ingest_image(str(source), keep_source=True)
+    assert source.exists() and (tmp_path / kept).exists()
+
+    ingest_image(str(source))
+    assert not source.exists()
+
+
+def test_transparent_png_gets_white_background(app, tmp_path):
+    if app.config['INGEST_IMAGE_FORMAT'].upper() != 'JPEG':
+        pytest.skip("прозрачность заменяется фоном только для JPEG")
+    result = _ingest(tmp_path, Image.new("RGBA", (50, 50), (0, 0, 0, 0)), "clear.png")
+
+    with Image.open(result) as image:
+        assert image.mode == "RGB"
+        assert min(image.getpixel((25, 25))) > 245
+
+
+def test_heic_is_decoded(app, tmp_path):
+    pillow_heif = pytest.importorskip("pillow_heif")
+    pillow_heif.register_heif_opener()
+    path = tmp_path / "photo.heic"
+    try:
+        _two_halves(400, 200).save(path, format="HEIF", exif=_exif(orientation=6).tobytes())
+    except (OSError, ValueError, KeyError) as e:
+        pytest.skip(f"в сборке libheif нет кодировщика HEIC: {e}")
+
+    new_name = ingest_image(str(path))
+
+    assert not os.path.exists(path)
+    with Image.open(tmp_path / new_name) as image:
+        assert image.format == app.config['INGEST_IMAGE_FORMAT'].upper()
+        assert image.size == (200, 400)
+        assert GPS_INFO not in image.getexif()
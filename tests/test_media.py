@@ -0,0 +1,60 @@
+import os
+from app.models import Part, PartImage
+from app.utils.media_store import store_file, get_blob_path
+
+
+def _stored_image(db, tmp_path):
+    part = Part(name="Фара", car="BMW", part_number="A-1", price_in=1, price_out=2, quantity=1)
+    db.session.add(part)
+    db.session.commit()
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"photo bytes")
+    blob = store_file(str(path), "jpg")
+    db.session.add(PartImage(part_id=part.id, filename=blob.filename, blob_id=blob.id))
+    db.session.commit()
+    return part, blob
+
+
+def test_uploads_are_outside_static_folder(make_app):
+    app = make_app(UPLOAD_FOLDER="uploads/parts")
+
+    with app.test_request_context():
+        from app.utils.media_gc import _upload_root
+        root = _upload_root()
+
+    assert root.startswith(app.instance_path)
+    assert not root.startswith(app.static_folder)
+
+
+def test_anonymous_static_uploads_request_is_not_found(app, tmp_path):
+    # Загрузки, оставшиеся в static от старой установки
+    static = tmp_path / "static"
+    blob = static / "uploads" / "parts" / "blobs" / "ad" / ("ad" * 32 + ".jpg")
+    blob.parent.mkdir(parents=True)
+    blob.write_bytes(b"photo bytes")
+    app.static_folder = str(static)
+    client = app.test_client()
+
+    assert client.get(f"/static/uploads/parts/blobs/ad/{blob.name}").status_code == 404
+    assert client.get(f"/static/./uploads/parts/blobs/ad/{blob.name}").status_code == 404
+
+
+def test_media_requires_login(app, db, tmp_path):
+    part, blob = _stored_image(db, tmp_path)
+
+    response = app.test_client().get(f"/media/parts/{part.id}/{blob.filename}")
+
+    assert response.status_code in (302, 401)
+
+
+def test_media_etag_is_content_hash(app, db, client, tmp_path):
+    part, blob = _stored_image(db, tmp_path)
+    url = f"/media/parts/{part.id}/{blob.filename}"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.get_etag()[0] == blob.filename
+
+    # Копия файла с другим mtime - тот же ETag, браузер получает 304
+    os.utime(get_blob_path(blob.filename), (0, 0))
+    assert client.get(url, headers={"If-None-Match": f'"{blob.filename}"'}).status_code == 304
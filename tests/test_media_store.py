@@ -0,0 +1,118 @@
+import os
+import threading
+from app.models import Part, PartImage, MediaBlob
+from app.utils.media_gc import delete_unreferenced_blobs, get_delete_executor
+from app.utils.media_store import store_file, get_blob_path
+
+
+def _store(tmp_path, data=b"same bytes"):
+    path = tmp_path / "upload.jpg"
+    path.write_bytes(data)
+    return store_file(str(path), "jpg")
+
+
+def _part(db):
+    part = Part(name="Фара", car="BMW", part_number="A-1", price_in=1, price_out=2, quantity=1)
+    db.session.add(part)
+    db.session.commit()
+    return part
+
+
+def _image(part, blob):
+    return PartImage(part_id=part.id, filename=blob.filename, blob_id=blob.id)
+
+
+def _ref_count(db, blob_id):
+    return db.session.get(MediaBlob, blob_id, populate_existing=True).ref_count
+
+
+def test_same_content_is_stored_once_and_counted(app, db, tmp_path):
+    part = _part(db)
+    first = _store(tmp_path)
+    db.session.add(_image(part, first))
+    second = _store(tmp_path)
+    db.session.add(_image(part, second))
+    db.session.commit()
+
+    assert first.id == second.id
+    assert _ref_count(db, first.id) == 2
+
+
+def test_unused_reservation_is_released_on_commit(app, db, tmp_path):
+    blob = _store(tmp_path)
+    assert _ref_count(db, blob.id) == 1
+    db.session.commit()
+
+    assert _ref_count(db, blob.id) == 0
+    assert os.path.exists(get_blob_path(blob.filename))
+
+
+def test_release_of_last_reference_does_not_drop_reused_blob(app, db, tmp_path):
+    part = _part(db)
+    old_image = _image(part, _store(tmp_path))
+    db.session.add(old_image)
+    db.session.commit()
+
+    # Новая загрузка того же файла, а до записи ее строки удаляется последняя старая ссылка
+    blob = _store(tmp_path)
+    db.session.delete(old_image)
+    db.session.flush()
+    db.session.add(_image(part, blob))
+    db.session.commit()
+
+    assert db.session.get(MediaBlob, blob.id) is not None
+    assert _ref_count(db, blob.id) == 1
+    assert os.path.exists(get_blob_path(blob.filename))
+
+
+def test_gc_keeps_blob_that_got_a_reference_again(app, db, tmp_path):
+    part = _part(db)
+    blob_id = _store(tmp_path).id
+    db.session.commit()
+    assert _ref_count(db, blob_id) == 0
+
+    # Сверка нашла блоб без ссылок, но до удаления на него сослались
+    db.session.add(_image(part, _store(tmp_path)))
+    db.session.commit()
+
+    assert delete_unreferenced_blobs([blob_id]) == []
+    assert _ref_count(db, blob_id) == 1
+
+    db.session.delete(PartImage.query.one())
+    db.session.commit()
+    assert MediaBlob.query.filter_by(id=blob_id).first() is None
+
+
+def test_same_content_with_other_extension_reuses_file(app, db, tmp_path):
+    first = _store(tmp_path)
+    path = tmp_path / "upload.jpeg"
+    path.write_bytes(b"same bytes")
+    second = store_file(str(path), "jpeg")
+    db.session.commit()
+
+    assert second.id == first.id
+    assert second.filename == first.filename
+    assert os.listdir(os.path.dirname(get_blob_path(first.filename))) == [first.filename]
+
+
+def test_queued_delete_keeps_file_uploaded_again(app, db, tmp_path):
+    part = _part(db)
+    image = _image(part, _store(tmp_path))
+    db.session.add(image)
+    db.session.commit()
+    filename = image.filename
+
+    # Удаление последней ссылки ставит удаление файла в очередь, а очередь пока занята
+    gate = threading.Event()
+    get_delete_executor().submit(gate.wait, 5)
+    db.session.delete(image)
+    db.session.commit()
+    assert MediaBlob.query.count() == 0
+
+    # До удаления файла то же содержимое загрузили снова - файл уже на месте
+    db.session.add(_image(part, _store(tmp_path)))
+    db.session.commit()
+    gate.set()
+    get_delete_executor().submit(lambda: None).result(timeout=5)
+
+    assert os.path.exists(get_blob_path(filename))
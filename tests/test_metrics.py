@@ -0,0 +1,20 @@
+def test_metrics_are_closed_without_token(app):
+    assert app.test_client().get("/metrics").status_code == 404
+
+
+def test_metrics_can_be_opened_explicitly(make_app):
+    app = make_app(METRICS_PUBLIC=True)
+
+    response = app.test_client().get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+
+
+def test_metrics_require_token(make_app):
+    app = make_app(METRICS_TOKEN="secret")
+    client = app.test_client()
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
@@ -0,0 +1,29 @@
+import json
+import os
+from app.utils.assets import ASSETS_DIR, MANIFEST_NAME
+from app.utils.page_cache import PageCache, SQLiteBackend, build_id
+
+
+def test_previous_build_pages_are_not_read(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "page_cache.db"), max_bytes=1024 * 1024, ttl=60)
+    PageCache(backend, "old").get_or_render("parts:1", "1-", "page", lambda: "old css")
+
+    html, hit = PageCache(backend, "new").get_or_render("parts:1", "1-", "page", lambda: "new css")
+
+    assert (html, hit) == ("new css", False)
+    assert PageCache(backend, "new").get_or_render("parts:1", "1-", "page", lambda: "")[1]
+
+
+def test_build_id_follows_asset_manifest(app, tmp_path):
+    app.static_folder = str(tmp_path / "static")
+    manifest = os.path.join(app.static_folder, ASSETS_DIR, MANIFEST_NAME)
+    os.makedirs(os.path.dirname(manifest))
+
+    with open(manifest, "w") as f:
+        json.dump({"css/part.css": "dist/css/part.aaaa.css"}, f)
+    before = build_id(app)
+    with open(manifest, "w") as f:
+        json.dump({"css/part.css": "dist/css/part.bbbb.css"}, f)
+
+    assert build_id(app) != before
+    assert build_id(app) == build_id(app)
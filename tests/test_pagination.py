@@ -0,0 +1,50 @@
+from app.models import Part
+from app.utils.pagination import KeysetPage
+
+
+def _add_parts(db, prices):
+    parts = [
+        Part(name=f"Деталь {index}", car="BMW", part_number=f"N-{index}", price_in=0, price_out=price, quantity=1)
+        for index, price in enumerate(prices)
+    ]
+    db.session.add_all(parts)
+    db.session.commit()
+    return [part.id for part in parts]
+
+
+def _walk(app, sort, order, per_page):
+    """Все страницы подряд по курсорам: [[id строк страницы], ...]"""
+    pages, after = [], None
+    with app.test_request_context("/parts"):
+        for _ in range(20):
+            page = KeysetPage(Part.query, Part, sort=sort, order=order, per_page=per_page, after=after)
+            pages.append([part.id for part in page])
+            if not page.has_next:
+                return pages
+            after = page.next_cursor
+    raise AssertionError(f"Пагинация не закончилась: {pages}")
+
+
+def test_price_sort_with_null_prices_visits_every_row_once(app, db):
+    ids = _add_parts(db, [None, None, 300, 100, None, 200])
+
+    pages = _walk(app, "price", "asc", 2)
+
+    assert [part_id for page in pages for part_id in page] == [ids[3], ids[5], ids[2], ids[0], ids[1], ids[4]]
+
+
+def test_price_sort_desc_keeps_nulls_last(app, db):
+    ids = _add_parts(db, [None, 300, None, 100, 200])
+
+    pages = _walk(app, "price", "desc", 2)
+
+    assert [part_id for page in pages for part_id in page] == [ids[1], ids[4], ids[3], ids[2], ids[0]]
+
+
+def test_cursor_inside_null_tail(app, db):
+    ids = _add_parts(db, [None, None, None])
+
+    with app.test_request_context("/parts"):
+        page = KeysetPage(Part.query, Part, sort="price", per_page=1, after=f"null_{ids[0]}")
+        assert [part.id for part in page] == [ids[1]]
+        assert page.next_cursor == f"null_{ids[1]}"
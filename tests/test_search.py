@@ -0,0 +1,27 @@
+import pytest
+from app.models import Part
+from app.utils.search import find_part_ids
+
+
+@pytest.fixture
+def part(db):
+    part = Part(name="Фара", car="BMW", part_number="12345678901234567890123", price_in=1, price_out=2, quantity=1)
+    db.session.add(part)
+    db.session.commit()
+    return part
+
+
+def test_id_query_finds_part_first(app, part):
+    assert find_part_ids(str(part.id))[0] == part.id
+
+
+@pytest.mark.parametrize("query", ["9" * 19, "12345678901234567890123", "²"])
+def test_query_that_is_not_an_id(app, part, query):
+    ids = find_part_ids(query)
+
+    assert all(0 < part_id <= 2 ** 63 - 1 for part_id in ids)
+
+
+def test_long_number_search_pages(client, part):
+    for url in ("/api/parts/search?q=12345678901234567890123", "/search?q=99999999999999999999"):
+        assert client.get(url).status_code == 200
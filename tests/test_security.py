@@ -0,0 +1,40 @@
+import pytest
+from app.models import User
+from app.utils import security
+from app.utils.security import ADMIN_ROLE, load_principal
+
+
+@pytest.fixture
+def admin(db):
+    security._principal_cache = None
+    user = User(login="admin", password="x")
+    db.session.add(user)
+    db.session.commit()
+    assert load_principal(user.id).role == ADMIN_ROLE
+    yield user
+    security._principal_cache = None
+
+
+def test_rolled_back_change_keeps_cached_principal(db, admin):
+    admin.login = "bob"
+    db.session.flush()
+    assert admin.id in security.get_principal_cache()._data
+    db.session.rollback()
+
+    assert admin.id in security.get_principal_cache()._data
+    assert load_principal(admin.id).role == ADMIN_ROLE
+
+
+def test_committed_change_evicts_cached_principal(db, admin):
+    admin.login = "bob"
+    db.session.commit()
+
+    assert load_principal(admin.id).role != ADMIN_ROLE
+
+
+def test_committed_delete_evicts_cached_principal(db, admin):
+    user_id = admin.id
+    db.session.delete(admin)
+    db.session.commit()
+
+    assert load_principal(user_id) is None
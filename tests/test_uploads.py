@@ -0,0 +1,54 @@
+import io
+import os
+import time
+import threading
+import pytest
+from app.utils.uploads import create_upload_session, load_upload_session, append_chunk, finish_upload_session
+
+
+class SlowStream(io.BytesIO):
+    """Тело запроса, которое приходит медленно - второй запрос успевает начаться"""
+
+    def read(self, size=-1):
+        time.sleep(0.05)
+        return super().read(size)
+
+
+def test_retried_chunk_with_same_offset_is_written_once(app):
+    session = create_upload_session(1, "video.mp4", 8)
+    results, errors = [], []
+
+    def send(data):
+        with app.app_context():
+            upload = load_upload_session(session["upload_id"], 1)
+            try:
+                results.append(append_chunk(upload, 0, SlowStream(data), len(data)))
+            except ValueError as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=send, args=(b"abcd",)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [4]
+    assert errors == ["Ожидалось смещение 4"]
+    upload = load_upload_session(session["upload_id"], 1)
+    assert upload["offset"] == 4
+
+
+def test_last_chunk_closes_session_once(app):
+    session = create_upload_session(1, "video.mp4", 4)
+    upload = load_upload_session(session["upload_id"], 1)
+
+    assert append_chunk(upload, 0, io.BytesIO(b"abcd"), 4) == 4
+    assert upload["complete"]
+    path = finish_upload_session(upload)
+    with open(path, "rb") as f:
+        assert f.read() == b"abcd"
+
+    # Повтор завершающего куска не должен второй раз создать видео
+    with pytest.raises(ValueError):
+        append_chunk(dict(upload), 4, io.BytesIO(b""), 0)
+    os.remove(path)
@@ -0,0 +1,21 @@
+"""Точка входа для продакшена.
+
+gunicorn -c gunicorn.conf.py wsgi:app  - несколько процессов-воркеров (Linux)
+python wsgi.py                          - waitress: один процесс с потоками (Windows)
+"""
+import os
+from app import create_app
+
+# Фоновые потоки и соединения с базой каждый воркер открывает сам (app.utils.serving.start_worker)
+app = create_app(os.environ.get('APP_CONFIG', 'app.config.ProductionConfig'), background=False)
+
+if __name__ == "__main__":
+    from waitress import serve
+    from app.utils.serving import start_worker, stop_worker
+
+    start_worker(app)
+    host, port = app.config['WSGI_BIND'].rsplit(":", 1)
+    try:
+        serve(app, host=host, port=int(port), threads=app.config['WSGI_THREADS'])
+    finally:
+        stop_worker(app)